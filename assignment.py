@@ -0,0 +1,87 @@
+"""
+Optimal assignment of players to roster slots
+
+"""
+
+import numpy
+from scipy.optimize import linear_sum_assignment
+
+
+INELIGIBLE_COST = 1e9  # cost of putting a player in a slot he isn't eligible for
+
+
+def assign_slots(values, eligibility, slots, prune=True):
+    """
+    Assign players to roster slots to maximize the total value of the assigned players
+
+    `values` is an array with the value of each player, `eligibility` is a (players x positions) array of 0 / 1 eligibilities, and `slots` is the number of slots for each position. With `prune`, players that can't be part of an optimal assignment are left out before solving, which only pays off when there are many more players than slots.
+
+    Returns an array with the index of the position each player is assigned to, or -1 if the player is not assigned.
+
+    """
+    values = numpy.asarray(values, dtype=float)
+    eligibility = numpy.asarray(eligibility, dtype=bool)
+    slots = numpy.asarray(slots, dtype=int)
+
+    assigned = numpy.full(len(values), -1)
+
+    if len(values) == 0 or slots.sum() == 0:
+        return assigned
+
+    if prune:
+        candidates = find_candidates(values, eligibility, slots.sum())
+    else:
+        candidates = numpy.arange(len(values))
+
+    # one column per slot, so a position with n slots is repeated n times
+    slot_positions = numpy.repeat(numpy.arange(len(slots)), slots)
+
+    candidate_eligibility = eligibility[candidates][:, slot_positions]
+    cost = numpy.where(candidate_eligibility, -values[candidates][:, None], INELIGIBLE_COST)
+
+    rows, cols = linear_sum_assignment(cost)
+
+    # if there aren't enough eligible players, some slots are filled with ineligible players; leave those unassigned
+    filled = candidate_eligibility[rows, cols]
+
+    assigned[candidates[rows[filled]]] = slot_positions[cols[filled]]
+
+    return assigned
+
+
+def find_candidates(values, eligibility, n_slots):
+    """
+    Players that could be assigned in an optimal assignment
+
+    Only the best `n_slots` players eligible at each position can be part of an optimal assignment. If a worse player were assigned to that position, one of the better players would be left over and could take his place.
+
+    """
+    order = numpy.argsort(-values, kind='stable')
+
+    # rank of each player among the players eligible for each position
+    ranks = numpy.cumsum(eligibility[order], axis=0)
+
+    keep = (eligibility[order] & (ranks <= n_slots)).any(axis=1)
+
+    return numpy.sort(order[keep])
+
+
+def assign_lineups(values, eligibility, slots):
+    """
+    Assign players to roster slots for each of several days
+
+    `values` is a (days x players) array with the value of each player on each day, NaN if he doesn't play that day. A player is only started if his value is positive. `eligibility` and `slots` are as in `assign_slots`, and are the same every day.
+
+    Returns a (days x players) array with the index of the position each player is assigned to each day, or -1.
+
+    """
+    values = numpy.asarray(values, dtype=float)
+    eligibility = numpy.asarray(eligibility, dtype=bool)
+
+    playing = values > 0  # False for NaN
+    values = numpy.where(playing, values, 0.0)
+
+    return numpy.array([
+        assign_slots(day_values, eligibility & day_playing[:, None], slots)
+        for day_values, day_playing in zip(values, playing)
+    ]).reshape(values.shape)
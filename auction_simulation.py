@@ -0,0 +1,307 @@
+"""
+Auction draft simulation
+
+Simulates complete auction drafts from the draft valuations to see how they play out: what players end up costing, and how much win probability each team ends up with.
+
+A team's win probability is its average chance of winning each category in a week. The category levels the valuations are measured from are the team totals with an even chance of winning each category, so a team's win probability added, summed over its players, is how many more categories than half it expects to win.
+
+Teams take turns nominating the player they value most. Every team with an open roster spot for him bids up to its own value of him, limited by its max bid, and the player goes to the highest bidder for $1 more than the second highest bid. Each team values players with one of the bidder `strategies`, with its own noise.
+
+"""
+
+import argparse
+import math
+from multiprocessing import Pool
+import os
+import warnings
+
+import numpy
+import pandas
+
+from batter_valuation import batter_categories
+from config import LEAGUE_DATA_DIRECTORY, N_BATTERS, N_PITCHERS, N_TEAMS
+from draft import BUDGET, MIN_BID, load_draft_players
+from pitcher_valuation import pitcher_categories
+
+
+# bidder strategies: the valuation the bidder uses, how much the bidder's values vary from it, and how far over it the bidder will go
+strategies = {
+    'inflation': {'value': 'valuation_inflation', 'noise': 0.15, 'aggression': 1.0},
+    'flat': {'value': 'valuation_flat', 'noise': 0.15, 'aggression': 1.0},
+    'aggressive': {'value': 'valuation_inflation', 'noise': 0.15, 'aggression': 1.2},
+    'espn': {'value': 'espn_value', 'noise': 0.1, 'aggression': 1.0},
+}
+
+POOL_DEPTH = 2  # players of each type in the draft pool, as a multiple of the roster spots for that type
+
+_draft_data = None  # draft inputs in each worker process
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=10000, help="number of drafts to simulate")
+    parser.add_argument("--strategies", nargs="+", default=["inflation"], help="bidder strategies, assigned to teams in turn")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="number of processes to simulate drafts in")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--batter-projection", default="fangraphsdc", help="projection system to use for batters")
+    parser.add_argument("--pitcher-projection", default="fangraphsdc", help="projection system to use for pitchers")
+    args = parser.parse_args()
+
+    batters, pitchers = load_draft_players(args.batter_projection, args.pitcher_projection)
+
+    team_strategies = [args.strategies[i % len(args.strategies)] for i in range(N_TEAMS)]
+
+    data = prepare_draft(batters, pitchers, team_strategies)
+
+    results = simulate_drafts(data, args.n, args.processes, args.seed)
+
+    prices = summarize_prices(data, results)
+    teams = summarize_teams(data, results)
+
+    prices.to_csv(os.path.join(LEAGUE_DATA_DIRECTORY, 'auction_prices.csv'), index=False, encoding='utf8', float_format='%.2f')
+    teams.to_csv(os.path.join(LEAGUE_DATA_DIRECTORY, 'auction_teams.csv'), index=False, encoding='utf8', float_format='%.4f')
+
+    print(prices.head(30).to_string(index=False))
+    print(teams.groupby('strategy')[['win_probability', 'budget_left']].describe().T)
+
+
+def prepare_draft(batters, pitchers, team_strategies, n_teams=N_TEAMS, budget=BUDGET):
+    """
+    Arrays describing the draft pool and the teams, shared by every simulated draft
+
+    Keepers are taken out of the pool, and their salaries and roster spots are taken from their teams.
+
+    """
+    pool = []
+    kept = []
+
+    for players, is_batter, n in [(batters, 1, N_BATTERS), (pitchers, 0, N_PITCHERS)]:
+        players = players.copy()
+        players['is_batter'] = is_batter
+
+        is_keeper = players['keeper_salary'].notnull() if 'keeper_salary' in players.columns else pandas.Series(False, index=players.index)
+
+        kept.append(players[is_keeper])
+        pool.append(players[~is_keeper].sort_values('valuation_flat', ascending=False).head(POOL_DEPTH * n * n_teams))
+
+    pool = pandas.concat(pool, ignore_index=True, sort=False)
+    kept = pandas.concat(kept, ignore_index=True, sort=False)
+
+    values = numpy.zeros((n_teams, len(pool)))
+    noise = numpy.zeros(n_teams)
+    aggression = numpy.zeros(n_teams)
+
+    for team, name in enumerate(team_strategies):
+        strategy = strategies[name]
+
+        values[team] = pool[strategy['value']].fillna(0).clip(lower=0).values
+        noise[team] = strategy['noise']
+        aggression[team] = strategy['aggression']
+
+    budgets = numpy.full(n_teams, float(budget))
+    spots = numpy.tile([N_PITCHERS, N_BATTERS], (n_teams, 1))  # open spots by team, for pitchers and batters
+    kept_p_added = numpy.zeros(n_teams)
+
+    if 'fantasy_team_id' in kept.columns:
+        for team_id, is_batter, salary, p_added in zip(kept['fantasy_team_id'], kept['is_batter'], kept['keeper_salary'], kept['p_added_per_week']):
+            if pandas.notnull(team_id) and 1 <= team_id <= n_teams:
+                team = int(team_id) - 1
+
+                budgets[team] -= salary
+                spots[team, is_batter] = max(spots[team, is_batter] - 1, 0)
+                kept_p_added[team] += p_added
+
+    return {
+        'players': pool[[column for column in ['fg_id', 'fg_name', 'is_batter', 'valuation_flat', 'valuation_inflation', 'espn_value', 'p_added_per_week'] if column in pool.columns]],
+        'values': values,
+        'noise': noise,
+        'aggression': aggression,
+        'is_batter': pool['is_batter'].values,
+        'p_added': pool['p_added_per_week'].values,
+        'budgets': budgets,
+        'spots': spots,
+        'kept_p_added': kept_p_added,
+        'team_strategies': team_strategies,
+    }
+
+
+def simulate_draft(data, rng):
+    """
+    Simulate one auction draft
+
+    Returns the team each player was sold to (-1 if he went unsold), the price he was sold for, and the budget each team has left.
+
+    """
+    n_teams, n_players = data['values'].shape
+    is_batter = data['is_batter']
+
+    # each team's value of each player, varying from its strategy's valuation
+    perceived = data['values'] * data['aggression'][:, None] * (1 + data['noise'][:, None] * rng.standard_normal((n_teams, n_players)))
+
+    # teams are few, so the bidding is done on lists rather than arrays
+    budgets = data['budgets'].tolist()
+    spots = data['spots'].tolist()
+    open_spots = [sum(team_spots) for team_spots in spots]
+    bidder_values = perceived.T.tolist()
+
+    # each team's pitchers and batters, from most to least valued, and how far down each list is already sold
+    orders = []
+    for kind in [0, 1]:
+        players = numpy.flatnonzero(is_batter == kind)
+        orders.append(players[numpy.argsort(-perceived[:, players], axis=1, kind='stable')].tolist())
+    next_player = [[0, 0] for _ in range(n_teams)]
+
+    available = [True] * n_players
+    owners = [-1] * n_players
+    prices = [numpy.nan] * n_players
+
+    nominator = int(rng.integers(n_teams))
+
+    for _ in range(sum(open_spots)):
+        # the next team with an open spot nominates the available player it values most
+        while open_spots[nominator] == 0:
+            nominator = (nominator + 1) % n_teams
+
+        player = -1
+        for kind in [0, 1]:
+            if spots[nominator][kind] == 0:
+                continue
+
+            order = orders[kind][nominator]
+            k = next_player[nominator][kind]
+            while k < len(order) and not available[order[k]]:
+                k += 1
+            next_player[nominator][kind] = k
+
+            if k < len(order) and (player < 0 or bidder_values[order[k]][nominator] > bidder_values[player][nominator]):
+                player = order[k]
+
+        if player < 0:
+            break
+
+        kind = int(is_batter[player])
+
+        # each team with an open spot bids up to its value of the player, or its max bid
+        bids = [
+            min(value, budget - MIN_BID * (n_open - 1)) if team_spots[kind] > 0 else -numpy.inf
+            for value, budget, n_open, team_spots in zip(bidder_values[player], budgets, open_spots, spots)
+        ]
+        bids[nominator] = max(bids[nominator], MIN_BID)  # the nominator opens the bidding
+
+        # ties for the top bid go to a random one of the tied teams
+        top_bid = max(bids)
+        tied = [team for team, bid in enumerate(bids) if bid == top_bid]
+        winner = tied[int(rng.integers(len(tied)))] if len(tied) > 1 else tied[0]
+        bids[winner] = -numpy.inf
+        second = max(bids)
+
+        price = MIN_BID if second < MIN_BID else min(math.floor(second) + 1, max(math.floor(top_bid), MIN_BID))
+
+        owners[player] = winner
+        prices[player] = price
+        available[player] = False
+        budgets[winner] -= price
+        spots[winner][kind] -= 1
+        open_spots[winner] -= 1
+
+        nominator = (nominator + 1) % n_teams
+
+    return numpy.array(owners), numpy.array(prices, dtype=float), numpy.array(budgets)
+
+
+def run_drafts(args):
+    """
+    Simulate a batch of drafts in a worker process
+    """
+    seed, n = args
+    data = _draft_data
+
+    rng = numpy.random.default_rng(seed)
+
+    n_teams, n_players = data['values'].shape
+
+    prices = numpy.full((n, n_players), numpy.nan, dtype=numpy.float32)
+    team_p_added = numpy.zeros((n, n_teams))
+    budgets_left = numpy.zeros((n, n_teams))
+
+    for i in range(n):
+        owners, draft_prices, budgets = simulate_draft(data, rng)
+
+        prices[i] = draft_prices
+
+        sold = owners >= 0
+        team_p_added[i] = numpy.bincount(owners[sold], weights=data['p_added'][sold], minlength=n_teams) + data['kept_p_added']
+        budgets_left[i] = budgets
+
+    return prices, team_p_added, budgets_left
+
+
+def init_worker(data):
+    global _draft_data
+    _draft_data = data
+
+
+def simulate_drafts(data, n, processes=1, seed=None, batch_size=250):
+    """
+    Simulate `n` drafts, in parallel across processes
+    """
+    batches = [min(batch_size, n - start) for start in range(0, n, batch_size)]
+    seeds = numpy.random.SeedSequence(seed).spawn(len(batches))
+
+    if processes > 1:
+        with Pool(processes, initializer=init_worker, initargs=(data,)) as pool:
+            results = pool.map(run_drafts, zip(seeds, batches))
+    else:
+        init_worker(data)
+        results = [run_drafts(batch) for batch in zip(seeds, batches)]
+
+    return {
+        'prices': numpy.concatenate([result[0] for result in results]),
+        'team_p_added': numpy.concatenate([result[1] for result in results]),
+        'budgets_left': numpy.concatenate([result[2] for result in results]),
+    }
+
+
+def summarize_prices(data, results):
+    """
+    Distribution of each player's price across simulated drafts, next to his valuations
+    """
+    prices = results['prices']
+    sold = ~numpy.isnan(prices)
+
+    summary = data['players'].copy()
+    summary['sold_pct'] = sold.mean(axis=0)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # players who were never sold have no prices
+
+        summary['price_mean'] = numpy.nanmean(prices, axis=0)
+
+        for q in [10, 50, 90]:
+            summary['price_p{}'.format(q)] = numpy.nanpercentile(prices, q, axis=0)
+
+    return summary.sort_values('price_mean', ascending=False)
+
+
+def summarize_teams(data, results):
+    """
+    Win probability and money left for every team in every simulated draft
+    """
+    n, n_teams = results['team_p_added'].shape
+    n_categories = len(batter_categories) + len(pitcher_categories)
+
+    p_added = results['team_p_added'].ravel()
+
+    return pandas.DataFrame({
+        'draft': numpy.repeat(numpy.arange(n), n_teams),
+        'team': numpy.tile(numpy.arange(1, n_teams + 1), n),
+        'strategy': numpy.tile(data['team_strategies'], n),
+        'p_added_per_week': p_added,
+        'categories_won_per_week': n_categories / 2 + p_added,
+        'win_probability': numpy.clip(0.5 + p_added / n_categories, 0, 1),
+        'budget_left': results['budgets_left'].ravel(),
+    })
+
+
+if __name__ == '__main__':
+    main()
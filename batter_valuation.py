@@ -4,15 +4,20 @@ Batter valuation
 """
 
 import argparse
-import datetime
+import os
 
-import joblib
 import numpy
+import pandas
 
+from assignment import assign_slots
+from categories import calculate_category_p_added, category_names, load_category_table, resolve_categories
 from config import REMAINING_WEEKS, N_BATTERS, N_TEAMS, BATTER_BUDGET_RATIO, LEAGUE_DATA_DIRECTORY
-from utils import load_mapping, load_fangraphs_batter_projections, load_espn_positions, load_keepers, add_espn_auction_values, add_roster_state, load_playing_time
+import metrics
+from player_ids import load_player_ids
+from playing_time import load_playing_time_model, recent_playing_time
+from snapshots import SNAPSHOTS, record_snapshot
+from utils import load_fangraphs_batter_projections, load_espn_positions, load_keepers, add_espn_auction_values, add_roster_state
 
-team_PA_per_week = 300  # assume the team gets 300 PA a week
 
 # number of batters needed for each position
 batter_positions = [
@@ -24,33 +29,57 @@ batter_positions = [
     {'name': '3B', 'n': 1},
 ]
 
+# number of batters needed for each flex position, UTIL must be last
+flex_positions = [
+    {'name': 'MI', 'n': 1},
+    {'name': 'CI', 'n': 1},
+    {'name': 'UTIL', 'n': 1},
+]
+
+# batting categories, see categories.py
+batter_categories = [
+    {'name': 'R', 'stat': 'R_per_week', 'model': 'R'},
+    {'name': 'RBI', 'stat': 'RBI_per_week', 'model': 'RBI'},
+    {'name': 'HR', 'stat': 'HR_per_week', 'model': 'HR'},
+    {'name': 'SB', 'stat': 'SB_per_week', 'model': 'SB'},
+    {'name': 'TB', 'stat': 'TB_per_week', 'model': 'TB'},
+    {'name': 'OBP', 'stat': 'OBP', 'denominator': 'PA_per_week', 'model': 'OBP_big', 'level_model': 'OBP'},
+]
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--draft", action="store_true", help="prepare for auction draft")
     parser.add_argument("--l14pt", action="store_true", help="use last 14 days of playing time")
+    parser.add_argument("--ewpt", action="store_true", help="use exponentially weighted playing time from the archived playing time snapshots")
     parser.add_argument("--projection", default="rthebatx", help="projection system to use")
+    parser.add_argument("--projections", nargs="+", help="value several projection systems in one pass, e.g. rthebatx rfangraphsdc steamer zips")
+    parser.add_argument("--blend", action="store_true", help="with --projections, also value the average of the projection systems")
     args = parser.parse_args()
 
+    if args.draft and args.projections:
+        parser.error("--draft values the thebatx projections, so it can't be combined with --projections")
+
+    if args.blend and not args.projections:
+        parser.error("--blend needs --projections")
+
     if args.draft:
         projection_type = "thebatx"
-    elif args.l14pt:
-        projection_type = args.projection
+    elif args.projections:
+        projection_type = args.projections
     else:
         projection_type = args.projection
 
     # calculate win probability added
-    batters = calculate_p_added(projection_type, args.draft, args.l14pt)
+    batters = calculate_p_added(projection_type, args.draft, args.l14pt, blend=args.blend, ewpt=args.ewpt)
 
-    batters = calculate_replacement_score(batters)
-
-    # adjust score for positional scarcity
-    batters['adj_p_added_per_week'] = batters['p_added_per_week'] - batters['rep_p_added_per_week']
-
-    batters = batters.sort_values('adj_p_added_per_week', ascending=False)
-
-    batters = add_valuation(batters)
+    if 'projection' in batters.columns:
+        # each projection system gets its own replacement levels and valuations
+        batters = batters.groupby('projection', group_keys=False, sort=False).apply(value_batters)
+    else:
+        batters = value_batters(batters)
 
     columns = [
+        'projection',
         'fg_name',
         'Team',
         'PA',
@@ -93,6 +122,8 @@ def main():
         'p_added_per_week',
         'PA_per_week',
         'l14_G',
+        'ew_PA_per_week',
+        'role',
         # 'PR15', 'PR2018', 'pct_own',
         'R_p_added_per_week',
         'RBI_p_added_per_week',
@@ -124,46 +155,170 @@ def main():
         'OF',
         'MI',
         'CI',
+        'fg_id',
+        'espn_id',
     ]
 
     batters.sort_values('adj_p_added_per_week', ascending=False, inplace=True)
 
     output_columns =  [col for col in columns if col in batters.columns]
 
-    batters.to_csv('{}/valuations/batter_{:%Y-%m-%d}.csv'.format(
-        LEAGUE_DATA_DIRECTORY,
-        datetime.datetime.today()
-    ), index=False, columns=output_columns, encoding='utf8', float_format='%.2f')
-    batters.to_csv('{}/batter_valuation.csv'.format(
-        LEAGUE_DATA_DIRECTORY
-    ), index=False, columns=output_columns, encoding='utf8', float_format='%.2f')
+    if 'projection' in batters.columns:
+        output_name = 'batter_multi'
+    else:
+        output_name = 'batter'
+
+    with metrics.span('write_valuations') as span:
+        span['rows'] = len(batters)
+
+        location = '{}/{}_valuation.csv'.format(
+            LEAGUE_DATA_DIRECTORY,
+            output_name
+        )
 
+        batters.to_csv(location, index=False, columns=output_columns, encoding='utf8', float_format='%.2f')
 
-def calculate_p_added(projection_type, draft=False, l14pt=False):
+        record_snapshot(os.path.join(LEAGUE_DATA_DIRECTORY, SNAPSHOTS), '{}_valuation'.format(output_name), location)
+
+
+@metrics.timed
+def value_batters(batters):
     """
-    Calculate probability added for batters from projected stats
+    Adjust win probability added for positional scarcity and convert to dollar values
 
-    Use the marginal win probability over mean of each stat
+    """
+    batters = calculate_replacement_score(batters)
+
+    # adjust score for positional scarcity
+    batters['adj_p_added_per_week'] = batters['p_added_per_week'] - batters['rep_p_added_per_week']
+
+    batters = batters.sort_values('adj_p_added_per_week', ascending=False)
 
+    batters = add_valuation(batters)
+
+    return batters
+
+
+@metrics.timed
+def load_batter_inputs():
     """
-    mapping = load_mapping()
+    Load the inputs shared by every projection system: player ids, positions, and category values
 
-    projections = load_fangraphs_batter_projections(projection_type)
-    projections = projections.query('PA > 20').copy()  # only consider batters projected for more than 20 PA
-    projections = projections[projections['Team'].notnull()]  # remove batters with no team
+    """
+    player_ids = load_player_ids()
 
     positions = load_espn_positions()
     positions = correct_batter_positions(positions)  # account for any upcoming player position changes
 
-    batters = projections.merge(mapping[['mlb_id', 'fg_id', 'espn_id']], how='left', on='fg_id')
-    batters = batters.merge(positions, how='left', on='espn_id')
+    batter_categories_info = load_category_values()
+
+    return {
+        'player_ids': player_ids,
+        'positions': positions,
+        'categories_info': batter_categories_info,
+    }
+
+
+@metrics.timed
+def load_category_values():
+    """
+    Load the replacement level and win probability added for an additional unit of each category
+
+    These are calculated from the logistic regression by prob_added.py.
+
+    """
+    rep_level, p_added = load_category_table(os.path.join(LEAGUE_DATA_DIRECTORY, 'batters.json'))
+
+    rep_level['OBP'] = rep_level['OBP_big'] / 1000.0  # need to convert out of percentage points to avoid numerical issues
+
+    metrics.note(rep_level=rep_level, p_added=p_added)
+
+    print(rep_level)
+
+    # print out the win probability added
+    print(p_added)
+
+    return {
+        'rep_level': rep_level,
+        'p_added': p_added,
+    }
+
+
+@metrics.timed
+def load_projections(projection_types, blend=False):
+    """
+    Load batter projections for one or more projection systems
+
+    Multiple projection systems are stacked into one frame, keyed by the `projection` column. If `blend` is set, the average of the projection systems is added as the `blend` projection.
+
+    """
+    if isinstance(projection_types, str):
+        projections = load_fangraphs_batter_projections(projection_types)
+    else:
+        projections = []
+
+        for projection_type in projection_types:
+            projection = load_fangraphs_batter_projections(projection_type)
+            projection['projection'] = projection_type
 
-    batter_categories_info = joblib.load('{}/batters.pickle'.format(
-        LEAGUE_DATA_DIRECTORY
-    ))  # load results of the logistic regression
-    # TODO fix path to pickle
+            projections.append(projection)
 
-    if l14pt:
+        projections = pandas.concat(projections, ignore_index=True, sort=False)
+
+        if blend:
+            projections = pandas.concat([projections, blend_projections(projections)], ignore_index=True, sort=False)
+
+    projections = projections.query('PA > 20').copy()  # only consider batters projected for more than 20 PA
+    projections = projections[projections['Team'].notnull()]  # remove batters with no team
+
+    return projections
+
+
+def blend_projections(projections):
+    """
+    Average the projected stats of every projection system for each batter
+
+    """
+    stats = projections.select_dtypes(include=[numpy.number]).columns.tolist()
+
+    aggregations = {col: 'mean' for col in stats}
+    aggregations.update({col: 'first' for col in projections.columns if col not in stats and col not in ['fg_id', 'projection']})
+
+    blended = projections.groupby('fg_id', as_index=False, sort=False).aggregate(aggregations)
+    blended['projection'] = 'blend'
+
+    return blended
+
+
+@metrics.timed
+def calculate_p_added(projection_type, draft=False, l14pt=False, inputs=None, blend=False, ewpt=False):
+    """
+    Calculate probability added for batters from projected stats
+
+    Use the marginal win probability over mean of each stat
+
+    `projection_type` can be a list of projection systems, which are valued together in one pass. Pass `inputs` from `load_batter_inputs` to reuse the player ids, positions and category values across calls.
+
+    """
+    if inputs is None:
+        inputs = load_batter_inputs()
+
+    player_ids = inputs['player_ids']
+    positions = inputs['positions']
+    batter_categories_info = inputs['categories_info']
+
+    projections = load_projections(projection_type, blend)
+
+    with metrics.span('merge_positions') as span:
+        projections['mlb_id'] = player_ids.translate(projections['fg_id'], 'fg', 'mlb')
+        projections['espn_id'] = player_ids.translate(projections['fg_id'], 'fg', 'espn')
+
+        batters = projections.merge(positions, how='left', on='espn_id')
+        span['rows'] = len(batters)
+
+    if ewpt:
+        batters = add_weighted_playing_time(batters)  # add in the weighted recent playing time for batters
+    elif l14pt:
         batters = add_playing_time(batters)  # add in the latest playing time for batters
     else:
         batters['PA_per_week'] = batters['PA'] / REMAINING_WEEKS
@@ -179,61 +334,19 @@ def calculate_p_added(projection_type, draft=False, l14pt=False):
     batters['TB_per_week'] = batters['TB'] / batters['PA'] * batters['PA_per_week']
     batters['OB_per_week'] = batters['OB'] / batters['PA'] * batters['PA_per_week']
 
-    batter_categories_info['rep_level'] = {}
-    manual_replacement_levels = {}  # replacement level defaults to 50% probability of winning, but can manually override here
-
-    for cat, lm in batter_categories_info['models'].items():
-        if cat in manual_replacement_levels:
-            rep_level = (numpy.log(-manual_replacement_levels[cat] / (manual_replacement_levels[cat] - 1)) - lm.intercept_[0]) / lm.coef_[0][0]
-        else:
-            rep_level = (numpy.log(-0.5 / (0.5 - 1)) - lm.intercept_[0]) / lm.coef_[0][0]
-
-        batter_categories_info['rep_level'][cat] = rep_level
-
-    batter_categories_info['rep_level']['OBP'] = batter_categories_info['rep_level']['OBP_big'] / 1000.0  # need to convert out of percentage points to avoid numerical issues
+    categories = resolve_categories(batter_categories, batter_categories_info['p_added'], batter_categories_info['rep_level'])
 
-    print(batter_categories_info['rep_level'])
-    batter_categories_info['p_added'] = {}
+    # calculate the marginal units per week over the "average" player, and convert to win probability
+    with metrics.span('category_p_added'):
+        marginals, p_added = calculate_category_p_added(batters, categories, n_players=N_BATTERS)
 
-    for cat, _ in batter_categories_info['models'].items():
-        print(cat)
+    for i, category in enumerate(categories):
+        batters['{}_p_added_per_week'.format(category['name'])] = p_added[:, i]
 
-        if cat == 'OBP_big':
-            x_0 = batter_categories_info['rep_level'][cat]
-            x_1 = (x_0  / 1000.0 * team_PA_per_week + 1) / team_PA_per_week * 1000.0
-        else:
-            x_0 = batter_categories_info['rep_level'][cat]
-            x_1 = x_0 + 1
-
-        # what is the 50% of winning for each category, and what is 1 additional of that unit?
-        print(x_0, x_1)
-
-        # using logistic regression, what is the win probability added for 1 additional unit of each category
-        x = batter_categories_info['models'][cat].predict_proba(numpy.array([x_0, x_1]).reshape(-1, 1))[:, 1]
-        batter_categories_info['p_added'][cat] = x[1] - x[0]
-
-    # print out the win probability added
-    print(batter_categories_info['p_added'])
-
-    # calculate the marginal units per week over the "average" player
-    batters['mR_per_week'] = batters['R_per_week'] - batter_categories_info['rep_level']['R'] / N_BATTERS
-    batters['mRBI_per_week'] = batters['RBI_per_week'] - batter_categories_info['rep_level']['RBI'] / N_BATTERS
-    batters['mHR_per_week'] = batters['HR_per_week'] - batter_categories_info['rep_level']['HR'] / N_BATTERS
-    batters['mSB_per_week'] = batters['SB_per_week'] - batter_categories_info['rep_level']['SB'] / N_BATTERS
-    batters['mTB_per_week'] = batters['TB_per_week'] - batter_categories_info['rep_level']['TB'] / N_BATTERS
-    batters['mOB_per_week'] = batters['OB_per_week'] - (batter_categories_info['rep_level']['OBP'] * batters['PA_per_week'])
-
-    # convert the marginal units per week to win probability
-    probability_key = 'p_added'
-    batters['R_p_added_per_week'] = batters['mR_per_week'] * batter_categories_info[probability_key]['R']
-    batters['RBI_p_added_per_week'] = batters['mRBI_per_week'] * batter_categories_info[probability_key]['RBI']
-    batters['HR_p_added_per_week'] = batters['mHR_per_week'] * batter_categories_info[probability_key]['HR']
-    batters['SB_p_added_per_week'] = batters['mSB_per_week'] * batter_categories_info[probability_key]['SB']
-    batters['TB_p_added_per_week'] = batters['mTB_per_week'] * batter_categories_info[probability_key]['TB']
-    batters['OBP_p_added_per_week'] = batters['mOB_per_week'] *  batter_categories_info[probability_key]['OBP_big']
+    batters['mOB_per_week'] = marginals[:, category_names(categories).index('OBP')]
 
     # overall win probability added
-    batters['p_added_per_week'] = batters['R_p_added_per_week'] + batters['RBI_p_added_per_week'] + batters['HR_p_added_per_week'] + batters['SB_p_added_per_week'] + batters['TB_p_added_per_week'] + batters['OBP_p_added_per_week']
+    batters['p_added_per_week'] = p_added.sum(axis=1)
 
     batters = batters.sort_values('p_added_per_week', ascending=False)
     batters = batters.reset_index(drop=True)
@@ -252,18 +365,15 @@ def correct_batter_positions(positions):
     return positions
 
 
+@metrics.timed
 def add_playing_time(batters):
     """
     Add batters' PA from the past 14 days
 
     """
-    playing_time = load_playing_time('batter')
+    playing_time = recent_playing_time('batter')
 
-    # how many games has the team had overall?
-    playing_time['team_G'] = playing_time.groupby('Team')['G'].transform(lambda x: x.max())
-
-    playing_time['l14_PA_per_week'] = 1.0 * playing_time['PA'] / playing_time['team_G'] * 6  # prorate PA so that each player gets 6 games in a week
-    playing_time['l14_G'] = playing_time['G'] / playing_time['team_G']  # % of possible games played by batter
+    playing_time = playing_time.rename(columns={'PA_per_week': 'l14_PA_per_week', 'G_share': 'l14_G'})
 
     # what is the overall average number of PA per week?
     avg_PA_per_week = 1.0 * playing_time['PA'].iloc[:12*14].sum() / playing_time['G'].iloc[:12*14].sum() * 6
@@ -282,63 +392,80 @@ def add_playing_time(batters):
     return batters
 
 
+@metrics.timed
+def add_weighted_playing_time(batters):
+    """
+    Add batters' exponentially weighted PA from the archived playing time snapshots
+
+    """
+    playing_time = load_playing_time_model('batter')
+
+    # what is the average number of PA per week for a full time player?
+    avg_PA_per_week = playing_time.loc[playing_time['role'] == 'full_time', 'ew_PA_per_week'].mean()
+
+    batters = batters.merge(playing_time[['fg_id', 'ew_PA_per_week', 'ew_G_share', 'role']], how='left', on='fg_id')
+
+    batters['ew_PA_per_week'] = batters['ew_PA_per_week'].fillna(0)  # if the batter hasn't played recently, set their PA to 0
+
+    # if a batter is a full time player, regress their playing time projection to the mean
+    batters['PA_per_week'] = numpy.where(
+        batters['role'] == 'full_time',
+        (batters['ew_PA_per_week'] + avg_PA_per_week) / 2.0,
+        batters['ew_PA_per_week']
+    )
+
+    return batters
+
+
+@metrics.timed
 def calculate_replacement_score(batters):
     """
     Calculate the replacement level by position
 
-    Assign positions in this order specified by `batter_positions`
+    Assign positions to fill every team's `batter_positions` and `flex_positions` slots so that the total win probability added of the assigned batters is maximized
 
     """
     batters = batters.sort_values('p_added_per_week', ascending=False)
 
-    batters['position'] = None
-    for position in batter_positions:
-        batters.loc[batters[
-            batters['position'].isnull() &
-            (batters[position['name']] == 1)
-        ].index[0:(N_TEAMS * position['n'])], 'position'] = position['name']
+    slots = batter_positions + flex_positions
+
+    eligibility = batters[[position['name'] for position in batter_positions + flex_positions[:-1]]].fillna(0).values == 1
+    eligibility = numpy.column_stack([eligibility, numpy.ones(len(batters), dtype=bool)])  # UTIL applies to every batter
+
+    assigned = assign_slots(
+        batters['p_added_per_week'].values,
+        eligibility,
+        [N_TEAMS * position['n'] for position in slots]
+    )
 
-    # set MI
-    batters.loc[batters[batters['position'].isnull() & (batters['MI'] == 1)].index[0:12], 'position'] = 'MI'
-    # set CI
-    batters.loc[batters[batters['position'].isnull() & (batters['CI'] == 1)].index[0:12], 'position'] = 'CI'
-    # set UTIL
-    batters.loc[batters[batters['position'].isnull()].index[0:12], 'position'] = 'UTIL'
+    slot_names = numpy.array([position['name'] for position in slots] + [None], dtype=object)
+    batters['position'] = slot_names[assigned]  # unassigned batters (-1) get None
 
     # use the mean of the next two positionally eligible batters as the replacement level
     replacement_level = {}
 
+    unassigned = assigned == -1
+    p_added = batters['p_added_per_week'].values
+
+    for i, position in enumerate(slots):
+        replacement_level[position['name']] = numpy.mean(p_added[unassigned & eligibility[:, i]][0:2])
+
     # UTIL applies to every batter
-    replacement_level['UTIL'] = numpy.mean(batters.loc[batters[batters['position'].isnull()].index[0:2], 'p_added_per_week'])
     batters['rep_p_added_per_week'] = replacement_level['UTIL']
 
     for position in batter_positions[::-1]:
-        replacement_level[position['name']] = numpy.mean(batters.loc[batters[
-            batters['position'].isnull() &
-            (batters[position['name']] == 1)
-        ].index[0:2], 'p_added_per_week'])
-
         batters.loc[batters[position['name']] == 1, 'rep_p_added_per_week'] = replacement_level[position['name']]
 
-    # set replacement level on MI and CI separately from 1B/3B and 2B/SS
-
-    # batters.loc[batters['position'] == 'MI', 'rep_score'] = numpy.mean(batters.loc[batters[
-    #     batters['position'].isnull() &
-    #     ((batters['B2'] == 1) | (batters['SS'] == 1))
-    # ].index[0:2], 'raw_score'])
-    #
-    # batters.loc[batters['position'] == 'CI', 'rep_score'] = numpy.mean(batters.loc[batters[
-    #     batters['position'].isnull() &
-    #     ((batters['B1'] == 1) | (batters['B3'] == 1))
-    # ].index[0:2], 'raw_score'])
-
     # print replacement level win probability for each position
     for position, rep_level in [(k, replacement_level[k]) for k in sorted(replacement_level, key=replacement_level.get)]:
         print(position, rep_level)
 
+    metrics.note(replacement_level={position: float(rep_level) for position, rep_level in replacement_level.items()})
+
     return batters
 
 
+@metrics.timed
 def add_valuation(batters):
     """
     Given the adjusted win probability added, calculate the dollar value using a fixed batter / pitcher ratio
@@ -351,11 +478,14 @@ def add_valuation(batters):
 
     print(u"$ per 10% win probability added (flat): {}".format(dollars_per_adj_p_added_flat / 10.0))
 
+    metrics.note(dollars_per_p_added_flat=float(dollars_per_adj_p_added_flat))
+
     batters['valuation_flat'] = batters['adj_p_added_per_week'] * dollars_per_adj_p_added_flat
 
     return batters
 
 
+@metrics.timed
 def add_inflation(batters):
     """
     Adjust valuation to account for keepers causing inflation
@@ -380,6 +510,7 @@ def add_inflation(batters):
 
     dollars_per_adj_score_inflation = inflation_batter_budget / numpy.sum(free_agents['adj_p_added_per_week'])
     print(u"$ per score with inflation: {}".format(dollars_per_adj_score_inflation))
+    metrics.note(dollars_per_p_added_inflation=float(dollars_per_adj_score_inflation))
     print(u"remaining batter value: {}".format(numpy.sum(free_agents['adj_p_added_per_week'])))
 
     batters['valuation_inflation'] = batters['adj_p_added_per_week'] * dollars_per_adj_score_inflation
@@ -388,4 +519,5 @@ def add_inflation(batters):
 
 
 if __name__ == '__main__':
-    main()
+    with metrics.run('batter_valuation'):
+        main()
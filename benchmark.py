@@ -0,0 +1,644 @@
+"""
+Benchmarks
+
+Times the slow parts of the valuation pipeline on a synthetic league, so performance can be measured without real league data or credentials.
+
+`python benchmark.py` generates the synthetic league in the `benchmark` directory if it isn't there, then runs each benchmark in its own process with the synthetic league's config. Each benchmark reports its fastest wall time over `--repeat` runs and its peak memory (from tracemalloc, in a separate run). Results are appended to `results.jsonl` in the benchmark directory and compared with the last run at the same scale.
+
+The project's modules read `config.py` when they're imported, so they're imported inside the benchmarks, once the synthetic config is on the path.
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy
+import pandas
+
+
+SCRIPT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+N_LEAGUE_TEAMS = 12
+ROSTER_BATTERS = 14  # roster spots, as in config.py.sample
+ROSTER_PITCHERS = 9
+N_BATTERS = 1500  # players at scale 1
+N_PITCHERS = 1200
+MATCHUP_PERIODS = 22
+
+teams = [
+    'ARI', 'ATL', 'BAL', 'BOS', 'CHC', 'CHW', 'CIN', 'CLE', 'COL', 'DET', 'HOU', 'KC', 'LAA', 'LAD', 'MIA',
+    'MIL', 'MIN', 'NYM', 'NYY', 'OAK', 'PHI', 'PIT', 'SD', 'SEA', 'SF', 'STL', 'TB', 'TEX', 'TOR', 'WSH',
+]
+
+first_names = [
+    'Aaron', 'Adam', 'Alex', 'Andrew', 'Austin', 'Bobby', 'Brandon', 'Bryce', 'Carlos', 'Chris', 'Cody', 'Corey',
+    'Daniel', 'David', 'Dylan', 'Eduardo', 'Eric', 'Francisco', 'Freddie', 'Gerrit', 'Ian', 'J.D.', 'Jacob', 'Jake',
+    'Jose', 'Josh', 'Juan', 'Justin', 'Kyle', 'Luis', 'Manny', 'Matt', 'Max', 'Michael', 'Mike', 'Nick', 'Pete',
+    'Rafael', 'Ronald', 'Ryan', 'Shane', 'Trea', 'Tyler', 'Vladimir', 'Walker', 'Yordan', 'Zack',
+]
+
+last_names = [
+    'Acuna', 'Alonso', 'Altuve', 'Alvarez', 'Anderson', 'Arenado', 'Baez', 'Bell', 'Betts', 'Bichette', 'Bregman',
+    'Buehler', 'Burnes', 'Castillo', 'Cole', 'Correa', 'Cruz', 'Devers', 'Diaz', 'Flaherty', 'Freeman', 'Gallo',
+    'Garcia', 'Gonzalez', 'Guerrero', 'Harper', 'Hernandez', 'Judge', 'Kershaw', 'Lindor', 'Machado', 'Martinez',
+    'Martin', 'Marte', 'Merrifield', 'Moncada', 'Morton', 'Munoz', 'Nola', 'Ohtani', 'Olson', 'Ozuna', 'Perez',
+    'Ramirez', 'Realmuto', 'Rendon', 'Riley', 'Rodriguez', 'Sale', 'Sanchez', 'Scherzer', 'Seager', 'Semien',
+    'Smith', 'Soto', 'Springer', 'Story', 'Tatis', 'Torres', 'Trout', 'Turner', 'Urias', 'Verlander', 'Walker',
+    'Wheeler', 'Williams', 'Yelich', 'Zimmerman',
+]
+
+batter_positions = ['C', '1B', '2B', '3B', 'SS', 'LF', 'CF', 'RF']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmarks", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--directory", default="benchmark", help="directory for the synthetic league and the results")
+    parser.add_argument("--scale", type=float, default=1.0, help="number of players, relative to a full projection set")
+    parser.add_argument("--seasons", type=int, default=3, help="seasons of scores")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs of each benchmark")
+    parser.add_argument("--regenerate", action="store_true", help="generate the synthetic league even if it exists")
+    parser.add_argument("--child", help=argparse.SUPPRESS)  # run a single benchmark in this process
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_benchmark(args.child, args.repeat)))
+        return
+
+    settings = {'scale': args.scale, 'seasons': args.seasons, 'seed': args.seed}
+
+    if args.regenerate or load_settings(args.directory) != settings:
+        start = time.time()
+        generate_league(args.directory, **settings)
+        print(u"generated synthetic league in {:.1f}s".format(time.time() - start))
+
+    results = {}
+    for name in args.benchmarks or list(benchmarks):
+        if name not in benchmarks:
+            raise ValueError(u"unknown benchmark {}".format(name))
+
+        results[name] = run_in_league(args.directory, name, args.repeat)
+
+        print(u"{}: {}".format(name, 'failed' if results[name] is None else '{seconds:.3f}s, {peak_mb:.1f} MB'.format(**results[name])))
+
+    record = {
+        'date': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'settings': settings,
+        'repeat': args.repeat,
+        'results': results,
+    }
+
+    print(compare(record, load_results(args.directory)).to_string(index=False))
+
+    with open(results_location(args.directory), 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+######
+# synthetic league
+
+def generate_league(directory, scale=1.0, seasons=3, seed=0):
+    """
+    Write a synthetic league: config, projections, player mapping, ESPN eligibilities, rosters, keepers, scores, a Yahoo league, and the category tables fit on the scores
+    """
+    rng = numpy.random.default_rng(seed)
+
+    for subdirectory in ['data/projections', 'data/cache', 'league/scores', 'yahoo']:
+        os.makedirs(os.path.join(directory, subdirectory), exist_ok=True)
+
+    current_year = datetime.date.today().year
+    years = list(range(current_year - seasons + 1, current_year + 1))
+
+    write_config(directory, current_year, years)
+
+    batters = generate_batters(rng, int(N_BATTERS * scale))
+    pitchers = generate_pitchers(rng, int(N_PITCHERS * scale))
+
+    batters['playerid'] = fangraphs_ids(0, len(batters))
+    pitchers['playerid'] = fangraphs_ids(len(batters), len(pitchers))
+
+    # a second projection system differs by noise
+    for projection_type, noise in [('rthebatx', 0.0), ('rfangraphsdc', 0.05), ('thebatx', 0.0), ('fangraphsdc', 0.05)]:
+        write_projections(batters, directory, '{}_batters.csv'.format(projection_type), rng, noise, ['R', 'RBI', 'HR', 'SB'])
+        write_projections(pitchers, directory, '{}_pitchers.csv'.format(projection_type), rng, noise, ['W', 'SV', 'SO'])
+
+    players = pandas.concat([
+        batters[['Name', 'Team', 'playerid']].assign(is_batter=True),
+        pitchers[['Name', 'Team', 'playerid']].assign(is_batter=False, SP=pitchers['GS'] > 0),
+    ], ignore_index=True, sort=False)
+
+    players['mlb_id'] = numpy.arange(len(players)) + 500000
+    players['espn_id'] = numpy.arange(len(players)) + 30000
+    players['yahoo_id'] = numpy.arange(len(players)) + 8000
+
+    # ESPN spells some names differently, and some players haven't been mapped to ESPN yet
+    players['espn_name'] = vary_names(players['Name'], rng)
+    mapped = rng.random(len(players)) > 0.1
+
+    mapping = pandas.DataFrame({
+        'mlb_id': players['mlb_id'],
+        'mlb_name': players['Name'],
+        'fg_id': players['playerid'],
+        'fg_name': players['Name'],
+        'espn_id': players['espn_id'].astype(str).where(mapped),
+        'yahoo_id': players['yahoo_id'],
+    })
+    mapping.to_csv(os.path.join(directory, 'data', 'player_mapping.csv'), index=False)
+
+    write_eligibilities(players, directory, rng)
+    write_rosters(players, directory, rng)
+    write_scores(directory, years, rng)
+    write_yahoo_league(players, pitchers, directory, rng, current_year)
+
+    # fit the category tables on the scores, the same way as the real pipeline
+    if run_in_league(directory, None, args=[os.path.join(SCRIPT_DIRECTORY, 'prob_added.py'), '--force']) != 0:
+        raise RuntimeError(u"prob_added.py failed on the synthetic league")
+
+    with open(os.path.join(directory, 'settings.json'), 'w') as f:
+        json.dump({'scale': scale, 'seasons': seasons, 'seed': seed}, f)
+
+
+def write_config(directory, current_year, years):
+    """
+    Config for the synthetic league: the sample config, with the synthetic league's directory and seasons
+    """
+    with open(os.path.join(SCRIPT_DIRECTORY, 'config.py.sample'), 'r') as f:
+        config = f.read()
+
+    config += '\n\n'.join([
+        '',
+        '# synthetic league for benchmarks',
+        "LEAGUE_DATA_DIRECTORY = os.path.join(WORKING_DIRECTORY, 'league')",
+        'CURRENT_YEAR = {}'.format(current_year),
+        'HISTORICAL_DATA_YEARS = {}'.format(years),
+        'REMAINING_WEEKS = 20',
+        'N_TEAMS = {}'.format(N_LEAGUE_TEAMS),
+    ]) + '\n'
+
+    with open(os.path.join(directory, 'config.py'), 'w') as f:
+        f.write(config)
+
+
+def player_names(rng, n):
+    return pandas.Series(rng.choice(first_names, n)).str.cat(pandas.Series(rng.choice(last_names, n)), sep=' ')
+
+
+def fangraphs_ids(start, n):
+    """
+    Fangraphs ids: mostly BIS ids, with a STATS id for every tenth player
+    """
+    ids = numpy.arange(start, start + n)
+
+    return numpy.where(ids % 10 == 0, ['sa{}'.format(900000 + i) for i in ids], [str(10000 + i) for i in ids])
+
+
+def generate_batters(rng, n):
+    batters = pandas.DataFrame({
+        'Name': player_names(rng, n),
+        'Team': rng.choice(teams, n),
+        'G': rng.integers(20, 150, n),
+        'PA': rng.gamma(2.0, 160.0, n).clip(10, 700).round(),
+    })
+
+    batters['AB'] = (batters['PA'] * rng.uniform(0.85, 0.92, n)).round()
+    batters['H'] = (batters['AB'] * rng.normal(0.25, 0.025, n)).round()
+    batters['2B'] = (batters['H'] * 0.2).round()
+    batters['3B'] = (batters['H'] * 0.02).round()
+    batters['HR'] = (batters['PA'] * rng.uniform(0.01, 0.06, n)).round()
+    batters['R'] = (batters['PA'] * rng.uniform(0.09, 0.16, n)).round()
+    batters['RBI'] = (batters['PA'] * rng.uniform(0.09, 0.16, n)).round()
+    batters['BB'] = (batters['PA'] - batters['AB']).clip(lower=0)
+    batters['SO'] = (batters['PA'] * rng.uniform(0.15, 0.3, n)).round()
+    batters['SB'] = (batters['PA'] * rng.exponential(0.015, n)).round()
+    batters['AVG'] = batters['H'] / batters['AB']
+    batters['OBP'] = (batters['H'] + batters['BB']) / batters['PA']
+    batters['SLG'] = (batters['H'] + batters['2B'] + 2 * batters['3B'] + 3 * batters['HR']) / batters['AB']
+
+    return batters
+
+
+def generate_pitchers(rng, n):
+    is_starter = rng.random(n) < 0.45
+
+    pitchers = pandas.DataFrame({
+        'Name': player_names(rng, n),
+        'Team': rng.choice(teams, n),
+        'GS': numpy.where(is_starter, rng.integers(3, 33, n), 0),
+    })
+
+    pitchers['G'] = numpy.where(is_starter, pitchers['GS'], rng.integers(5, 70, n))
+    pitchers['IP'] = numpy.where(is_starter, pitchers['GS'] * rng.uniform(4.5, 6.5, n), pitchers['G'] * 1.0).round(1)
+    pitchers['W'] = (pitchers['IP'] * rng.uniform(0.03, 0.07, n)).round()
+    pitchers['L'] = (pitchers['IP'] * rng.uniform(0.03, 0.06, n)).round()
+    pitchers['SV'] = numpy.where(is_starter, 0, (pitchers['G'] * rng.beta(0.3, 1.5, n)).round())
+    pitchers['HLD'] = numpy.where(is_starter, 0, (pitchers['G'] * rng.beta(0.5, 2.0, n)).round())
+    pitchers['ERA'] = rng.normal(4.2, 0.7, n).clip(1.5, 7.0)
+    pitchers['WHIP'] = rng.normal(1.28, 0.12, n).clip(0.8, 1.8)
+    pitchers['K/9'] = rng.normal(8.8, 1.5, n).clip(4.0, 14.0)
+    pitchers['SO'] = (pitchers['K/9'] * pitchers['IP'] / 9).round()
+    pitchers['H'] = (pitchers['IP'] * pitchers['WHIP'] * 0.72).round()
+    pitchers['BB'] = (pitchers['IP'] * pitchers['WHIP'] * 0.28).round()
+    pitchers['ER'] = (pitchers['ERA'] * pitchers['IP'] / 9).round()
+    pitchers['HR'] = (pitchers['IP'] * 0.12).round()
+
+    return pitchers
+
+
+def write_projections(players, directory, filename, rng, noise, columns):
+    """
+    Write projections as Fangraphs exports them, with counting stats in `columns` varied by `noise`
+    """
+    players = players.copy()
+
+    for column in columns:
+        players[column] = (players[column] * rng.normal(1, noise, len(players))).clip(lower=0).round()
+
+    players.to_csv(os.path.join(directory, 'data', 'projections', filename), index=False, encoding='utf-8-sig')
+
+
+def vary_names(names, rng):
+    """
+    Names as another source spells them: some with accents, suffixes, or initials without periods
+    """
+    variation = rng.integers(0, 10, len(names))
+
+    names = names.where(variation != 0, names.str.replace('a', u'á', n=1))
+    names = names.where(variation != 1, names + ' Jr.')
+    names = names.where(variation != 2, names.str.replace('.', '', regex=False))
+
+    return names
+
+
+def write_eligibilities(players, directory, rng):
+    """
+    Write ESPN eligibilities and the mapping from ESPN team ids to team abbreviations
+    """
+    pro_teams = pandas.DataFrame({'pro_team': numpy.arange(1, len(teams) + 1), 'team_abbr': teams})
+    pro_teams.to_csv(os.path.join(directory, 'data', 'espn_pro_team_mapping.csv'), index=False)
+
+    elig = pandas.DataFrame({
+        'espn_name': players['espn_name'],
+        'espn_id': players['espn_id'],
+        'pro_team': players['Team'].map(pro_teams.set_index('team_abbr')['pro_team']),
+        'espn_injury_status': numpy.where(rng.random(len(players)) < 0.05, 'TEN_DAY_DL', 'ACTIVE'),
+    })
+
+    # batters are eligible at one to three positions
+    for position in batter_positions:
+        elig[position] = 0
+
+    is_batter = players['is_batter'].values
+    for i in numpy.flatnonzero(is_batter):
+        elig.loc[i, rng.choice(batter_positions, rng.integers(1, 4), replace=False)] = 1
+
+    elig['DH'] = 0
+    elig['SP'] = (~is_batter & players['SP'].fillna(False).values).astype(int)
+    elig['RP'] = (~is_batter & ~players['SP'].fillna(False).values).astype(int)
+
+    elig.to_csv(os.path.join(directory, 'league', 'espn_eligibilities.csv'), index=False, encoding='utf8')
+
+
+def write_rosters(players, directory, rng):
+    """
+    Write ESPN rosters, with keepers taken from the rostered players
+    """
+    rostered = []
+    for is_batter, n in [(True, ROSTER_BATTERS), (False, ROSTER_PITCHERS)]:
+        candidates = players[players['is_batter'] == is_batter]
+        rostered.append(candidates.sample(min(n * N_LEAGUE_TEAMS, len(candidates)), random_state=int(rng.integers(1 << 31))))
+
+    rostered = pandas.concat(rostered)
+
+    rosters = pandas.DataFrame({
+        'espn_id': rostered['espn_id'].values,
+        'fantasy_team_id': rng.integers(1, N_LEAGUE_TEAMS + 1, len(rostered)),
+    })
+    rosters.to_csv(os.path.join(directory, 'league', 'rosters.csv'), index=False)
+
+    keepers = rostered.sample(min(5 * N_LEAGUE_TEAMS, len(rostered)), random_state=int(rng.integers(1 << 31)))
+    pandas.DataFrame({
+        'mlb_id': keepers['mlb_id'].values,
+        'name': keepers['Name'].values,
+        'keeper_salary': rng.integers(1, 40, len(keepers)),
+    }).to_csv(os.path.join(directory, 'league', 'keepers.csv'), index=False)
+
+
+def write_scores(directory, years, rng):
+    """
+    Write a season of weekly head to head scores for each year
+    """
+    for year in years:
+        periods = numpy.repeat(numpy.arange(1, MATCHUP_PERIODS + 1), N_LEAGUE_TEAMS)
+
+        # each period pairs up the teams at random
+        pairings = numpy.concatenate([rng.permutation(N_LEAGUE_TEAMS) + 1 for _ in range(MATCHUP_PERIODS)])
+        opponents = pairings.reshape(-1, 2)[:, ::-1].ravel()
+
+        n = len(periods)
+        AB = rng.normal(230, 15, n).round()
+        outs = (rng.normal(55, 8, n) * 3).round()
+
+        scores = pandas.DataFrame({
+            'team_id': pairings,
+            'opponent_team_id': opponents,
+            'year': year,
+            'matchup_period': periods,
+            'AB': AB,
+            'H': (AB * rng.normal(0.25, 0.02, n)).round(),
+            'R': rng.poisson(35, n),
+            'HR': rng.poisson(10, n),
+            'TB': rng.poisson(110, n),
+            'RBI': rng.poisson(34, n),
+            'BB': rng.normal(25, 5, n).round(),
+            'SB': rng.poisson(5, n),
+            'OBP': rng.normal(0.325, 0.02, n),
+            'IP': outs // 3 + (outs % 3) / 10.0,  # baseball notation, e.g. 42.2 is 42 2/3 IP
+            'pH': rng.poisson(50, n),
+            'ER': rng.poisson(24, n),
+            'pBB': rng.poisson(18, n),
+            'W': rng.poisson(3.5, n),
+            'SV': rng.poisson(2.5, n),
+            'ERA': rng.normal(3.9, 0.8, n),
+            'WHIP': rng.normal(1.22, 0.12, n),
+            'K9': rng.normal(9, 1, n),
+            'final': 1,
+        })
+
+        scores.to_csv(os.path.join(directory, 'league', 'scores', 'scores_{}.csv'.format(year)), index=False, encoding='utf8')
+
+
+def write_yahoo_league(players, pitchers, directory, rng, current_year):
+    """
+    Write a Yahoo league: config, rosters, eligibilities, and Razzball quality starts
+    """
+    yahoo_config = {
+        'client_id': 'synthetic',
+        'client_secret': 'synthetic',
+        'season': current_year,
+        'sport_id': 'mlb',
+        'league_id': 1,
+        'my_team_id': 1,
+        'weekly': True,
+        'remaining_weeks': 20,
+        'n_teams': N_LEAGUE_TEAMS,
+        'n_batters': 13,
+        'n_pitchers': 9,
+        'positions': ['C', '1B', '2B', '3B', 'SS', 'OF', 'SP', 'RP'],
+        'categories': {
+            'batting': ['R', 'HR', 'RBI', 'SB', 'OPS'],
+            'pitching': ['QS', 'SV+H', 'SO', 'ERA', 'WHIP', 'K/9'],
+        },
+        'median_level': {
+            'batting': {'R': 35, 'HR': 10, 'RBI': 34, 'SB': 4, 'OBP': 0.33, 'SLG': 0.43, 'PA': 280, 'AB': 250},
+            'pitching': {'QS': 3, 'SV+H': 4, 'SO': 60, 'ERA': 3.9, 'WHIP': 1.22, 'K/9': 9.0, 'IP': 55},
+        },
+        'standings_delta': {
+            'batting': {'R': 10, 'HR': 4, 'RBI': 10, 'SB': 3, 'OPS': 0.04},
+            'pitching': {'QS': 1.5, 'SV+H': 2, 'SO': 12, 'ERA': 0.5, 'WHIP': 0.08, 'K/9': 0.6},
+        },
+    }
+
+    with open(os.path.join(directory, 'yahoo', 'config.json'), 'w') as f:
+        json.dump(yahoo_config, f, indent=2)
+
+    rostered = players.sample(min(22 * N_LEAGUE_TEAMS, len(players)), random_state=int(rng.integers(1 << 31)))
+    pandas.DataFrame({
+        'yahoo_id': rostered['yahoo_id'].values,
+        'team_id': rng.integers(1, N_LEAGUE_TEAMS + 1, len(rostered)),
+    }).to_csv(os.path.join(directory, 'yahoo', 'rosters.csv'), index=False)
+
+    elig = pandas.DataFrame({'yahoo_name': players['Name'], 'yahoo_id': players['yahoo_id']})
+    is_batter = players['is_batter'].values
+    for position in ['C', '1B', '2B', '3B', 'SS', 'OF']:
+        elig[position] = (is_batter & (rng.random(len(players)) < 0.25)).astype(int)
+    elig['SP'] = (~is_batter & players['SP'].fillna(False).values).astype(int)
+    elig['RP'] = (~is_batter & ~players['SP'].fillna(False).values).astype(int)
+    elig.to_csv(os.path.join(directory, 'data', 'yahoo_eligibility.csv'), index=False, encoding='utf8')
+
+    pandas.DataFrame({
+        'Name': pitchers['Name'],
+        'QS': (pitchers['GS'] * rng.uniform(0.4, 0.65, len(pitchers))).round(),
+    }).to_csv(os.path.join(directory, 'data', 'projections', 'razzball_pitchers.csv'), index=False)
+
+
+######
+# benchmarks
+
+def bench_batter_calculate_p_added():
+    import batter_valuation
+
+    return lambda: batter_valuation.calculate_p_added('rthebatx')
+
+
+def bench_pitcher_calculate_p_added():
+    import pitcher_valuation
+
+    return lambda: pitcher_valuation.calculate_p_added('rfangraphsdc')
+
+
+def bench_batter_replacement_score():
+    import batter_valuation
+
+    batters = batter_valuation.calculate_p_added('rthebatx')
+
+    return lambda: batter_valuation.calculate_replacement_score(batters.copy())
+
+
+def bench_pitcher_replacement_score():
+    import pitcher_valuation
+
+    pitchers = pitcher_valuation.calculate_p_added('rfangraphsdc')
+
+    return lambda: pitcher_valuation.calculate_replacement_score(pitchers.copy())
+
+
+def bench_batter_add_inflation():
+    import batter_valuation
+
+    batters = batter_valuation.value_batters(batter_valuation.calculate_p_added('thebatx', draft=True))
+
+    return lambda: batter_valuation.add_inflation(batters.copy())
+
+
+def bench_pitcher_add_inflation():
+    import pitcher_valuation
+
+    pitchers = pitcher_valuation.value_pitchers(pitcher_valuation.calculate_p_added('fangraphsdc', draft=True))
+
+    return lambda: pitcher_valuation.add_inflation(pitchers.copy())
+
+
+def bench_prob_added():
+    import prob_added
+
+    def run():
+        sys.argv = ['prob_added.py', '--force']
+        prob_added.main()
+
+    return run
+
+
+def bench_map_players_espn():
+    import map_players
+    from utils import load_fangraphs_batter_projections, load_fangraphs_pitcher_projections, load_mapping
+
+    mapping = load_mapping()
+    projections = pandas.concat([
+        load_fangraphs_batter_projections('rfangraphsdc'),
+        load_fangraphs_pitcher_projections('rfangraphsdc'),
+    ], ignore_index=True, sort=False).drop_duplicates(subset=['fg_id'])
+
+    players = map_players.add_player_ids(projections, mapping)
+
+    return lambda: map_players.add_espn_id(mapping.copy(), players.copy())
+
+
+def bench_yahoo_load_players():
+    from yahoo import Yahoo
+
+    league = Yahoo('yahoo', 'rfangraphsdc')
+    batters, pitchers = league.batters, league.pitchers
+
+    def run():
+        league.batters, league.pitchers = batters.copy(), pitchers.copy()
+        league.load_players()
+
+    return run
+
+
+# benchmarks, with the function that sets up each one and returns the function to time
+benchmarks = {
+    'batter_calculate_p_added': bench_batter_calculate_p_added,
+    'pitcher_calculate_p_added': bench_pitcher_calculate_p_added,
+    'batter_replacement_score': bench_batter_replacement_score,
+    'pitcher_replacement_score': bench_pitcher_replacement_score,
+    'batter_add_inflation': bench_batter_add_inflation,
+    'pitcher_add_inflation': bench_pitcher_add_inflation,
+    'prob_added': bench_prob_added,
+    'map_players_espn': bench_map_players_espn,
+    'yahoo_load_players': bench_yahoo_load_players,
+}
+
+
+def run_benchmark(name, repeat=3):
+    """
+    Time a benchmark in this process
+
+    The benchmark is run once to warm up caches, `repeat` times for wall time, and once more under tracemalloc for peak memory, which slows it down too much to time at the same time.
+
+    """
+    run = benchmarks[name]()
+    run()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'seconds': min(times),
+        'mean_seconds': float(numpy.mean(times)),
+        'peak_mb': peak / 1e6,
+    }
+
+
+def run_in_league(directory, name, repeat=3, args=None):
+    """
+    Run a benchmark (or a script with `args`) in its own process, in the synthetic league's directory with its config
+
+    Returns the benchmark's results, or None if it failed; for a script, returns its return code.
+
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.abspath(directory), SCRIPT_DIRECTORY] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+
+    if args is not None:
+        return subprocess.call([sys.executable, '-W', 'ignore'] + args, cwd=directory, env=env, stdout=subprocess.DEVNULL)
+
+    process = subprocess.run(
+        [sys.executable, '-W', 'ignore', os.path.abspath(__file__), '--child', name, '--repeat', str(repeat)],
+        cwd=directory, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    if process.returncode != 0:
+        print(process.stderr[-2000:])
+        return None
+
+    return json.loads(process.stdout.strip().splitlines()[-1])  # the results are printed last, after the benchmark's own output
+
+
+######
+# results
+
+def results_location(directory):
+    return os.path.join(directory, 'results.jsonl')
+
+
+def load_settings(directory):
+    location = os.path.join(directory, 'settings.json')
+
+    if not os.path.exists(location):
+        return None
+
+    with open(location, 'r') as f:
+        return json.load(f)
+
+
+def load_results(directory):
+    """
+    Previous benchmark runs, oldest first
+    """
+    location = results_location(directory)
+
+    if not os.path.exists(location):
+        return []
+
+    with open(location, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(record, previous):
+    """
+    Results of a run next to the last run of each benchmark with the same settings
+    """
+    rows = []
+    for name, result in record['results'].items():
+        row = {'benchmark': name, 'seconds': numpy.nan, 'peak_mb': numpy.nan, 'previous_seconds': numpy.nan, 'ratio': numpy.nan}
+
+        if result is not None:
+            row['seconds'] = result['seconds']
+            row['peak_mb'] = result['peak_mb']
+
+        baseline = next((run for run in reversed(previous) if run['settings'] == record['settings'] and run['results'].get(name)), None)
+
+        if baseline is not None:
+            row['previous_seconds'] = baseline['results'][name]['seconds']
+            row['ratio'] = row['seconds'] / row['previous_seconds']
+
+        rows.append(row)
+
+    return pandas.DataFrame(rows, columns=['benchmark', 'seconds', 'peak_mb', 'previous_seconds', 'ratio'])
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIRECTORY, stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+Category engine shared by batter and pitcher valuations
+
+Players are represented as a dense matrix of stats and categories as a list of specs. Each spec is a dict:
+
+* `name`: name of the category, used for output columns
+* `stat`: column with the counting stat, or with the rate for rate categories
+* `denominator`: for rate categories, the column with the playing time the rate is over (e.g. PA for OBP, IP for ERA)
+* `per`: for rate categories, the rate is per this many units of the denominator (e.g. 9 for ERA)
+* `lower_is_better`: lower values win the category (e.g. ERA, WHIP)
+* `category`: specs with the same category are summed together, e.g. OPS is OBP over PA plus SLG over AB; defaults to `name`
+* `model`: key of the category in the category valuations, e.g. the logistic regression results
+* `level_model`: key of the category's replacement level, if different from `model`
+* `p_added`: win probability added for an additional unit of the category
+* `level`: replacement level of the category for a team; a counting stat's level is split across `n_players`
+
+"""
+
+import json
+
+import numpy
+
+
+# rate categories and the playing time they are calculated over
+RATE_CATEGORIES = {
+    'AVG': [{'stat': 'AVG', 'denominator': 'AB'}],
+    'OBP': [{'stat': 'OBP', 'denominator': 'PA'}],
+    'SLG': [{'stat': 'SLG', 'denominator': 'AB'}],
+    'OPS': [{'stat': 'OBP', 'denominator': 'PA'}, {'stat': 'SLG', 'denominator': 'AB'}],
+    'ERA': [{'stat': 'ERA', 'denominator': 'IP', 'per': 9, 'lower_is_better': True}],
+    'WHIP': [{'stat': 'WHIP', 'denominator': 'IP', 'lower_is_better': True}],
+    'K/9': [{'stat': 'K/9', 'denominator': 'IP', 'per': 9}],
+    'K9': [{'stat': 'K9', 'denominator': 'IP', 'per': 9}],
+}
+
+CATEGORY_TABLE_VERSION = 1  # version of the category table written by prob_added.py
+
+
+def resolve_categories(categories, p_added, levels):
+    """
+    Fill in the win probability added and replacement level of each category spec
+
+    Values are looked up by the spec's `model` key in `p_added`, and by its `level_model` key (defaulting to `model`) in `levels`.
+
+    """
+    resolved = []
+
+    for category in categories:
+        category = dict(category)
+
+        category['p_added'] = p_added[category['model']]
+        category['level'] = levels[category.get('level_model', category['model'])]
+
+        resolved.append(category)
+
+    return resolved
+
+
+def calculate_category_p_added(players, categories, n_players=1, weeks=1.0):
+    """
+    Calculate the win probability added by every player in every category
+
+    Counting stats and denominators are divided by `weeks` to put them on a per week basis.
+
+    Returns the marginal units over replacement level for each spec, and the win probability added for each category, as (players x specs) and (players x categories) arrays.
+
+    """
+    columns = []
+    for category in categories:
+        for column in [category['stat'], category.get('denominator')]:
+            if column is not None and column not in columns:
+                columns.append(column)
+
+    stats = players[columns].to_numpy(dtype=float)
+
+    is_rate = numpy.array(['denominator' in category for category in categories])
+    stat_index = [columns.index(category['stat']) for category in categories]
+    denominator_index = [columns.index(category.get('denominator', category['stat'])) for category in categories]
+
+    per = numpy.array([category.get('per', 1.0) for category in categories])
+    level = numpy.array([category['level'] for category in categories])
+    sign = numpy.array([-1.0 if category.get('lower_is_better') else 1.0 for category in categories])
+    p_added = numpy.array([category['p_added'] for category in categories])
+
+    values = stats[:, stat_index]
+    values = numpy.where(is_rate, values, values / weeks)
+    denominators = stats[:, denominator_index] / weeks
+
+    # counting stats: marginal units over the player's share of the team replacement level
+    # rate stats: marginal units of the numerator over a replacement level rate with the same playing time
+    marginals = numpy.where(
+        is_rate,
+        (values - level) * denominators / per,
+        values - level / n_players
+    )
+
+    contributions = marginals * (sign * p_added)
+
+    names = category_names(categories)
+
+    if len(names) == len(categories):
+        return marginals, contributions
+
+    grouped = numpy.column_stack([
+        contributions[:, numpy.array([category.get('category', category['name']) == name for category in categories])].sum(axis=1)
+        for name in names
+    ])
+
+    return marginals, grouped
+
+
+def category_names(categories):
+    """
+    Names of the categories the specs are summed into, in order
+    """
+    names = []
+
+    for category in categories:
+        name = category.get('category', category['name'])
+        if name not in names:
+            names.append(name)
+
+    return names
+
+
+def logistic_probability(x, intercept, coef):
+    """
+    Probability of winning a category with a team total of `x`, from the category's logistic regression
+    """
+    return 1.0 / (1.0 + numpy.exp(-(intercept + coef * x)))
+
+
+def logistic_level(probability, intercept, coef):
+    """
+    Team total with a `probability` chance of winning a category, by inverting the category's logistic regression
+    """
+    return (numpy.log(probability / (1.0 - probability)) - intercept) / coef
+
+
+def category_totals(totals, columns, categories):
+    """
+    Each category's total from a team's weekly totals, as rates for rate categories
+
+    `totals` is an array whose last axis is `columns`. `categories` maps each category to its (stat, denominator, per), with no denominator for counting stats. A rate without playing time is NaN.
+
+    Returns an array with the categories as the last axis.
+
+    """
+    values = []
+
+    for stat, denominator, per in categories.values():
+        x = totals[..., columns.index(stat)]
+
+        if denominator is not None:
+            playing_time = totals[..., columns.index(denominator)]
+            x = x * per / numpy.where(playing_time > 0, playing_time, numpy.nan)
+
+        values.append(x)
+
+    return numpy.stack(values, axis=-1)
+
+
+def category_win_probabilities(totals, columns, categories, models, lower_is_better=()):
+    """
+    Probability of winning each category with a team's weekly totals, from the categories' logistic regressions
+
+    `totals`, `columns` and `categories` are as in `category_totals`. The regressions are for the higher total winning, so categories in `lower_is_better` are won with the rest of the probability. A rate without playing time is a coin flip.
+
+    Returns an array with the categories as the last axis.
+
+    """
+    x = category_totals(totals, columns, categories)
+
+    intercept = numpy.array([models[category][0] for category in categories])
+    coef = numpy.array([models[category][1] for category in categories])
+
+    p = logistic_probability(x, intercept, coef)
+    p = numpy.where([category in lower_is_better for category in categories], 1 - p, p)
+
+    return numpy.where(numpy.isnan(p), 0.5, p)
+
+
+def category_matchup_probabilities(totals, opponent_totals, columns, categories, models, lower_is_better=()):
+    """
+    Probability of beating an opponent in each category, from both teams' weekly totals and the categories' logistic regressions
+
+    The regressions are for winning against the league with a team total. Head to head, the opponent's total takes the place of the league's level, so the log odds of winning are the regression's slope times the difference in totals.
+
+    Arguments are as in `category_win_probabilities`, with `totals` and `opponent_totals` broadcast together.
+
+    """
+    difference = category_totals(totals, columns, categories) - category_totals(opponent_totals, columns, categories)
+
+    coef = numpy.array([models[category][1] for category in categories])
+
+    p = logistic_probability(difference, 0.0, coef)
+    p = numpy.where([category in lower_is_better for category in categories], 1 - p, p)
+
+    return numpy.where(numpy.isnan(p), 0.5, p)
+
+
+def category_table_entry(intercept, coef, probability=0.5, step=1.0):
+    """
+    Coefficients, level, and win probability added of a category in the category table
+
+    The level is the team total with a `probability` chance of winning the category. The win probability added is for increasing the team total by `step` from the level.
+
+    """
+    intercept = float(intercept)
+    coef = float(coef)
+
+    level = logistic_level(probability, intercept, coef)
+    p_added = logistic_probability(level + step, intercept, coef) - logistic_probability(level, intercept, coef)
+
+    return {
+        'intercept': intercept,
+        'coef': coef,
+        'probability': float(probability),
+        'level': float(level),
+        'step': float(step),
+        'p_added': float(p_added),
+    }
+
+
+def read_category_table(location):
+    """
+    Read a category table written by prob_added.py, checking its version
+    """
+    with open(location) as f:
+        table = json.load(f)
+
+    if table.get('version') != CATEGORY_TABLE_VERSION:
+        raise ValueError(u"{} has version {}, expected {}; rerun prob_added.py".format(location, table.get('version'), CATEGORY_TABLE_VERSION))
+
+    return table
+
+
+def load_category_table(location):
+    """
+    Load a category table written by prob_added.py
+
+    Returns the level and win probability added of each category, as dicts keyed by category.
+
+    """
+    table = read_category_table(location)
+
+    levels = {category: entry['level'] for category, entry in table['categories'].items()}
+    p_added = {category: entry['p_added'] for category, entry in table['categories'].items()}
+
+    return levels, p_added
+
+
+def load_category_models(location):
+    """
+    Load the logistic regression of each category from a category table written by prob_added.py
+
+    Returns the (intercept, coef) of each category, keyed by category, for `logistic_probability`.
+
+    """
+    table = read_category_table(location)
+
+    return {category: (entry['intercept'], entry['coef']) for category, entry in table['categories'].items()}
@@ -1,29 +1,155 @@
 """
 Best hitters to start today for daily lineups for Yahoo leagues
+
+Daily projections from scrape_fangraphs_dfs.py are valued in win probability added with the league's category values, and each day's lineup is the assignment of my batters to the league's lineup slots with the most win probability added. Batters are only started if they add win probability, and batters without a projection that day (no game) sit.
+
 """
+import argparse
 import datetime
+import os
 
 import pandas
 
+from assignment import assign_lineups
+from categories import calculate_category_p_added
 from config import (
     DATA_DIRECTORY
 )
 from yahoo import Yahoo
 
 
+# projected stats in the Fangraphs DFS file
+dfs_stats = ['PA', 'H', '1B', '2B', '3B', 'HR', 'R', 'RBI', 'SB', 'CS', 'BB', 'SO']
+
+
 def main():
-    yahoo_league_directory = "yahoo-new"
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--league", default="yahoo-new", help="Yahoo league data directory")
+    parser.add_argument("--date", type=lambda s: datetime.datetime.strptime(s, '%Y-%m-%d').date(), default=datetime.date.today(), help="first day to set lineups for")
+    parser.add_argument("--days", type=int, default=1, help="number of days to set lineups for, from the projections scraped for each day")
+    args = parser.parse_args()
+
+    yahoo_league_directory = args.league
 
-    date = datetime.date.today()
+    dates = [args.date + datetime.timedelta(days=i) for i in range(args.days)]
 
-    dfs = pandas.read_csv("{}/daily/fangraphs_dfs_{:%Y-%m-%d}.csv".format(DATA_DIRECTORY, date), dtype={'fg_id': 'object'})
+    dfs = load_dfs_projections(dates)
 
-    league = Yahoo("yahoo-new", "rfangraphsdc")
+    league = Yahoo(yahoo_league_directory, "rfangraphsdc")
 
-    dfs = dfs.merge(league.player_mapping[['fg_id', 'yahoo_id']], how='left')
+    dfs['yahoo_id'] = league.player_ids.translate(dfs['fg_id'], 'fg', 'yahoo', dtype='Int64')
     dfs = dfs.merge(league.rosters[['yahoo_id', 'team_id']], how='left')
 
-    dfs[(dfs['team_id'] == league.my_team_id) | (dfs['team_id'].isnull())].to_csv("{}/today.csv".format(yahoo_league_directory), index=False, encoding='utf8')
+    today = dfs[dfs['date'] == args.date].drop(columns=['date'])
+    today[(today['team_id'] == league.my_team_id) | (today['team_id'].isnull())].to_csv("{}/today.csv".format(yahoo_league_directory), index=False, encoding='utf8')
+
+    lineups = optimize_lineups(league, dfs[dfs['team_id'] == league.my_team_id])
+
+    lineups.to_csv(os.path.join(yahoo_league_directory, "lineups.csv"), index=False, encoding='utf8', float_format='%.4f')
+
+    for date, lineup in lineups.groupby('date'):
+        print(date)
+        print(lineup[['slot', 'Name', 'Team', 'Game', 'p_added']].to_string(index=False))
+
+
+def load_dfs_projections(dates):
+    """
+    Daily projections for each date with a scraped projections file, with stats as numbers and a `date` column
+    """
+    projections = []
+
+    for date in dates:
+        location = "{}/daily/fangraphs_dfs_{:%Y-%m-%d}.csv".format(DATA_DIRECTORY, date)
+
+        if not os.path.exists(location):
+            print(u"no projections for {}".format(date))
+            continue
+
+        dfs = pandas.read_csv(location, dtype={'fg_id': 'object'})
+        dfs['date'] = date
+
+        projections.append(dfs)
+
+    if not projections:
+        raise ValueError(u"no projections for {} to {}".format(dates[0], dates[-1]))
+
+    dfs = pandas.concat(projections, ignore_index=True, sort=False)
+
+    for stat in dfs_stats:
+        dfs[stat] = pandas.to_numeric(dfs[stat], errors='coerce').fillna(0)
+
+    return add_rates(dfs)
+
+
+def add_rates(dfs):
+    """
+    Add the AB and rate stats that the DFS projections don't have
+
+    The projections don't have HBP or SF, so AB are PA less BB.
+
+    """
+    dfs = dfs.copy()
+
+    dfs['AB'] = dfs['PA'] - dfs['BB']
+
+    pa = dfs['PA'].where(dfs['PA'] > 0)
+    ab = dfs['AB'].where(dfs['AB'] > 0)
+
+    dfs['AVG'] = (dfs['H'] / ab).fillna(0)
+    dfs['OBP'] = ((dfs['H'] + dfs['BB']) / pa).fillna(0)
+    dfs['SLG'] = ((dfs['1B'] + 2 * dfs['2B'] + 3 * dfs['3B'] + 4 * dfs['HR']) / ab).fillna(0)
+
+    return dfs
+
+
+def daily_categories(league):
+    """
+    Category specs for valuing a day's projections
+
+    A batter who sits adds nothing, so counting stats are valued from zero rather than from a share of the team's median. Rate stats are still valued against the team's median rate.
+
+    """
+    return [
+        spec if 'denominator' in spec else dict(spec, level=0.0)
+        for spec in league.category_specs('batting')
+    ]
+
+
+def optimize_lineups(league, projections):
+    """
+    Best lineup for each day, from daily projections of my batters
+
+    Every day is solved in one call, as an exact assignment of batters to the league's lineup slots.
+
+    Returns each batter's slot on each day, with BN for batters who play but sit.
+
+    """
+    _, p_added = calculate_category_p_added(projections, daily_categories(league))
+
+    projections = projections.assign(p_added=p_added.sum(axis=1))
+
+    dates = sorted(projections['date'].unique())
+    batters = projections.drop_duplicates('yahoo_id')[['yahoo_id']]
+
+    slot_positions = list(league.lineup_slots)
+
+    elig = batters.merge(league.elig, how='left', on='yahoo_id')
+    elig['Util'] = elig['Util'].fillna(1)  # every batter can be a Util
+    eligibility = elig[slot_positions].fillna(0).to_numpy(dtype=bool)
+
+    values = projections.pivot_table(index='date', columns='yahoo_id', values='p_added', aggfunc='sum').reindex(index=dates, columns=batters['yahoo_id'])
+
+    assigned = assign_lineups(values.to_numpy(), eligibility, [league.lineup_slots[position] for position in slot_positions])
+
+    slots = pandas.DataFrame(assigned, index=values.index, columns=values.columns).stack().rename('slot_index').reset_index()
+
+    lineups = projections.merge(slots, how='left', on=['date', 'yahoo_id'])
+    lineups['slot'] = lineups['slot_index'].map(dict(enumerate(slot_positions))).fillna('BN')
+    lineups['slot_order'] = lineups['slot_index'].where(lineups['slot_index'] >= 0, len(slot_positions))
+
+    return lineups.sort_values(['date', 'slot_order', 'p_added'], ascending=[True, True, False])[[
+        'date', 'slot', 'Name', 'Team', 'Game', 'yahoo_id', 'fg_id', 'p_added', 'PA', 'R', 'HR', 'RBI', 'SB', 'OBP', 'SLG',
+    ]]
 
 
 if __name__ == '__main__':
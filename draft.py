@@ -0,0 +1,315 @@
+"""
+Auction draft assistant
+
+Tracks a live auction draft. Each sale updates team budgets, the value left in the free agent pool, inflation adjusted valuations, and replacement levels, touching only the players that changed instead of revaluing every player.
+
+Enter a sale as `<fg_id> <team_id> <price>`, and a nomination as `<fg_id>`. `top batters` or `top pitchers` lists the best players left. Every sale is appended to the draft log, so an interrupted draft can be resumed.
+
+"""
+
+import argparse
+import collections
+import os
+import time
+
+import numpy
+import pandas
+
+import batter_valuation
+from config import BATTER_BUDGET_RATIO, LEAGUE_DATA_DIRECTORY, N_BATTERS, N_PITCHERS, N_TEAMS
+import pitcher_valuation
+from utils import add_espn_auction_values, add_roster_state
+
+
+BUDGET = 260  # auction budget for each team
+MIN_BID = 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batter-projection", default="fangraphsdc", help="projection system to use for batters")
+    parser.add_argument("--pitcher-projection", default="fangraphsdc", help="projection system to use for pitchers")
+    parser.add_argument("--log", default=os.path.join(LEAGUE_DATA_DIRECTORY, 'draft_log.csv'), help="file to record sales in")
+    args = parser.parse_args()
+
+    batters, pitchers = load_draft_players(args.batter_projection, args.pitcher_projection)
+
+    draft = AuctionDraft(batters, pitchers)
+
+    if os.path.exists(args.log):
+        sales = pandas.read_csv(args.log, dtype={'fg_id': object})
+
+        for sale in sales.itertuples():
+            draft.sell(sale.fg_id, sale.team_id, sale.price)
+
+        print(u"resumed draft with {} sales".format(len(sales)))
+    else:
+        with open(args.log, 'w') as f:
+            f.write('fg_id,team_id,price\n')
+
+    for line in iter(input, 'quit'):
+        words = line.split()
+
+        try:
+            if len(words) == 3:
+                start = time.time()
+                draft.sell(words[0], int(words[1]), float(words[2]))
+
+                with open(args.log, 'a') as f:
+                    f.write(','.join(words) + '\n')
+
+                print(u"sold in {:.1f} ms".format((time.time() - start) * 1000))
+                print_budgets(draft)
+            elif len(words) == 2 and words[0] == 'top':
+                print(draft.top(words[1]).to_string(index=False))
+            elif len(words) == 1:
+                start = time.time()
+                nomination = draft.nominate(words[0])
+                print(u"answered in {:.1f} ms".format((time.time() - start) * 1000))
+
+                for key, value in nomination.items():
+                    print(u"{}: {}".format(key, value))
+        except (KeyError, ValueError) as e:
+            print(u"error: {}".format(e))
+
+
+def load_draft_players(batter_projection="fangraphsdc", pitcher_projection="fangraphsdc"):
+    """
+    Load batter and pitcher draft valuations, with ESPN auction values, keeper salaries and the teams keepers are rostered on
+
+    """
+    batters = batter_valuation.calculate_p_added(batter_projection, draft=True)
+    batters = batter_valuation.value_batters(batters)
+    batters = batter_valuation.add_inflation(batters)
+    batters = add_espn_auction_values(batters)
+
+    pitchers = pitcher_valuation.calculate_p_added(pitcher_projection, draft=True)
+    pitchers = pitcher_valuation.value_pitchers(pitchers)
+    pitchers = pitcher_valuation.add_inflation(pitchers)
+    pitchers = add_espn_auction_values(pitchers)
+
+    return add_roster_state(batters), add_roster_state(pitchers)
+
+
+def print_budgets(draft):
+    for team_id in sorted(draft.budgets):
+        print(u"team {}: ${:.0f} left, {} spots, max bid ${:.0f}".format(
+            team_id, draft.budgets[team_id], draft.spots[team_id], draft.max_bid(team_id)))
+
+
+class AuctionDraft(object):
+    """
+    State of an auction draft
+
+    Players with a `keeper_salary` are sold before the draft starts, to their `fantasy_team_id` if it's known.
+
+    """
+    def __init__(self, batters, pitchers, n_teams=N_TEAMS, budget=BUDGET):
+        batter_slots = [position['name'] for position in batter_valuation.batter_positions + batter_valuation.flex_positions]
+
+        self.pools = {
+            'batters': AuctionPool(batters, n_teams * budget * BATTER_BUDGET_RATIO, n_teams * N_BATTERS, batter_slots, len(batter_valuation.batter_positions), 'position'),
+            'pitchers': AuctionPool(pitchers, n_teams * budget * (1 - BATTER_BUDGET_RATIO), n_teams * N_PITCHERS, ['P']),
+        }
+
+        self.rows = {}  # (pool, row) of each player, by fg_id
+        for pool_name, pool in self.pools.items():
+            for i, fg_id in enumerate(pool.players['fg_id'].astype(str)):
+                self.rows.setdefault(fg_id, (pool_name, i))
+
+        self.budgets = {team_id: float(budget) for team_id in range(1, n_teams + 1)}
+        self.spots = {team_id: N_BATTERS + N_PITCHERS for team_id in range(1, n_teams + 1)}
+        self.rosters = collections.defaultdict(list)
+        self.sales = []
+
+        for pool in self.pools.values():
+            if 'keeper_salary' not in pool.players.columns:
+                continue
+
+            keepers = pool.players[pool.players['keeper_salary'].notnull()]
+            teams = keepers['fantasy_team_id'] if 'fantasy_team_id' in keepers.columns else pandas.Series(numpy.nan, index=keepers.index)
+
+            for fg_id, team_id, salary in zip(keepers['fg_id'], teams, keepers['keeper_salary']):
+                self.sell(fg_id, None if pandas.isnull(team_id) else int(team_id), salary)
+
+    def sell(self, fg_id, team_id, price):
+        """
+        Record that a player was sold to a team (or to an unknown team if `team_id` is None)
+        """
+        pool_name, i = self.rows[str(fg_id)]
+        pool = self.pools[pool_name]
+
+        if pool.drafted[i]:
+            raise ValueError(u"{} was already sold".format(fg_id))
+
+        if team_id is not None:
+            if team_id not in self.budgets:
+                raise ValueError(u"unknown team {}".format(team_id))
+
+            if price > self.max_bid(team_id):
+                print(u"warning: ${} is more than team {}'s max bid of ${}".format(price, team_id, self.max_bid(team_id)))
+
+            self.budgets[team_id] -= price
+            self.spots[team_id] -= 1
+            self.rosters[team_id].append(str(fg_id))
+
+        pool.sell(i, price)
+
+        self.sales.append((str(fg_id), team_id, price))
+
+    def max_bid(self, team_id):
+        """
+        Most a team can bid while still being able to fill its roster with minimum bids
+        """
+        return self.budgets[team_id] - MIN_BID * max(self.spots[team_id] - 1, 0)
+
+    def nominate(self, fg_id):
+        """
+        Current valuation of a player
+        """
+        pool_name, i = self.rows[str(fg_id)]
+        pool = self.pools[pool_name]
+
+        player = pool.players.iloc[i]
+
+        dollars = pool.dollars_per_p_added()
+        rep_level = pool.replacement_level(pool.rep_positions[i])
+
+        return collections.OrderedDict([
+            ('fg_name', player['fg_name']),
+            ('position', pool.rep_positions[i]),
+            ('sold', bool(pool.drafted[i])),
+            ('valuation_flat', player.get('valuation_flat')),
+            ('valuation_inflation', pool.values[i] * dollars),  # with the pre-draft replacement level
+            ('valuation_current', (pool.p_added[i] - rep_level) * dollars),  # with the current replacement level
+            ('rep_p_added_per_week', rep_level),
+            ('dollars_per_p_added', dollars),
+            ('pool_budget', pool.budget),
+            ('pool_spots', pool.n_slots),
+        ])
+
+    def top(self, pool_name, n=20):
+        """
+        Best players left in a pool, with their current inflation adjusted valuations
+        """
+        pool = self.pools[pool_name]
+
+        rows = numpy.flatnonzero(~pool.drafted)[:n]
+
+        top = pool.players.iloc[rows][['fg_id', 'fg_name', 'adj_p_added_per_week']].copy()
+        top['position'] = pool.rep_positions[rows]
+        top['valuation_inflation'] = pool.values[rows] * pool.dollars_per_p_added()
+
+        return top
+
+
+class AuctionPool(object):
+    """
+    Batters or pitchers in an auction draft, with the budget and roster spots left for them
+
+    The draftable players are the best undrafted players by adjusted win probability added, one for each roster spot left. The money left is spread over their value, so selling a player only changes the pool by that player and at most one player at the edge of the draftable players.
+
+    Replacement levels continue the pre-draft replacement levels: the mean of the next two undrafted players at each position who weren't assigned a roster slot.
+
+    """
+    def __init__(self, players, budget, n_slots, slots, n_positions=0, slot_column=None):
+        self.players = players.sort_values('adj_p_added_per_week', ascending=False).reset_index(drop=True)
+
+        self.values = self.players['adj_p_added_per_week'].values.astype(float)
+        self.p_added = self.players['p_added_per_week'].values.astype(float)
+        self.drafted = numpy.zeros(len(self.players), dtype=bool)
+
+        self.budget = budget  # money left to spend on the pool
+        self.n_slots = n_slots  # roster spots left
+
+        self.last = min(n_slots, len(self.players)) - 1  # row of the worst draftable player
+        self.value = self.values[:self.last + 1].sum()  # value of the draftable players
+
+        self.init_replacement_levels(slots, n_positions, slot_column)
+
+    def init_replacement_levels(self, slots, n_positions, slot_column):
+        """
+        Find the players left over at each slot after filling every team's roster
+
+        Players were assigned slots in the valuation if `slot_column` is given, otherwise the best players by win probability added fill the roster spots. Each player is valued against the first of the first `n_positions` slots he's eligible for, or else the last slot (e.g. UTIL).
+
+        """
+        order = numpy.argsort(-self.p_added, kind='stable')
+
+        # slots without an eligibility column (UTIL, P) apply to every player
+        eligibility = numpy.column_stack([
+            self.players[slot].fillna(0).values == 1 if slot in self.players.columns else numpy.ones(len(self.players), dtype=bool)
+            for slot in slots
+        ])
+
+        if slot_column is not None:
+            unassigned = self.players[slot_column].isnull().values
+        else:
+            unassigned = numpy.ones(len(self.players), dtype=bool)
+            unassigned[order[:self.n_slots]] = False
+
+        self.rep_candidates = {}  # unassigned eligible players by slot, in order of win probability added
+        self.rep_next = {}  # index of the first candidate that may be undrafted
+
+        for j, slot in enumerate(slots):
+            self.rep_candidates[slot] = order[(unassigned & eligibility[:, j])[order]]
+            self.rep_next[slot] = 0
+
+        first = numpy.full(len(self.players), len(slots) - 1)
+
+        if n_positions > 0:
+            positions = eligibility[:, :n_positions]
+            first = numpy.where(positions.any(axis=1), positions.argmax(axis=1), first)
+
+        self.rep_positions = numpy.array(slots, dtype=object)[first]
+
+    def replacement_level(self, position):
+        """
+        Mean win probability added of the next two undrafted replacement players at a position
+        """
+        candidates = self.rep_candidates[position]
+
+        # skip past players drafted since the last lookup
+        k = self.rep_next[position]
+        while k < len(candidates) and self.drafted[candidates[k]]:
+            k += 1
+        self.rep_next[position] = k
+
+        undrafted = []
+        while k < len(candidates) and len(undrafted) < 2:
+            if not self.drafted[candidates[k]]:
+                undrafted.append(self.p_added[candidates[k]])
+            k += 1
+
+        return numpy.mean(undrafted) if undrafted else 0.0
+
+    def dollars_per_p_added(self):
+        return self.budget / self.value if self.value > 0 else 0.0
+
+    def sell(self, i, price):
+        """
+        Remove a player from the pool
+        """
+        self.drafted[i] = True
+        self.budget -= price
+        self.n_slots -= 1
+
+        if i <= self.last:
+            self.value -= self.values[i]
+
+            if i == self.last:
+                self.last = self.previous_undrafted(i)
+        elif self.last >= 0:
+            # one less roster spot, so the worst draftable player is no longer draftable
+            self.value -= self.values[self.last]
+            self.last = self.previous_undrafted(self.last)
+
+    def previous_undrafted(self, i):
+        i -= 1
+        while i >= 0 and self.drafted[i]:
+            i -= 1
+        return i
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,7 @@ ESPN league wrapper
 
 """
 
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import json
 import os
@@ -12,6 +13,9 @@ import os
 import espn_api.baseball
 import pandas
 
+import metrics
+from snapshots import SNAPSHOTS, record_snapshot
+
 
 class Espn(espn_api.baseball.League):
     def __init__(self, league_data_directory):
@@ -24,6 +28,7 @@ class Espn(espn_api.baseball.League):
 
         self.possible_positions = ["C", "1B", "2B", "3B", "SS", "LF", "CF", "RF", "DH", "SP", "RP"]
     
+    @metrics.timed
     def save_eligibilities(self):
         """Get all player positional eligibilities and save to CSV"""
         data_date = datetime.date.today()
@@ -37,17 +42,16 @@ class Espn(espn_api.baseball.League):
             self.free_agent_players[columns]
         ])
 
-        players.to_csv(os.path.join(
+        location = os.path.join(
             self.league_data_directory,
             "espn_eligibilities.csv"
-        ), columns=columns, encoding='utf8', index=False)
-            
-        players.to_csv(os.path.join(
-            self.league_data_directory,
-            "historical",
-            f"espn_eligibilities_{data_date:%Y-%m-%d}.csv"
-        ), columns=columns, encoding='utf8', index=False)
+        )
+
+        players.to_csv(location, columns=columns, encoding='utf8', index=False)
+
+        record_snapshot(os.path.join(self.league_data_directory, SNAPSHOTS), "espn_eligibilities", location, data_date)
 
+    @metrics.timed
     def save_rosters(self, data_date=datetime.date.today()):
         """Get all rostered players and save rosters to CSV"""
         rostered_players = []
@@ -61,17 +65,16 @@ class Espn(espn_api.baseball.League):
         
         self.rostered_players = pandas.DataFrame(rostered_players)
 
-        self.rostered_players.to_csv(os.path.join(
+        location = os.path.join(
             self.league_data_directory,
             "rosters.csv"
-        ), encoding='utf8', index=False)
+        )
 
-        self.rostered_players.to_csv(os.path.join(
-            self.league_data_directory,
-            "historical",
-            f"rosters_{data_date:%Y-%m-%d}.csv"
-        ), encoding='utf8', index=False)
+        self.rostered_players.to_csv(location, encoding='utf8', index=False)
+
+        record_snapshot(os.path.join(self.league_data_directory, SNAPSHOTS), "rosters", location, data_date)
         
+    @metrics.timed
     def _process_free_agents(self, data_date=datetime.date.today(), size=500):
         """Get all free agents"""
         free_agent_players = []
@@ -102,34 +105,81 @@ class Espn(espn_api.baseball.League):
         
         return player_dict
     
-    def save_scores(self):
+    @metrics.timed
+    def save_scores(self, include_current=False, max_workers=1):
         """
         Saves all boxscores for current season
         
         This is based on my code in https://github.com/cwendt94/espn-api/blob/19613d73c6476a78b3ccffd4e0e045c6e457cb62/espn_api/baseball/box_score.py
-        """
-        scores = []
 
-        for i in range(1, self.currentMatchupPeriod):
-            weekly_box_scores = self.box_scores(i)
-
-            for box_score in weekly_box_scores:
-                if box_score.away_team:
-                    # we only want competitive matchups, not byes
-                    for as_home in (True, False):
-                        scores.append(self._process_box_score(
-                            box_score,
-                            self.year,
-                            i,
-                            as_home=as_home)
-                        )
-
-        scores = pandas.DataFrame(scores)
-        scores.to_csv(os.path.join(
+        Only matchup periods that aren't already stored as final are fetched, `max_workers` at a time, and upserted into the scores file. With `include_current`, the in progress matchup period is saved too, and is marked as not final so that it is fetched again next time.
+
+        Returns the matchup periods that were updated, which is empty if the fetched periods had no box scores.
+        """
+        location = os.path.join(
             self.league_data_directory,
             "scores",
             f"scores_{self.year}.csv"
-        ), encoding='utf8', index=False)
+        )
+
+        if os.path.exists(location):
+            stored = pandas.read_csv(location)
+
+            if 'final' not in stored.columns:
+                stored['final'] = 1  # before in progress matchup periods were saved, only completed periods were stored
+
+            final_periods = set(stored.loc[stored['final'] == 1, 'matchup_period'])
+        else:
+            stored = None
+            final_periods = set()
+
+        last_period = self.currentMatchupPeriod if include_current else self.currentMatchupPeriod - 1
+
+        periods = [i for i in range(1, last_period + 1) if i not in final_periods]
+
+        if not periods:
+            return periods
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            weekly_scores = executor.map(self._fetch_scores, periods)
+
+            scores = pandas.DataFrame([row for rows in weekly_scores for row in rows])
+
+        if len(scores) == 0:
+            return []  # e.g. every team had a bye, so there is nothing to store
+
+        scores['final'] = (scores['matchup_period'] < self.currentMatchupPeriod).astype(int)
+
+        if stored is not None:
+            scores = pandas.concat([
+                stored[~stored['matchup_period'].isin(periods)],
+                scores
+            ], ignore_index=True, sort=False)
+
+            scores.sort_values('matchup_period', kind='mergesort', inplace=True)
+
+        scores.to_csv(location, encoding='utf8', index=False)
+
+        return periods
+
+    def _fetch_scores(self, matchup_period):
+        """Retrieve box scores for both teams of each matchup in a matchup period"""
+        scores = []
+
+        weekly_box_scores = self.box_scores(matchup_period)
+
+        for box_score in weekly_box_scores:
+            if box_score.away_team:
+                # we only want competitive matchups, not byes
+                for as_home in (True, False):
+                    scores.append(self._process_box_score(
+                        box_score,
+                        self.year,
+                        matchup_period,
+                        as_home=as_home)
+                    )
+
+        return scores
 
     @staticmethod
     def _process_box_score(box_score, year, week, as_home=True):
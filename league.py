@@ -2,6 +2,7 @@
 Fantasy baseball leagues as classes
 """
 
+import functools
 import os
 
 import pandas
@@ -9,6 +10,9 @@ import pandas
 from config import (
     DATA_DIRECTORY
 )
+import metrics
+from player_ids import load_player_ids
+from utils import load_cached_frame
 
 
 class League(object):
@@ -21,24 +25,18 @@ class League(object):
 
     def __init__(self, league_data_directory, projections_name):
         self.league_data_directory = league_data_directory
+        self.projections_name = projections_name
 
         self.batters = self.load_player_projections(projections_name, "batters")
         self.pitchers = self.load_player_projections(projections_name, "pitchers")
 
-        self.player_mapping = pandas.read_csv(
-            os.path.join(
-                self.data_directory,
-                "player_mapping.csv"
-        ), dtype=self.playerid_dtypes)
+        self.player_ids = load_player_ids(os.path.join(
+            self.data_directory,
+            "player_mapping.csv"
+        ))
+        self.player_mapping = self.player_ids.frame(self.playerid_dtypes)
 
-        try:
-            self.rosters = pandas.read_csv(os.path.join(
-                self.league_data_directory,
-                "rosters.csv"
-            ), dtype=self.playerid_dtypes)
-        except pandas.errors.EmptyDataError:
-            print("Empty rosters")
-        # TODO handle if file doesn't exist
+        self.rosters = self.load_rosters()
 
         self._client = None
     
@@ -51,17 +49,46 @@ class League(object):
             self._client = self.load_client(self.league_data_directory)
         return self._client
     
+    @metrics.timed
+    def load_rosters(self):
+        """
+        Load current team rosters
+        """
+        try:
+            return pandas.read_csv(self.rosters_location(), dtype=self.playerid_dtypes)
+        except pandas.errors.EmptyDataError:
+            print("Empty rosters")
+        # TODO handle if file doesn't exist
+
+    def rosters_location(self):
+        return os.path.join(self.league_data_directory, "rosters.csv")
+
+    def projections_location(self, projections_name, player_type):
+        return os.path.join(
+            self.data_directory,
+            "projections",
+            "{projections_name}_{player_type}.csv".format(
+                projections_name=projections_name,
+                player_type=player_type))
+
+    @metrics.timed
     def load_player_projections(self, projections_name, player_type):
         """
         Load player projections for batters or pitchers
         """
-        projections = pandas.read_csv(
-            os.path.join(
-                self.data_directory,
-                "projections",
-                "{projections_name}_{player_type}.csv".format(
-                    projections_name=projections_name,
-                    player_type=player_type)))
+        location = self.projections_location(projections_name, player_type)
+
+        return load_cached_frame(
+            location,
+            functools.partial(self.parse_player_projections, player_type=player_type),
+            'league')
+
+    @staticmethod
+    def parse_player_projections(location, player_type):
+        """
+        Parse player projections for batters or pitchers from CSV
+        """
+        projections = pandas.read_csv(location)
         
         projections.rename(columns={
             'playerid': 'fg_id',
@@ -2,15 +2,18 @@
 Rewrite of player mapping script
 
 1. Load existing mapping
-2. Map any fantasy relevant players to espn_ids
+2. Map any fantasy relevant players to espn_ids and yahoo_ids
+3. Write players without a confident match to a review file
 
 """
 import argparse
+import difflib
 import os
 
 import pandas
 
 from config import DATA_DIRECTORY
+from player_ids import NAMESPACES, PlayerIds, normalize_ids
 from utils import (
     load_espn_positions,
     load_fangraphs_batter_projections,
@@ -26,76 +29,213 @@ MIN_IP = 10
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--projection", default="rfangraphsdc", help="projection system to use, choices are rfangraphs / steamer600u")
-    # TODO add flag for which league ids need to be mapped (ESPN, Yahoo)
-    parser.add_argument("--pa", default=100, help="minimum PA projected to merit mapping")
-    parser.add_argument("--ip", default=10, help="minimum IP projected to merit mapping")
+    parser.add_argument("--leagues", nargs="+", default=["espn"], choices=["espn", "yahoo"], help="which league ids need to be mapped")
+    parser.add_argument("--pa", type=int, default=MIN_PA, help="minimum PA projected to merit mapping")
+    parser.add_argument("--ip", type=int, default=MIN_IP, help="minimum IP projected to merit mapping")
     args = parser.parse_args()
 
     mapping = load_mapping()
 
-    projections = load_fangraphs_batter_projections(args.projection)
-    projections = projections[projections['PA'] >= args.pa]  # only batters projected for more than min PA
-    players = projections.merge(mapping[['mlb_id', 'fg_id', 'espn_id', 'yahoo_id']], how='left', on='fg_id')
+    batters = load_fangraphs_batter_projections(args.projection)
+    batters = batters[batters['PA'] >= args.pa]  # only batters projected for more than min PA
 
-    mapping = add_espn_id(mapping, players)
+    pitchers = load_fangraphs_pitcher_projections(args.projection)
+    pitchers = pitchers[pitchers['IP'] >= args.ip]  # only pitchers projected for more than min IP
 
-    projections = load_fangraphs_pitcher_projections(args.projection)
-    projections = projections[projections['IP'] >= args.ip]  # only pitchers projected for more than min IP
-    players = projections.merge(mapping[['mlb_id', 'fg_id', 'espn_id', 'yahoo_id']], how='left', on='fg_id')
+    projections = pandas.concat([batters, pitchers], ignore_index=True, sort=False)
+    projections.drop_duplicates(subset=['fg_id'], inplace=True)  # two way players
 
-    mapping = add_espn_id(mapping, players)
+    reviews = []
+
+    if 'espn' in args.leagues:
+        mapping, review = add_espn_id(mapping, add_player_ids(projections, mapping))
+        reviews.append(review)
+
+    if 'yahoo' in args.leagues:
+        mapping, review = add_yahoo_id(mapping, add_player_ids(projections, mapping))
+        reviews.append(review)
 
     mapping.sort_values(['fg_name', 'mlb_name'], inplace=True)
 
     mapping.to_csv('data/player_mapping.csv', index=False, columns=['mlb_id', 'mlb_name', 'fg_id', 'fg_name', 'espn_id', 'yahoo_id'])
 
+    # players without a confident match, with the best candidates first
+    pandas.concat(reviews, ignore_index=True, sort=False).to_csv(os.path.join(DATA_DIRECTORY, 'mapping_review.csv'), index=False, encoding='utf8', float_format='%.3f')
+
+
+def add_player_ids(projections, mapping):
+    """
+    Add MLB, ESPN and Yahoo ids to projections from the current mapping
+
+    """
+    player_ids = PlayerIds(mapping)
+
+    players = projections.copy()
+
+    for namespace in ['mlb', 'espn', 'yahoo']:
+        players[NAMESPACES[namespace]] = player_ids.translate(players['fg_id'], 'fg', namespace)
+
+    return players
+
 
 def add_espn_id(mapping, players):
     """
     Add ESPN id to players without ESPN id
 
-    TODO: how to handle players without a perfect match
+    Players are matched on name within the same team. Returns the updated mapping, and the candidate matches of players that couldn't be matched confidently.
     """
     # keep only players without ESPN id
-    players_to_map = players[players['espn_id'].isnull()].copy()
-    # (name, team) is not necessarily unique, so drop any players with the same name and team
-    players_to_map.drop_duplicates(subset=['fg_name', 'Team'], keep=False, inplace=True)
-    del players_to_map['espn_id']  # clear out column of nulls
-    
+    players_to_map = players[players['espn_id'].isnull()]
+
     # ESPN position eligibilities have ESPN name and id
     espn_positions = load_espn_positions()
-    # (name, team) is not necessarily unique, so drop any players with the same name and team
-    espn_positions.drop_duplicates(subset=['espn_name', 'pro_team'], keep=False, inplace=True)
 
     espn_pro_teams = pandas.read_csv(os.path.join(DATA_DIRECTORY, 'espn_pro_team_mapping.csv'))
 
     espn_positions = espn_positions.merge(espn_pro_teams[['pro_team', 'team_abbr']])
 
-    # look for exact matches between Fangraphs name and ESPN name
-    matches = players_to_map.merge(espn_positions[['espn_name', 'team_abbr','espn_id']], left_on=['fg_name', 'Team'], right_on=['espn_name', 'team_abbr'], how='left')
+    espn_positions = unmapped_candidates(espn_positions, mapping, 'espn_id')
+
+    matches, review = match_players(
+        players_to_map, espn_positions,
+        candidate_name='espn_name', candidate_id='espn_id',
+        player_team='Team', candidate_team='team_abbr')
+
+    review['source'] = 'espn'
+
+    return update_mapping(mapping, matches, 'espn_id'), review
+
 
-    # pull out the perfect matches
-    update_list = matches[matches['espn_id'].notnull()][['fg_name', 'fg_id', 'espn_id']].to_dict(orient='records')
+def add_yahoo_id(mapping, players):
+    """
+    Add Yahoo id to players without Yahoo id
+
+    Yahoo eligibilities don't include teams, so players are matched on name only. Returns the updated mapping, and the candidate matches of players that couldn't be matched confidently.
+    """
+    players_to_map = players[players['yahoo_id'].isnull()]
+
+    yahoo_elig = pandas.read_csv(os.path.join(DATA_DIRECTORY, 'yahoo_eligibility.csv'), dtype={'yahoo_id': object})
+
+    yahoo_elig = unmapped_candidates(yahoo_elig, mapping, 'yahoo_id')
+
+    matches, review = match_players(
+        players_to_map, yahoo_elig,
+        candidate_name='yahoo_name', candidate_id='yahoo_id')
+
+    review['source'] = 'yahoo'
+
+    return update_mapping(mapping, matches, 'yahoo_id'), review
+
+
+def unmapped_candidates(candidates, mapping, column):
+    """
+    Drop candidates whose id already belongs to a player in the mapping, so that an id is never mapped to two players
+    """
+    mapped = set(normalize_ids(mapping[column]).dropna())
+
+    return candidates[~normalize_ids(candidates[column]).isin(mapped).values]
+
+
+def normalize_names(names):
+    """
+    Normalize player names for matching
+
+    Removes accents, punctuation, and suffixes like Jr. so that e.g. "Ronald Acuña Jr." and "Ronald Acuna" match
+    """
+    names = names.fillna('').astype(str)
+
+    names = names.str.normalize('NFKD').str.encode('ascii', errors='ignore').str.decode('ascii')
+    names = names.str.lower()
+    names = names.str.replace(r"[.'`]", '', regex=True)  # J.D. -> jd
+    names = names.str.replace(r"[^a-z ]", ' ', regex=True)
+    names = names.str.replace(r"\b(jr|sr|ii|iii|iv)\b", ' ', regex=True)
+    names = names.str.split().str.join(' ')
+
+    return names
+
+
+def blocking_keys(names, teams=None):
+    """
+    Only names with the same key are compared: team and first initial if teams are available, otherwise first initial and last name initial
+
+    Without teams, blocking on the first initial alone would compare each player with a large share of the candidates.
+    """
+    if teams is not None:
+        return names.str[:1] + '_' + teams.fillna('').astype(str)
+
+    return names.str[:1] + names.str.split().str[-1].str[:1].fillna('')
+
+
+def match_players(players, candidates, candidate_name, candidate_id, player_team=None, candidate_team=None, threshold=0.85, margin=0.05):
+    """
+    Match players to candidates by name similarity
+
+    Candidates are scored against players with the same blocking key. A player is matched to their best candidate if the score is at least `threshold`, beats the next best candidate by `margin`, and the candidate isn't a better match for another player.
+
+    Returns the matches (fg_name, fg_id, `candidate_id`, score), and the candidates of the players that weren't matched, ranked by score.
+    """
+    left = pandas.DataFrame({
+        'fg_name': players['fg_name'].values,
+        'fg_id': players['fg_id'].values,
+        'name': normalize_names(players['fg_name']).values,
+    })
+    left['key'] = blocking_keys(left['name'], players[player_team].reset_index(drop=True) if player_team else None)
+
+    right = pandas.DataFrame({
+        'candidate_name': candidates[candidate_name].values,
+        candidate_id: candidates[candidate_id].values,
+        'candidate': normalize_names(candidates[candidate_name]).values,
+    })
+    right['key'] = blocking_keys(right['candidate'], candidates[candidate_team].reset_index(drop=True) if candidate_team else None)
+
+    if player_team:
+        left['Team'] = players[player_team].values
+
+    pairs = left.merge(right, on='key')
+
+    pairs['score'] = [
+        1.0 if name == candidate else difflib.SequenceMatcher(None, name, candidate).ratio()
+        for name, candidate in zip(pairs['name'], pairs['candidate'])
+    ]
+
+    pairs.sort_values(['fg_id', 'score'], ascending=[True, False], inplace=True)
+    pairs['rank'] = pairs.groupby('fg_id').cumcount() + 1
+
+    # how much better is the best candidate than the next best?
+    next_score = pairs.groupby('fg_id')['score'].shift(-1).fillna(0)
+    pairs['confident'] = (pairs['rank'] == 1) & (pairs['score'] >= threshold) & (pairs['score'] - next_score >= margin)
+
+    # a candidate can only be matched to one player, the player with the best score
+    best = pairs[pairs['confident']]
+    best = best[best['score'] == best.groupby(candidate_id)['score'].transform('max')]
+    best = best[~best.duplicated(subset=[candidate_id], keep=False)]  # tied for a candidate, so needs review
+
+    matches = best[['fg_name', 'fg_id', candidate_id, 'score']]
+
+    review_columns = ['fg_name', 'fg_id'] + (['Team'] if player_team else []) + ['candidate_name', candidate_id, 'score', 'rank']
+    review = pairs[~pairs['fg_id'].isin(matches['fg_id'])][review_columns]
+    review = review.rename(columns={candidate_id: 'candidate_id'})
+
+    # most likely matches to review first
+    review = review.sort_values(['score', 'fg_id', 'rank'], ascending=[False, True, True])
+
+    return matches, review
+
+
+def update_mapping(mapping, matches, column):
+    """
+    Set `column` for matched players in the mapping, adding players that aren't in the mapping yet
+    """
+    updates = matches.set_index('fg_id')[column]
 
-    append_to_mapping = []
-    for player_update in update_list:
-        # if player exists in mapping already, update id
-        if player_update['fg_id'] in mapping['fg_id'].values:
-            mapping.loc[mapping['fg_id'] == player_update['fg_id'], 'espn_id'] = player_update['espn_id']
-            print(player_update)
-        # else add new player to mapping
-        else:
-            append_to_mapping.append(player_update)
+    existing = mapping['fg_id'].isin(updates.index)
+    mapping.loc[existing, column] = mapping.loc[existing, 'fg_id'].map(updates)
 
-    mapping = mapping.append(pandas.DataFrame(append_to_mapping), ignore_index=True, sort=False)
+    new_players = matches[~matches['fg_id'].isin(mapping['fg_id'])][['fg_name', 'fg_id', column]]
 
-    # print out players without matches
-    if 'PA' in matches.columns:
-        print(matches[matches['espn_id'].isnull()][['fg_name', 'bis_id', 'stats_id', 'Team', 'PA']])
-    else:
-        print(matches[matches['espn_id'].isnull()][['fg_name','bis_id', 'stats_id', 'Team', 'IP']])
+    print(u"{}: updated {} players, added {} players".format(column, existing.sum(), len(new_players)))
 
-    return mapping
+    return pandas.concat([mapping, new_players], ignore_index=True, sort=False)
 
 
 if __name__ == '__main__':
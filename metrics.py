@@ -0,0 +1,223 @@
+"""
+Run metrics
+
+Times the stages of a script run and writes a JSON record of the run to `data/metrics/runs.jsonl`, so a slow run can be traced to the stage that slowed down.
+
+Wrap a script's `main` in `run`, and each stage in `span` (or decorate it with `timed`). Each span records its duration, the rows of the frame it produced, the process's memory high-water mark, and the HTTP requests made during it. Spans outside of a run aren't recorded.
+
+Set the `METRICS_PROFILE` environment variable to `cprofile` to also save a cProfile of the run next to the records, or to `tracemalloc` to record each span's peak traced memory and the run's largest allocations.
+
+"""
+
+import contextlib
+import cProfile
+import datetime
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+import pandas
+import requests
+
+from config import DATA_DIRECTORY
+
+
+METRICS_DIRECTORY = os.path.join(DATA_DIRECTORY, 'metrics')
+
+PROFILE_MODES = ['cprofile', 'tracemalloc']
+
+_lock = threading.Lock()
+_local = threading.local()  # stack of open spans, for each thread
+_run = None  # record of the current run
+
+
+def max_rss_mb():
+    """
+    Memory high-water mark of the process
+    """
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return maxrss / 1e6 if sys.platform == 'darwin' else maxrss / 1e3  # bytes on macOS, KB elsewhere
+
+
+@contextlib.contextmanager
+def run(name, location=None, profile=None):
+    """
+    Record a run of a script, and write the record when it finishes
+    """
+    global _run
+
+    profile = profile or os.environ.get('METRICS_PROFILE')
+    if profile is not None and profile not in PROFILE_MODES:
+        raise ValueError(u"unknown profile mode {}, expected one of {}".format(profile, ', '.join(PROFILE_MODES)))
+
+    location = location or os.path.join(METRICS_DIRECTORY, 'runs.jsonl')
+
+    started = datetime.datetime.now()
+
+    _run = {
+        'run': name,
+        'started': started.strftime('%Y-%m-%dT%H:%M:%S'),
+        'argv': sys.argv[1:],
+        'status': 'ok',
+        'profile': profile,
+        'http_requests': 0,
+        'http_bytes': 0,
+        'spans': [],
+    }
+
+    profiler = None
+    if profile == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif profile == 'tracemalloc':
+        tracemalloc.start()
+
+    count_http(True)
+
+    start = time.perf_counter()
+
+    try:
+        yield _run
+    except BaseException as e:
+        _run['status'] = 'failed'
+        _run['error'] = repr(e)
+        raise
+    finally:
+        _run['seconds'] = time.perf_counter() - start
+        _run['max_rss_mb'] = max_rss_mb()
+
+        count_http(False)
+
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+
+        if profiler is not None:
+            profiler.disable()
+
+            _run['profile_location'] = os.path.join(os.path.dirname(location), '{}_{:%Y-%m-%d_%H%M%S}.prof'.format(name, started))
+            profiler.dump_stats(_run['profile_location'])
+        elif profile == 'tracemalloc':
+            _run['tracemalloc_peak_mb'] = max(_run.get('tracemalloc_peak_mb', 0.0), tracemalloc.get_traced_memory()[1] / 1e6)
+            _run['top_allocations'] = [
+                {'location': str(stat.traceback), 'mb': stat.size / 1e6}
+                for stat in tracemalloc.take_snapshot().statistics('lineno')[:20]
+            ]
+
+            tracemalloc.stop()
+
+        with open(location, 'a') as f:
+            f.write(json.dumps(_run) + '\n')
+
+        print(u"{} {} in {:.2f}s, records in {}".format(name, _run['status'], _run['seconds'], location))
+
+        _run = None
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    Time a stage of a run
+
+    Yields the span's record, so the stage can add to it, e.g. `s['rows'] = len(players)`.
+
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    record = {'name': name, 'path': '/'.join([s['name'] for s in stack] + [name])}
+
+    if _run is None:
+        yield record
+        return
+
+    stack.append(record)
+
+    if tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()  # Python 3.9+; otherwise the peak is the run's peak so far
+
+    http_requests, http_bytes = _run['http_requests'], _run['http_bytes']
+    start = time.perf_counter()
+
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        record['max_rss_mb'] = max_rss_mb()
+
+        if http_requests != _run['http_requests']:
+            record['http_requests'] = _run['http_requests'] - http_requests  # includes requests from other threads
+            record['http_bytes'] = _run['http_bytes'] - http_bytes
+
+        stack.pop()
+
+        with _lock:
+            if tracemalloc.is_tracing():
+                record['tracemalloc_peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+                _run['tracemalloc_peak_mb'] = max(_run.get('tracemalloc_peak_mb', 0.0), record['tracemalloc_peak_mb'])  # span peaks are reset
+
+            _run['spans'].append(record)
+
+
+def timed(function=None, name=None):
+    """
+    Decorator that runs a function in a span, recording the rows of the frame it returns
+    """
+    if function is None:
+        return functools.partial(timed, name=name)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with span(name or function.__name__) as record:
+            result = function(*args, **kwargs)
+
+            if isinstance(result, pandas.DataFrame):
+                record['rows'] = len(result)
+
+            return result
+
+    return wrapper
+
+
+def note(**values):
+    """
+    Add values (e.g. dollars per win probability) to the innermost open span, or to the run
+    """
+    if _run is None:
+        return
+
+    stack = getattr(_local, 'stack', None)
+    target = stack[-1] if stack else _run
+
+    target.update(values)
+
+
+_send = requests.Session.send
+
+
+def send(session, request, **kwargs):
+    """
+    `requests.Session.send`, counting requests and response bytes
+    """
+    response = _send(session, request, **kwargs)
+
+    if _run is not None:
+        size = len(response.content) if not kwargs.get('stream') else int(response.headers.get('Content-Length', 0))
+
+        with _lock:
+            _run['http_requests'] += 1
+            _run['http_bytes'] += size
+
+    return response
+
+
+def count_http(enable):
+    """
+    Count every request made through requests (directly or through a session, e.g. OAuth or espn_api) while a run is recorded
+    """
+    requests.Session.send = send if enable else _send
@@ -0,0 +1,371 @@
+"""
+Daily pipeline
+
+Runs the daily workflow (scrapes, league refresh, player mapping, category values, valuations) as a graph of steps. Each step declares the files it reads and writes, and a step depends on the steps that write its inputs.
+
+Steps whose inputs haven't changed since their last successful run are skipped. Inputs are compared by content, so a scrape that rewrites identical data doesn't trigger the steps after it. A step can update one of its own inputs (map_players adds to the player mapping), and is then current with the file as it left it. Steps that don't depend on each other run in parallel, each in its own process, with its output saved to a log file.
+
+Steps without inputs (scrapes, league refreshes) fetch data from the web, so they always run unless `--offline` is given.
+
+"""
+
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pandas
+
+from config import CURRENT_YEAR, DATA_DIRECTORY, HISTORICAL_DATA_YEARS, LEAGUE_DATA_DIRECTORY, PROJECTIONS_DIRECTORY
+from utils import CACHE_DIRECTORY, hash_file
+
+
+STATE_LOCATION = os.path.join(CACHE_DIRECTORY, 'pipeline_state.json')
+LOG_DIRECTORY = os.path.join(CACHE_DIRECTORY, 'pipeline_logs')
+SCRIPT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def projections(projection_type):
+    return [os.path.join(PROJECTIONS_DIRECTORY, '{}_{}.csv'.format(projection_type, player_type)) for player_type in ['batters', 'pitchers']]
+
+
+# steps of the daily workflow, with the python command that runs each step and the files it reads and writes
+steps = [
+    {
+        'name': 'scrape_projections',
+        'command': ['scrape_fangraphs.py'],
+        'inputs': [],
+        'outputs': projections('rfangraphsdc') + projections('rthebatx'),
+    },
+    {
+        'name': 'scrape_playing_time',
+        'command': ['scrape_playing_time.py'],
+        'inputs': [],
+        'outputs': [os.path.join(DATA_DIRECTORY, '{}_playing_time.csv'.format(player_type)) for player_type in ['batter', 'pitcher']],
+    },
+    {
+        'name': 'refresh_rosters',
+        'command': ['-c', 'from config import LEAGUE_DATA_DIRECTORY; from espn import Espn; Espn(LEAGUE_DATA_DIRECTORY).save_eligibilities()'],
+        'inputs': [],
+        'outputs': [os.path.join(LEAGUE_DATA_DIRECTORY, 'espn_eligibilities.csv'), os.path.join(LEAGUE_DATA_DIRECTORY, 'rosters.csv')],
+    },
+    {
+        'name': 'refresh_scores',
+        'command': ['-c', 'from config import LEAGUE_DATA_DIRECTORY; from espn import Espn; Espn(LEAGUE_DATA_DIRECTORY).save_scores()'],
+        'inputs': [],
+        'outputs': [os.path.join(LEAGUE_DATA_DIRECTORY, 'scores', 'scores_{}.csv'.format(CURRENT_YEAR))],
+    },
+    {
+        'name': 'map_players',
+        'command': ['map_players.py'],
+        'inputs': projections('rfangraphsdc') + [
+            os.path.join(DATA_DIRECTORY, 'player_mapping.csv'),
+            os.path.join(LEAGUE_DATA_DIRECTORY, 'espn_eligibilities.csv'),
+            os.path.join(DATA_DIRECTORY, 'espn_pro_team_mapping.csv'),
+            os.path.join(DATA_DIRECTORY, 'yahoo_eligibility.csv'),
+        ],
+        'outputs': [os.path.join(DATA_DIRECTORY, 'player_mapping.csv'), os.path.join(DATA_DIRECTORY, 'mapping_review.csv')],
+    },
+    {
+        'name': 'prob_added',
+        'command': ['prob_added.py'],
+        'inputs': [os.path.join(LEAGUE_DATA_DIRECTORY, 'scores', 'scores_{}.csv'.format(year)) for year in HISTORICAL_DATA_YEARS],
+        'outputs': [os.path.join(LEAGUE_DATA_DIRECTORY, 'batters.json'), os.path.join(LEAGUE_DATA_DIRECTORY, 'pitchers.json')],
+    },
+    {
+        'name': 'batter_valuation',
+        'command': ['batter_valuation.py'],
+        'inputs': projections('rthebatx')[:1] + [
+            os.path.join(DATA_DIRECTORY, 'player_mapping.csv'),
+            os.path.join(LEAGUE_DATA_DIRECTORY, 'espn_eligibilities.csv'),
+            os.path.join(LEAGUE_DATA_DIRECTORY, 'rosters.csv'),
+            os.path.join(LEAGUE_DATA_DIRECTORY, 'batters.json'),
+        ],
+        'outputs': [os.path.join(LEAGUE_DATA_DIRECTORY, 'batter_valuation.csv')],
+    },
+    {
+        'name': 'pitcher_valuation',
+        'command': ['pitcher_valuation.py'],
+        'inputs': projections('rfangraphsdc')[1:] + [
+            os.path.join(DATA_DIRECTORY, 'player_mapping.csv'),
+            os.path.join(LEAGUE_DATA_DIRECTORY, 'espn_eligibilities.csv'),
+            os.path.join(LEAGUE_DATA_DIRECTORY, 'rosters.csv'),
+            os.path.join(LEAGUE_DATA_DIRECTORY, 'pitchers.json'),
+        ],
+        'outputs': [os.path.join(LEAGUE_DATA_DIRECTORY, 'pitcher_valuation.csv')],
+    },
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("targets", nargs="*", help="steps to run, with the steps they depend on (default: every step)")
+    parser.add_argument("--offline", action="store_true", help="don't run steps that fetch data from the web")
+    parser.add_argument("--force", action="store_true", help="run steps even if their inputs haven't changed")
+    parser.add_argument("--workers", type=int, default=4, help="number of steps to run at once")
+    parser.add_argument("--dry-run", action="store_true", help="list the steps that would run")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(steps)
+
+    timings = pipeline.run(args.targets or None, offline=args.offline, force=args.force, workers=args.workers, dry_run=args.dry_run)
+
+    print(timings.to_string(index=False))
+
+    if (timings['status'] == 'failed').any():
+        sys.exit(1)
+
+
+class Pipeline(object):
+    """
+    Steps of a workflow, and the hashes of the inputs each step last ran successfully with
+    """
+    def __init__(self, steps, state_location=STATE_LOCATION, log_directory=LOG_DIRECTORY):
+        self.steps = {step['name']: step for step in steps}
+        self.state_location = state_location
+        self.log_directory = log_directory
+
+        # steps that write each file
+        writers = {}
+        for step in steps:
+            for location in step['outputs']:
+                writers.setdefault(os.path.normpath(location), []).append(step['name'])
+
+        self.dependencies = {
+            step['name']: sorted(set(
+                writer
+                for location in step['inputs']
+                for writer in writers.get(os.path.normpath(location), [])
+                if writer != step['name']
+            ))
+            for step in steps
+        }
+
+        self.order = self.sort()
+
+        self.state = {'steps': {}, 'files': {}}
+        if os.path.exists(state_location):
+            with open(state_location, 'r') as f:
+                self.state = json.load(f)
+
+    def sort(self):
+        """
+        Steps in an order where every step comes after the steps it depends on
+        """
+        order = []
+        visiting = set()
+
+        def visit(name):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(u"steps depend on each other: {}".format(name))
+
+            visiting.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency)
+            visiting.remove(name)
+
+            order.append(name)
+
+        for name in self.steps:
+            visit(name)
+
+        return order
+
+    def select(self, targets=None):
+        """
+        Targets and every step they depend on, in order
+        """
+        if targets is None:
+            return list(self.order)
+
+        selected = set()
+
+        def add(name):
+            if name not in self.steps:
+                raise ValueError(u"unknown step {}".format(name))
+
+            if name not in selected:
+                selected.add(name)
+                for dependency in self.dependencies[name]:
+                    add(dependency)
+
+        for target in targets:
+            add(target)
+
+        return [name for name in self.order if name in selected]
+
+    def hash_file(self, location):
+        """
+        SHA1 hash of a file, or None if it doesn't exist
+
+        Hashes are saved with the file's modification time and size, and only recomputed if those change.
+        """
+        try:
+            stat = os.stat(location)
+        except FileNotFoundError:
+            return None
+
+        key = os.path.abspath(location)
+        cached = self.state['files'].get(key)
+
+        if cached is None or cached['mtime'] != stat.st_mtime_ns or cached['size'] != stat.st_size:
+            cached = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': hash_file(location)}
+            self.state['files'][key] = cached
+
+        return cached['sha1']
+
+    def fingerprint(self, name):
+        """
+        Command, script and input hashes that a step's outputs are determined by
+
+        The script is hashed so that editing a step's settings, e.g. the target probabilities in prob_added.py, runs it again.
+        """
+        step = self.steps[name]
+
+        fingerprint = {
+            'command': step['command'],
+            'inputs': {location: self.hash_file(location) for location in step['inputs']},
+        }
+
+        if step['command'][0].endswith('.py'):
+            fingerprint['script'] = self.hash_file(self.script_location(step['command'][0]))
+
+        return fingerprint
+
+    def is_current(self, name, fingerprint):
+        """
+        Whether a step's outputs are up to date with its inputs
+        """
+        step = self.steps[name]
+
+        if not step['inputs']:
+            return False  # sources are always fetched again
+
+        if any(not os.path.exists(location) for location in step['outputs']):
+            return False
+
+        return self.state['steps'].get(name, {}).get('fingerprint') == fingerprint
+
+    def run(self, targets=None, offline=False, force=False, workers=4, dry_run=False):
+        """
+        Run the targets and the steps they depend on, skipping steps that are up to date
+
+        Returns the status and run time of each step.
+        """
+        selected = self.select(targets)
+
+        results = {}  # status and seconds of each finished step
+        pending = list(selected)
+        running = {}  # step of each running future
+
+        start = time.time()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    statuses = [results.get(dependency, {}).get('status') for dependency in self.dependencies[name] if dependency in selected]
+
+                    if any(status is None for status in statuses):
+                        continue  # wait for the steps it depends on
+
+                    pending.remove(name)
+
+                    if any(status in ('failed', 'blocked') for status in statuses):
+                        results[name] = {'status': 'blocked', 'seconds': 0.0}
+                        continue
+
+                    if offline and not self.steps[name]['inputs']:
+                        results[name] = {'status': 'offline', 'seconds': 0.0}
+                        continue
+
+                    if dry_run and 'would run' in statuses:
+                        results[name] = {'status': 'would run', 'seconds': 0.0}  # its inputs would be rewritten first
+                        continue
+
+                    fingerprint = self.fingerprint(name)
+
+                    if not force and self.is_current(name, fingerprint):
+                        results[name] = {'status': 'skipped', 'seconds': 0.0}
+                        continue
+
+                    if dry_run:
+                        results[name] = {'status': 'would run', 'seconds': 0.0}
+                        continue
+
+                    print(u"running {}".format(name))
+                    running[executor.submit(self.run_step, name)] = (name, fingerprint)
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    name, fingerprint = running.pop(future)
+                    returncode, seconds = future.result()
+
+                    if returncode == 0:
+                        results[name] = {'status': 'ran', 'seconds': seconds}
+
+                        # inputs the step rewrote itself are current as it left them
+                        for location in set(self.steps[name]['inputs']) & set(self.steps[name]['outputs']):
+                            fingerprint['inputs'][location] = self.hash_file(location)
+
+                        self.state['steps'][name] = {'fingerprint': fingerprint, 'seconds': seconds, 'finished': time.strftime('%Y-%m-%dT%H:%M:%S')}
+                    else:
+                        results[name] = {'status': 'failed', 'seconds': seconds}
+                        print(u"{} failed, see {}".format(name, self.log_location(name)))
+
+                    self.save()  # keep finished steps if the run is interrupted
+
+        self.save()
+
+        timings = pandas.DataFrame([
+            {'step': name, 'status': results[name]['status'], 'seconds': results[name]['seconds']}
+            for name in selected
+        ], columns=['step', 'status', 'seconds'])
+
+        print(u"pipeline finished in {:.1f}s".format(time.time() - start))
+
+        return timings
+
+    def run_step(self, name):
+        """
+        Run a step's command in its own process, saving its output to a log file
+
+        Returns the command's return code and how long it took.
+        """
+        os.makedirs(self.log_directory, exist_ok=True)
+
+        start = time.time()
+
+        command = list(self.steps[name]['command'])
+        if command[0].endswith('.py'):
+            command[0] = self.script_location(command[0])
+
+        with open(self.log_location(name), 'w') as log:
+            returncode = subprocess.call([sys.executable] + command, stdout=log, stderr=subprocess.STDOUT)
+
+        return returncode, time.time() - start
+
+    @staticmethod
+    def script_location(script):
+        return os.path.join(SCRIPT_DIRECTORY, script)  # scripts are next to this one
+
+    def log_location(self, name):
+        return os.path.join(self.log_directory, '{}.log'.format(name))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.state_location), exist_ok=True)
+
+        with open(self.state_location, 'w') as f:
+            json.dump(self.state, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,23 +4,37 @@ Pitcher valuation
 """
 
 import argparse
-import datetime
+import os
 
-import joblib
 import numpy
-import pandas
 
+from categories import calculate_category_p_added, category_names, load_category_table, resolve_categories
 from config import REMAINING_WEEKS, N_PITCHERS, N_TEAMS, BATTER_BUDGET_RATIO, LEAGUE_DATA_DIRECTORY
-from utils import load_mapping, load_fangraphs_pitcher_projections, load_espn_positions, load_keepers, add_espn_auction_values, add_roster_state
+import metrics
+from player_ids import load_player_ids
+from playing_time import load_playing_time_model, recent_playing_time
+from snapshots import SNAPSHOTS, record_snapshot
+from utils import load_fangraphs_pitcher_projections, load_espn_positions, load_keepers, add_espn_auction_values, add_roster_state
 
 
 MIN_IP = 1
 
+# pitching categories, see categories.py
+pitcher_categories = [
+    {'name': 'IP', 'stat': 'IP_per_week', 'model': 'IP'},
+    {'name': 'W', 'stat': 'W_per_week', 'model': 'W'},
+    {'name': 'SV', 'stat': 'SV_per_week', 'model': 'SV'},
+    {'name': 'ER', 'stat': 'ERA', 'denominator': 'IP_per_week', 'per': 9, 'lower_is_better': True, 'model': 'ERA'},
+    {'name': 'WH', 'stat': 'WHIP', 'denominator': 'IP_per_week', 'lower_is_better': True, 'model': 'WHIP'},
+    {'name': 'K', 'stat': 'K9', 'denominator': 'IP_per_week', 'per': 9, 'model': 'K9'},
+]
+
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--draft", action="store_true", help="prepare for auction draft")
     parser.add_argument("-l14pt", action="store_true", help="use last 14 days of playing time")
+    parser.add_argument("--ewpt", action="store_true", help="use exponentially weighted playing time from the archived playing time snapshots")
     parser.add_argument("--projection", default="rfangraphsdc", help="projection system to use, choices are rfangraphs / steamer600u")
     args = parser.parse_args()
 
@@ -30,16 +44,9 @@ def main():
         projection_type = args.projection
 
     # calculate win probability added
-    pitchers = calculate_p_added(projection_type, args.draft, args.l14pt)
-
-    pitchers = calculate_replacement_score(pitchers)
-
-    # adjust win probability for positional scarcity
-    pitchers['adj_p_added_per_week'] = pitchers['p_added_per_week'] - pitchers['rep_p_added_per_week']
+    pitchers = calculate_p_added(projection_type, args.draft, args.l14pt, args.ewpt)
 
-    pitchers = pitchers.sort_values('adj_p_added_per_week', ascending=False)
-
-    pitchers = add_valuation(pitchers)
+    pitchers = value_pitchers(pitchers)
 
     if args.draft:
         pitchers = add_inflation(pitchers)
@@ -71,6 +78,8 @@ def main():
         'ratios_p_added_per_week',
         'IP_per_week',
         'l14_IP_per_week',
+        'ew_IP_per_week',
+        'role',
         'GS',
         'G',
         'IP',
@@ -88,19 +97,42 @@ def main():
         'K_p_added_per_week',
         'weeks',
         'mW_per_week',
+        'fg_id',
+        'espn_id',
         ]
 
     pitchers = pitchers.sort_values('p_added_per_week', ascending=False)
 
     output_columns =  [col for col in columns if col in pitchers.columns]
 
-    pitchers.to_csv('{}/valuations/pitcher_{:%Y-%m-%d}.csv'.format(
-        LEAGUE_DATA_DIRECTORY,
-        datetime.datetime.today()
-    ), index=False, columns=output_columns, encoding='utf8', float_format='%.2f')
-    pitchers.to_csv('{}/pitcher_valuation.csv'.format(
-        LEAGUE_DATA_DIRECTORY
-    ), index=False, columns=output_columns, encoding='utf8', float_format='%.2f')
+    with metrics.span('write_valuations') as span:
+        span['rows'] = len(pitchers)
+
+        location = '{}/pitcher_valuation.csv'.format(
+            LEAGUE_DATA_DIRECTORY
+        )
+
+        pitchers.to_csv(location, index=False, columns=output_columns, encoding='utf8', float_format='%.2f')
+
+        record_snapshot(os.path.join(LEAGUE_DATA_DIRECTORY, SNAPSHOTS), 'pitcher_valuation', location)
+
+
+@metrics.timed
+def value_pitchers(pitchers):
+    """
+    Adjust win probability added for replacement level and convert to dollar values
+
+    """
+    pitchers = calculate_replacement_score(pitchers)
+
+    # adjust win probability for positional scarcity
+    pitchers['adj_p_added_per_week'] = pitchers['p_added_per_week'] - pitchers['rep_p_added_per_week']
+
+    pitchers = pitchers.sort_values('adj_p_added_per_week', ascending=False)
+
+    pitchers = add_valuation(pitchers)
+
+    return pitchers
 
 
 def adjust_saves(projections):
@@ -110,103 +142,67 @@ def adjust_saves(projections):
     return projections
     
 
-def calculate_p_added(projection_type, draft=False, l14pt=False):
+@metrics.timed
+def calculate_p_added(projection_type, draft=False, l14pt=False, ewpt=False):
     """
     Calculate probability added for pitchers from projected stats
 
     Use the marginal win probability over mean of each stat
 
     """
-    mapping = load_mapping()
+    with metrics.span('load_inputs'):
+        player_ids = load_player_ids()
 
-    projections = load_fangraphs_pitcher_projections(projection_type)
-    projections = projections[projections['IP'] > MIN_IP].copy()  # only consider pitchers projected for more than MIN_IP IP
-    # projections = projections[projections['Team'].notnull()]  # remove pitchers with no team
+        projections = load_fangraphs_pitcher_projections(projection_type)
+        projections = projections[projections['IP'] > MIN_IP].copy()  # only consider pitchers projected for more than MIN_IP IP
+        # projections = projections[projections['Team'].notnull()]  # remove pitchers with no team
 
-    positions = load_espn_positions()
-    # positions = correct_pitcher_positions(positions)
+        positions = load_espn_positions()
+        # positions = correct_pitcher_positions(positions)
 
     projections = adjust_saves(projections)
 
-    pitchers = projections.merge(mapping[['mlb_id', 'fg_id', 'espn_id']], how='left', on='fg_id')
-    pitchers = pitchers.merge(positions, how='left', on='espn_id')
+    with metrics.span('merge_positions') as span:
+        projections['mlb_id'] = player_ids.translate(projections['fg_id'], 'fg', 'mlb')
+        projections['espn_id'] = player_ids.translate(projections['fg_id'], 'fg', 'espn')
+
+        pitchers = projections.merge(positions, how='left', on='espn_id')
+        span['rows'] = len(pitchers)
 
-    if l14pt:
+    if ewpt:
+        pitchers = add_weighted_playing_time(pitchers)  # add in the weighted recent playing time for pitchers
+    elif l14pt:
         pitchers = add_playing_time(pitchers)  # add in the latest playing time for pitchers
     else:
         pitchers['IP_per_week'] = pitchers['IP'] / REMAINING_WEEKS
         pitchers['weeks'] = REMAINING_WEEKS
 
-    pitcher_categories_info = joblib.load('{}/pitchers.pickle'.format(LEAGUE_DATA_DIRECTORY))  # load results of the logistic regression
-
-    base_team_probabilities = {
-        'SV': 0.5,
-        'ERA': 0.5,
-        'WHIP': 0.5,
-        'K9': 0.5,
-        'W': 0.5,
-        'IP': 0.5,
-    }
+    # team stats needed to have a 50% chance of winning each category, and the win probability added for an additional unit, from prob_added.py
+    base_level, p_added = load_category_table(os.path.join(LEAGUE_DATA_DIRECTORY, 'pitchers.json'))
 
-    # calculate what team stats are needed to have a 50% chance of winning the category (or whatever % is set in base_team_probabilities)
-    pitcher_categories_info['base_level'] = {}
+    print(base_level)
+    print(p_added)
 
-    for cat, lm in pitcher_categories_info['models'].items():
-        base_level = (numpy.log(-base_team_probabilities[cat] / (base_team_probabilities[cat] - 1)) - lm.intercept_[0]) / lm.coef_[0][0]
-
-        pitcher_categories_info['base_level'][cat] = base_level
-
-    pitcher_categories_info['p_added_new'] = {}
-
-    team_IP_per_week = pitcher_categories_info['base_level']['IP']  # adjust if team strategy is different
-
-    # calculate how much win probability is added for an additional unit for each category
-    for cat, _ in pitcher_categories_info['models'].items():
-        print(cat)
-
-        x_0 = pitcher_categories_info['base_level'][cat]
-
-        if cat in ['ERA', 'K9']:
-            x_1 = (x_0 / 9 * team_IP_per_week + 1) / team_IP_per_week * 9
-        elif cat in ['WHIP']:
-            x_1 = (x_0 * team_IP_per_week + 1) / team_IP_per_week
-        else:
-            x_1 = x_0 + 1
-
-        print(x_0, x_1)
-
-        x = pitcher_categories_info['models'][cat].predict_proba(numpy.array([x_0, x_1]).reshape(-1, 1))[:, 1]
-        pitcher_categories_info['p_added'][cat] = x[1] - x[0]
-
-    print(pitcher_categories_info['p_added'])
+    metrics.note(rep_level=base_level, p_added=p_added)
 
     # normalize pitcher production to a weekly basis
     pitchers['W_per_week'] = pitchers['W'] / pitchers['weeks']
     pitchers['SV_per_week'] = pitchers['SV'] / pitchers['weeks']
-    pitchers['ER_per_week'] = pitchers['ERA'] / 9 * pitchers['IP_per_week']
-    pitchers['WH_per_week'] = pitchers['WHIP'] * pitchers['IP_per_week']
-    pitchers['K_per_week'] = pitchers['K9'] / 9 * pitchers['IP_per_week']
 
-    # calculate the marginal pitcher production over the base level
-    pitchers['mIP_per_week'] = pitchers['IP_per_week'] - (pitcher_categories_info['base_level']['IP'] / N_PITCHERS)
-    pitchers['mW_per_week'] = pitchers['W_per_week'] - (pitcher_categories_info['base_level']['W'] / N_PITCHERS)
-    pitchers['mSV_per_week'] = pitchers['SV_per_week'] - (pitcher_categories_info['base_level']['SV'] / N_PITCHERS)
+    categories = resolve_categories(pitcher_categories, p_added, base_level)
 
-    pitchers['mER_per_week'] = (pitchers['ERA'] - pitcher_categories_info['base_level']['ERA']) / 9 * pitchers['IP_per_week']  # use ERA over ER for more accuracy when IP is small
-    pitchers['mWH_per_week'] = (pitchers['WHIP'] - pitcher_categories_info['base_level']['WHIP']) * pitchers['IP_per_week']  # use WHIP over BB and H for more accuracy when IP is small
-    pitchers['mK_per_week'] = (pitchers['K9'] - pitcher_categories_info['base_level']['K9']) / 9 * pitchers['IP_per_week']
+    # calculate the marginal pitcher production over the base level, and convert to win probability
+    # use ERA, WHIP and K9 over ER, BB and H, and K for more accuracy when IP is small
+    with metrics.span('category_p_added'):
+        marginals, p_added = calculate_category_p_added(pitchers, categories, n_players=N_PITCHERS)
 
-    probability_key = 'p_added'
+    for i, category in enumerate(categories):
+        pitchers['{}_p_added_per_week'.format(category['name'])] = p_added[:, i]
 
-    pitchers['IP_p_added_per_week'] = pitchers['mIP_per_week'] * pitcher_categories_info[probability_key]['IP']
-    pitchers['W_p_added_per_week'] = pitchers['mW_per_week'] * pitcher_categories_info[probability_key]['W']
-    pitchers['SV_p_added_per_week'] = pitchers['mSV_per_week'] * pitcher_categories_info[probability_key]['SV']
-    pitchers['ER_p_added_per_week'] = -1.0 * pitchers['mER_per_week'] * pitcher_categories_info[probability_key]['ERA']
-    pitchers['WH_p_added_per_week'] = -1.0 * pitchers['mWH_per_week'] * pitcher_categories_info[probability_key]['WHIP']
-    pitchers['K_p_added_per_week'] = pitchers['mK_per_week'] * pitcher_categories_info[probability_key]['K9']
+    pitchers['mW_per_week'] = marginals[:, category_names(categories).index('W')]
 
     # cumulative win probability added across all categories
-    pitchers['p_added_per_week'] = pitchers['IP_p_added_per_week'] + pitchers['W_p_added_per_week'] + pitchers['SV_p_added_per_week'] + pitchers['ER_p_added_per_week'] + pitchers['WH_p_added_per_week'] + pitchers['K_p_added_per_week']
+    pitchers['p_added_per_week'] = p_added.sum(axis=1)
     # win probability added for only the ratio categories
     pitchers['ratios_p_added_per_week'] = pitchers['ER_p_added_per_week'] + pitchers['WH_p_added_per_week'] + pitchers['K_p_added_per_week']
 
@@ -216,36 +212,49 @@ def calculate_p_added(projection_type, draft=False, l14pt=False):
     return pitchers
 
 
+@metrics.timed
 def add_playing_time(pitchers):
     """
     Add pitchers' IP from the past 14 days
 
     """
-    # start by calculating the number of games the team has played from the batter playing time data
-    batter_playing_time = pandas.read_csv('batter_playing_time.csv', encoding="utf-8-sig", error_bad_lines=False, dtype={'playerid': object})
+    playing_time = recent_playing_time('pitcher')
 
-    batter_playing_time.rename(columns={'"Name"': "name", 'Name': "name", '2B': "D", '3B': "T"}, inplace=True)  # columns can't begin with numbers
+    playing_time = playing_time.rename(columns={'IP_per_week': 'l14_IP_per_week'})
 
-    team_games = batter_playing_time.groupby('Team', as_index=False).aggregate({'G': 'max'})
-    team_games.rename(columns={'G': 'team_G'}, inplace=True)
+    pitchers = pitchers.merge(playing_time[['fg_id', 'l14_IP_per_week']], how='left', on='fg_id')
+    pitchers['l14_IP_per_week'] = pitchers['l14_IP_per_week'].fillna(0)
 
-    # load pitcher playing time
-    playing_time = pandas.read_csv('pitcher_playing_time.csv', encoding="utf-8-sig", error_bad_lines=False, dtype={'playerid': object})
+    pitchers = add_projected_weeks(pitchers)
 
-    playing_time.rename(columns={'"Name"': "name", 'Name': "name", 'K/9': "K9", 'SO': "K"}, inplace=True)
+    pitchers['IP_per_week'] = pitchers['l14_IP_per_week']
 
-    playing_time = playing_time.merge(team_games, on='Team')
+    return pitchers
 
-    # any pitcher that started a game counts as a SP
-    playing_time['SP'] = playing_time['GS'] > 0
 
-    # if SP, IP per week is based on IP per start, assuming 1 start a week
-    # if RP, IP per week is based on IP per team game, assuming 6 games a week
-    playing_time['l14_IP_per_week'] = (playing_time['IP'] / playing_time['GS']).where(playing_time['SP'], playing_time['IP'] / playing_time['team_G'] * 6)
+@metrics.timed
+def add_weighted_playing_time(pitchers):
+    """
+    Add pitchers' exponentially weighted IP from the archived playing time snapshots
+
+    """
+    playing_time = load_playing_time_model('pitcher')
+
+    pitchers = pitchers.merge(playing_time[['fg_id', 'ew_IP_per_week', 'role']], how='left', on='fg_id')
+    pitchers['ew_IP_per_week'] = pitchers['ew_IP_per_week'].fillna(0)
+
+    pitchers = add_projected_weeks(pitchers)
+
+    pitchers['IP_per_week'] = pitchers['ew_IP_per_week']
+
+    return pitchers
 
-    pitchers = pitchers.merge(playing_time[['playerid', 'l14_IP_per_week']], how='left', on='playerid')
-    pitchers['l14_IP_per_week'] = pitchers['l14_IP_per_week'].fillna(0)
 
+def add_projected_weeks(pitchers):
+    """
+    Add the number of weeks each pitcher is projected to pitch, from his projected starts and relief appearances
+
+    """
     pitchers['is_RP'] = (pitchers['GS'] < 1)
 
     pitchers['relief_IP'] = pitchers['G'] - pitchers['GS']  # assume relief appearances are for 1 IP
@@ -261,11 +270,10 @@ def add_playing_time(pitchers):
     # number of weeks a pitcher is projected to pitch
     pitchers['weeks'] = pitchers['relief_IP'] / default_relief_workload + pitchers['GS'] / default_start_workload
 
-    pitchers['IP_per_week'] = pitchers['l14_IP_per_week']
-
     return pitchers
 
 
+@metrics.timed
 def calculate_replacement_score(pitchers):
     """
     Calculate the replacement level by position
@@ -280,9 +288,12 @@ def calculate_replacement_score(pitchers):
 
     pitchers['rep_p_added_per_week'] = replacement_level['P']
 
+    metrics.note(replacement_level={position: float(rep_level) for position, rep_level in replacement_level.items()})
+
     return pitchers
 
 
+@metrics.timed
 def add_valuation(pitchers):
     """
     Given the adjusted win probability, calculate the dollar value using a fixed batter / pitcher ratio
@@ -295,11 +306,14 @@ def add_valuation(pitchers):
 
     print(u"$ per win probability (flat): {}".format(dollars_per_adj_p_added_flat))
 
+    metrics.note(dollars_per_p_added_flat=float(dollars_per_adj_p_added_flat))
+
     pitchers['valuation_flat'] = pitchers['adj_p_added_per_week'] * dollars_per_adj_p_added_flat
 
     return pitchers
 
 
+@metrics.timed
 def add_inflation(pitchers):
     """
     Adjust valuation to account for keepers causing inflation
@@ -322,6 +336,7 @@ def add_inflation(pitchers):
 
     dollars_per_adj_p_added_inflation = inflation_pitcher_budget / numpy.sum(free_agents['adj_p_added_per_week'])
     print(u"$ per win probability with inflation: {}".format(dollars_per_adj_p_added_inflation))
+    metrics.note(dollars_per_p_added_inflation=float(dollars_per_adj_p_added_inflation))
     print(u"remaining pitcher value: {}".format(numpy.sum(free_agents['adj_p_added_per_week'])))
 
     pitchers['valuation_inflation'] = pitchers['adj_p_added_per_week'] * dollars_per_adj_p_added_inflation
@@ -330,4 +345,5 @@ def add_inflation(pitchers):
 
 
 if __name__ == '__main__':
-    main()
+    with metrics.run('pitcher_valuation'):
+        main()
@@ -0,0 +1,153 @@
+"""
+Player id registry
+
+Each data source uses different ids for players. The registry loads the player mapping once, indexes it by every id namespace, and translates ids between namespaces.
+
+Some sources use more than one id for a player (e.g. Yahoo lists Shohei Ohtani separately as a batter and as a pitcher). These aliases are kept as data in `player_id_aliases.csv`.
+
+"""
+
+import os
+
+import numpy
+import pandas
+
+from config import DATA_DIRECTORY
+
+
+# id namespaces and their column in the player mapping
+NAMESPACES = {
+    'mlb': 'mlb_id',
+    'fg': 'fg_id',
+    'bis': 'bis_id',
+    'stats': 'stats_id',
+    'espn': 'espn_id',
+    'yahoo': 'yahoo_id',
+}
+
+_registries = {}  # loaded registries, by location of the player mapping
+
+
+def load_player_ids(location=None, aliases_location=None):
+    """
+    Load the player id registry, shared by every caller in the process
+
+    The registry is reloaded if the player mapping file has changed since it was loaded.
+    """
+    if location is None:
+        location = os.path.join(DATA_DIRECTORY, 'player_mapping.csv')
+
+    if aliases_location is None:
+        aliases_location = os.path.join(DATA_DIRECTORY, 'player_id_aliases.csv')
+
+    mtime = os.stat(location).st_mtime_ns
+
+    if location not in _registries or _registries[location][0] != mtime:
+        mapping = pandas.read_csv(location, dtype=object, encoding='utf-8')
+
+        if os.path.exists(aliases_location):
+            aliases = pandas.read_csv(aliases_location, dtype=object, comment='#')
+        else:
+            aliases = None
+
+        _registries[location] = (mtime, PlayerIds(mapping, aliases))
+
+    return _registries[location][1]
+
+
+def normalize_ids(ids):
+    """
+    Convert ids to strings, with NaN for missing ids
+
+    Ids can come in as strings, integers, nullable integers, or floats (e.g. 10835.0 when a column has missing values).
+    """
+    ids = pandas.Series(ids)
+
+    if pandas.api.types.is_numeric_dtype(ids):
+        ids = ids.astype('Int64')
+
+    return ids.astype(str).str.replace(r'\.0$', '', regex=True).where(ids.notnull())
+
+
+class PlayerIds(object):
+    """
+    Player mapping indexed by every id namespace
+    """
+    def __init__(self, mapping, aliases=None):
+        mapping = mapping.copy()
+
+        # Fangraphs ids are BIS ids if numeric, otherwise STATS ids
+        fg_ids = normalize_ids(mapping['fg_id'])
+        is_bis = fg_ids.str.isnumeric().fillna(False).astype(bool)
+        mapping['bis_id'] = fg_ids.where(is_bis)
+        mapping['stats_id'] = fg_ids.where(~is_bis & fg_ids.notnull())
+
+        for column in NAMESPACES.values():
+            if column in mapping.columns:
+                mapping[column] = normalize_ids(mapping[column]).values
+
+        self.mapping = mapping.reset_index(drop=True)
+
+        self.indexes = {}
+        for namespace, column in NAMESPACES.items():
+            if column in self.mapping.columns:
+                ids = self.mapping[column].dropna().drop_duplicates(keep='first')
+                self.indexes[namespace] = (pandas.Index(ids.values), ids.index.values)
+
+        self.aliases = {}
+        if aliases is not None:
+            for namespace, group in aliases.groupby('namespace'):
+                self.aliases[namespace] = pandas.Series(
+                    normalize_ids(group['player_id']).values,
+                    index=normalize_ids(group['alias_id']).values
+                )
+
+    def resolve_aliases(self, ids, namespace):
+        """
+        Replace alias ids with the player's id in the namespace
+        """
+        ids = normalize_ids(ids)
+
+        if namespace in self.aliases:
+            ids = ids.replace(self.aliases[namespace].to_dict())
+
+        return ids
+
+    def rows(self, ids, namespace):
+        """
+        Positions of `ids` in the mapping, or -1 if they aren't mapped
+        """
+        index, positions = self.indexes[namespace]
+
+        found = index.get_indexer(self.resolve_aliases(ids, namespace).values)
+
+        return numpy.where(found >= 0, positions[found], -1)
+
+    def translate(self, ids, from_namespace, to_namespace, dtype=None):
+        """
+        Translate ids from one namespace to another, with NaN if the player isn't mapped
+
+        Returns a Series aligned to `ids` if it is a Series. Ids are strings, unless `dtype` is given (e.g. 'Int64').
+        """
+        rows = self.rows(ids, from_namespace)
+
+        values = self.mapping[NAMESPACES[to_namespace]].values.astype(object)
+        translated = numpy.where(rows >= 0, values[rows], numpy.nan)
+
+        translated = pandas.Series(translated, index=ids.index if isinstance(ids, pandas.Series) else None, dtype=object)
+
+        if dtype is not None:
+            translated = pandas.to_numeric(translated).astype(dtype)
+
+        return translated
+
+    def frame(self, dtypes=None):
+        """
+        Copy of the player mapping, with id columns converted to `dtypes`
+        """
+        mapping = self.mapping.copy()
+
+        for column, dtype in (dtypes or {}).items():
+            mapping[column] = pandas.to_numeric(mapping[column]).astype(dtype)
+
+        return mapping
@@ -0,0 +1,282 @@
+"""
+Playing time model
+
+Builds exponentially weighted playing time from the Fangraphs playing time snapshots recorded in the snapshot store in `data/snapshots` by scrape_playing_time.py (see snapshots.py). Each snapshot covers the past 14 days.
+
+New snapshots are ingested once, in date order, into a per player history. The weighted averages are updated incrementally from the new snapshots, so the store isn't re-read on every run. The model is saved in the cache directory.
+
+The latest playing time for batters and pitchers is also kept in memory as a single table, parsed once for every change to the files.
+
+"""
+
+import datetime
+import os
+
+import numpy
+import pandas
+
+from config import DATA_DIRECTORY
+from snapshots import SNAPSHOTS, SnapshotStore
+from utils import CACHE_DIRECTORY, load_playing_time, parse_playing_time, playing_time_location
+
+
+HALF_LIFE = 14.0  # days for the weight of a snapshot to halve
+
+GAMES_PER_WEEK = 6  # prorate playing time so that each player gets 6 games in a week
+
+SNAPSHOT_DAYS = 14  # days covered by each snapshot
+
+# rates averaged for each player type, and the rate for players missing from a snapshot (None if the snapshot doesn't count)
+rates = {
+    'batter': {'PA_per_week': 0.0, 'G_share': 0.0},
+    'pitcher': {'IP_per_week': 0.0, 'GS_share': None},
+}
+
+_recent = {}  # latest playing time table, with the modification times of the files it was built from
+
+
+def main():
+    for player_type in rates:
+        model = PlayingTimeModel(player_type)
+        new_dates = model.update()
+
+        print(u"{}: ingested {} new snapshots, {} players".format(player_type, len(new_dates), len(model.state)))
+
+
+def load_playing_time_model(player_type, half_life=HALF_LIFE):
+    """
+    Exponentially weighted playing time for batters or pitchers, updated with any new snapshots
+
+    """
+    model = PlayingTimeModel(player_type, half_life)
+    model.update()
+
+    return model.weighted()
+
+
+def load_recent_playing_time():
+    """
+    Playing time from the past 14 days for batters and pitchers, in one table
+
+    The table is kept in memory until either file changes, so each file is parsed once however many times it's used. Team games come from the batters and are shared with the pitchers.
+
+    """
+    mtimes = tuple(os.stat(playing_time_location(player_type)).st_mtime_ns for player_type in rates)
+
+    if _recent.get('mtimes') != mtimes:
+        batters = load_playing_time('batter')
+        pitchers = load_playing_time('pitcher')
+
+        games = team_games(batters)
+
+        _recent['table'] = pandas.concat([
+            add_rates(batters, 'batter', games),
+            add_rates(pitchers, 'pitcher', games),
+        ], ignore_index=True, sort=False)
+        _recent['team_games'] = games
+        _recent['mtimes'] = mtimes
+
+    return _recent['table']
+
+
+def recent_playing_time(player_type):
+    """
+    Playing time from the past 14 days for batters or pitchers, in the order of the leaderboard
+    """
+    playing_time = load_recent_playing_time()
+
+    return playing_time[playing_time['player_type'] == player_type]
+
+
+def team_games(batters):
+    """
+    Games played by each team, from the most games played by any of its batters
+    """
+    return batters.groupby('Team')['G'].max()
+
+
+def add_rates(playing_time, player_type, games):
+    """
+    Add playing time rates, prorated by the games each team played
+
+    Pitchers who started a game are SP, with IP per week based on IP per start, assuming 1 start a week. RP get IP per team game.
+
+    """
+    playing_time = playing_time.copy()
+
+    playing_time['player_type'] = player_type
+    playing_time['team_G'] = playing_time['Team'].map(games).fillna(SNAPSHOT_DAYS * GAMES_PER_WEEK / 7.0)
+
+    if player_type == 'batter':
+        playing_time['PA_per_week'] = playing_time['PA'] / playing_time['team_G'] * GAMES_PER_WEEK
+        playing_time['G_share'] = playing_time['G'] / playing_time['team_G']  # % of possible games played
+    else:
+        playing_time['SP'] = playing_time['GS'] > 0
+        playing_time['IP_per_week'] = (playing_time['IP'] / playing_time['GS']).where(
+            playing_time['SP'],
+            playing_time['IP'] / playing_time['team_G'] * GAMES_PER_WEEK
+        )
+        playing_time['GS_share'] = playing_time['GS'] / playing_time['G'].where(playing_time['G'] > 0)
+
+    return playing_time
+
+
+class PlayingTimeModel(object):
+    """
+    Exponentially weighted playing time rates for each player, from daily snapshots
+
+    """
+    def __init__(self, player_type, half_life=HALF_LIFE, directory=None):
+        self.player_type = player_type
+        self.half_life = half_life
+        self.store = SnapshotStore(directory or os.path.join(DATA_DIRECTORY, SNAPSHOTS))
+
+        self.location = os.path.join(CACHE_DIRECTORY, 'playing_time_model_{}.pickle'.format(player_type))
+
+        self.history = pandas.DataFrame()  # rates for each player in each snapshot
+        self.state = self.empty_state()  # weighted sums of rates for each player, as of `self.last_date`
+        self.last_date = None
+
+        if os.path.exists(self.location):
+            saved = pandas.read_pickle(self.location)
+
+            self.history = saved['history']
+
+            if saved['half_life'] == half_life:
+                self.state = saved['state']
+                self.last_date = saved['last_date']
+            else:
+                self.rebuild()  # weights changed, recompute the averages from the history
+
+    def empty_state(self):
+        columns = ['Team', 'last_date'] + ['{}_{}'.format(rate, x) for rate in rates[self.player_type] for x in ['sum', 'weight']]
+
+        return pandas.DataFrame(columns=columns, index=pandas.Index([], name='fg_id'))
+
+    def snapshots(self, player_type=None):
+        """
+        Dates of the recorded snapshots, in date order
+        """
+        dates = self.store.dates('{}_playing_time'.format(player_type or self.player_type))
+
+        return [datetime.datetime.strptime(date, '%Y-%m-%d').date() for date in dates]
+
+    def update(self):
+        """
+        Ingest snapshots newer than the last one ingested
+
+        Returns the dates of the new snapshots.
+
+        """
+        new = [date for date in self.snapshots() if self.last_date is None or date > self.last_date]
+
+        if not new:
+            return []
+
+        for date in new:
+            snapshot = self.snapshot_rates(date)
+
+            self.history = pandas.concat([self.history, snapshot], ignore_index=True, sort=False)
+            self.add_snapshot(date, snapshot)
+
+        self.save()
+
+        return new
+
+    def rebuild(self):
+        """
+        Recompute the weighted averages from the history
+        """
+        self.state = self.empty_state()
+        self.last_date = None
+
+        for date, snapshot in self.history.groupby('date', sort=True):
+            self.add_snapshot(date, snapshot)
+
+    def snapshot_rates(self, date):
+        """
+        Playing time rates for each player in a snapshot
+        """
+        playing_time = parse_playing_time(self.store.open('{}_playing_time'.format(self.player_type), date))
+
+        playing_time = add_rates(playing_time, self.player_type, self.snapshot_team_games(date, playing_time))
+        playing_time['date'] = date
+
+        return playing_time[['date', 'fg_id', 'Team', 'team_G'] + list(rates[self.player_type])].drop_duplicates('fg_id')
+
+    def snapshot_team_games(self, date, playing_time):
+        """
+        Games played by each team in a snapshot, from the batters' snapshot on the same date
+        """
+        if self.player_type == 'batter':
+            return team_games(playing_time)
+
+        if date not in self.snapshots('batter'):
+            return {}
+
+        return team_games(parse_playing_time(self.store.open('batter_playing_time', date)))
+
+    def add_snapshot(self, date, snapshot):
+        """
+        Decay the weighted sums to the snapshot's date and add the snapshot's rates
+        """
+        snapshot = snapshot.set_index('fg_id')
+
+        state = self.state.reindex(self.state.index.union(snapshot.index))
+
+        if self.last_date is not None:
+            decay = 0.5 ** ((date - self.last_date).days / self.half_life)
+
+            for rate in rates[self.player_type]:
+                state['{}_sum'.format(rate)] *= decay
+                state['{}_weight'.format(rate)] *= decay
+
+        for rate, missing in rates[self.player_type].items():
+            values = snapshot[rate].reindex(state.index)
+
+            if missing is not None:
+                values = values.fillna(missing)
+
+            state['{}_sum'.format(rate)] = state['{}_sum'.format(rate)].fillna(0) + values.fillna(0)
+            state['{}_weight'.format(rate)] = state['{}_weight'.format(rate)].fillna(0) + values.notnull()
+
+        state.loc[snapshot.index, 'Team'] = snapshot['Team']
+        state.loc[snapshot.index, 'last_date'] = date
+
+        self.state = state
+        self.last_date = date
+
+    def weighted(self):
+        """
+        Exponentially weighted rates for each player, with each player's role
+        """
+        weighted = pandas.DataFrame({'Team': self.state['Team'], 'last_date': self.state['last_date']}, index=self.state.index)
+
+        for rate in rates[self.player_type]:
+            weighted['ew_{}'.format(rate)] = (self.state['{}_sum'.format(rate)] / self.state['{}_weight'.format(rate)].where(self.state['{}_weight'.format(rate)] > 0)).astype(float)
+
+        if self.player_type == 'batter':
+            weighted['role'] = numpy.select(
+                [weighted['ew_G_share'] >= 0.75, weighted['ew_G_share'] >= 0.4],
+                ['full_time', 'platoon'],
+                'bench'
+            )
+        else:
+            weighted['role'] = numpy.where(weighted['ew_GS_share'] >= 0.5, 'SP', 'RP')
+
+        return weighted.reset_index()
+
+    def save(self):
+        if not os.path.exists(CACHE_DIRECTORY):
+            os.makedirs(CACHE_DIRECTORY)
+
+        pandas.to_pickle({
+            'half_life': self.half_life,
+            'last_date': self.last_date,
+            'history': self.history,
+            'state': self.state,
+        }, self.location)
+
+
+if __name__ == '__main__':
+    main()
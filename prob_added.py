@@ -13,82 +13,246 @@ Since each year has 25 scoring weeks, that means that 4 weeks into the current s
 Therefore the current season would have an influence of about 34%. Halfway through the current season (12 weeks) would have an influence of 61%.
 """
 
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
 import os
 
-import joblib
-import numpy
 import pandas
 
 from sklearn.linear_model import LogisticRegression
 
 
+from categories import CATEGORY_TABLE_VERSION, category_table_entry, load_category_models, logistic_level
 from config import CURRENT_YEAR, HISTORICAL_DATA_YEARS, LEAGUE_DATA_DIRECTORY
+import metrics
+from utils import hash_file, load_cached_frame
+
+
+batting_categories = ['ePA', 'R', 'RBI', 'HR', 'TB', 'SB', 'OBP_big']
+pitching_categories = ['IP', 'W', 'SV', 'ERA', 'WHIP', 'K9']
+
+YEAR_DECAY = 0.25  # weight of each previous year relative to the following year
+
+EXCLUDED_TEAMS = [6]
+
+# probability of winning each category that its level is set at; defaults to 50%
+target_probabilities = {}
+
+# rate categories, with the team playing time per week they are over and the units of playing time the rate is per
+# playing time can be a number, or a category whose level is used as the playing time
+rate_categories = {
+    'OBP_big': {'playing_time': 300, 'per': 1000.0},  # assume the team gets 300 PA a week; OBP is in percentage points
+    'ERA': {'playing_time': 'IP', 'per': 9.0},
+    'WHIP': {'playing_time': 'IP', 'per': 1.0},
+    'K9': {'playing_time': 'IP', 'per': 9.0},
+}
 
 
 def main():
-    calculate_probability_added_batting()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--force", action="store_true", help="refit even if the scores haven't changed")
+    parser.add_argument("--processes", type=int, default=1, help="number of processes to fit models in")
+    args = parser.parse_args()
+
+    input_hash = hash_inputs(HISTORICAL_DATA_YEARS)
+
+    if not args.force and models_are_current(input_hash):
+        # the levels and win probability added are cheap to recompute, so settings like target_probabilities take effect without a refit
+        print(u"scores are unchanged, skipping refit and rebuilding the category tables from the saved coefficients")
+        metrics.note(refit=False)
+
+        for filename in ['batters.json', 'pitchers.json']:
+            location = os.path.join(LEAGUE_DATA_DIRECTORY, filename)
+            write_category_table(load_category_models(location), input_hash, location)
+
+        return
 
-    calculate_probability_added_pitching()
+    scores = add_winners(load_scores(HISTORICAL_DATA_YEARS), batting_categories + pitching_categories)
 
+    calculate_probability_added_batting(scores, args.processes, input_hash)
 
-def calculate_probability_added_batting():
+    calculate_probability_added_pitching(scores, args.processes, input_hash)
+
+
+@metrics.timed
+def calculate_probability_added_batting(scores=None, processes=1, input_hash=None):
     """
     Calculate the winning probability added for each category when an additional unit is added
 
     """
-    scores = load_scores(HISTORICAL_DATA_YEARS)
+    if scores is None:
+        scores = add_winners(load_scores(HISTORICAL_DATA_YEARS), batting_categories)
+    if input_hash is None:
+        input_hash = hash_inputs(HISTORICAL_DATA_YEARS)
 
-    scores['ePA'] = scores['AB'] + scores['BB']
-    scores['OBP_big'] = scores['OBP'] * 1000
+    models = fit_models(scores, batting_categories, processes)
 
-    batting_categories = ['ePA', 'R', 'RBI', 'HR', 'TB', 'SB', 'OBP_big']
-    batter_categories_info = {
-        'models': {},
-        'p_added': {},
-    }
+    write_category_table(model_coefficients(models), input_hash, os.path.join(LEAGUE_DATA_DIRECTORY, 'batters.json'))
+
+    return True
 
-    for category in batting_categories:
-        train = scores[['year', 'year_weight', 'matchup_id', category]].copy()
-        train = train[~train[category].isna()].copy()
 
-        train['winner'] = train.groupby('matchup_id')[category].transform(lambda x: numpy.where(x == x.max(), 1, 0))
+@metrics.timed
+def calculate_probability_added_pitching(scores=None, processes=1, input_hash=None):
+    """
+    Calculate the winning probability added for each category when an additional unit is added
+
+    """
+    if scores is None:
+        scores = add_winners(load_scores(HISTORICAL_DATA_YEARS), pitching_categories)
+    if input_hash is None:
+        input_hash = hash_inputs(HISTORICAL_DATA_YEARS)
 
-        lm = LogisticRegression()
-        lm.fit(train[[category]], train['winner'], sample_weight=train['year_weight'])
-        batter_categories_info['models'][category] = lm
+    models = fit_models(scores, pitching_categories, processes)
 
-    joblib.dump(batter_categories_info, os.path.join(LEAGUE_DATA_DIRECTORY,'batters.pickle'))
+    write_category_table(model_coefficients(models), input_hash, os.path.join(LEAGUE_DATA_DIRECTORY, 'pitchers.json'))
 
     return True
 
 
-def calculate_probability_added_pitching():
+@metrics.timed
+def fit_models(scores, categories, processes=1):
     """
-    Calculate the winning probability added for each category when an additional unit is added
+    Fit a logistic regression of winning each category on the category's total
+
+    With more than one process, the categories are fit in parallel.
+
+    """
+    data = []
+
+    for category in categories:
+        train = scores[~scores[category].isna()]
 
+        data.append((
+            train[[category]].values,
+            train['{}_winner'.format(category)].values,
+            train['year_weight'].values
+        ))
+
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            models = list(executor.map(fit_model, *zip(*data)))
+    else:
+        models = [fit_model(*x) for x in data]
+
+    return dict(zip(categories, models))
+
+
+def model_coefficients(models):
+    """
+    (intercept, coef) of each category's fitted logistic regression
     """
-    scores = load_scores(HISTORICAL_DATA_YEARS)
+    return {category: (float(lm.intercept_[0]), float(lm.coef_[0][0])) for category, lm in models.items()}
+
+
+def fit_model(x, winner, weight):
+    """
+    Fit a logistic regression for a single category
+    """
+    lm = LogisticRegression()
+    lm.fit(x, winner, sample_weight=weight)
+
+    return lm
+
+
+def build_category_table(coefs, input_hash=None):
+    """
+    Table of the logistic regression coefficients, level, and win probability added of each category, from the (intercept, coef) of each category
+
+    The level is the team total with the target probability of winning the category, and the win probability added is for one more unit of the category (for rate categories, one more unit of the numerator over the team's playing time). The levels and win probability added are calculated only from the stored coefficients, so they can be reproduced exactly from the table.
 
-    pitcher_categories = ['IP', 'W', 'SV', 'ERA', 'WHIP', 'K9']
-    pitcher_categories_info = {
-        'models': {},
-        'p_added': {},
+    """
+    table = {
+        'version': CATEGORY_TABLE_VERSION,
+        'input_hash': input_hash,
+        'categories': {},
     }
 
-    for category in pitcher_categories:
-        train = scores[['year', 'year_weight', 'matchup_id', category]].copy()
+    for category, (intercept, coef) in coefs.items():
+        step = 1.0
+
+        if category in rate_categories:
+            playing_time = rate_categories[category]['playing_time']
+
+            if playing_time in coefs:
+                playing_time = logistic_level(target_probabilities.get(playing_time, 0.5), *coefs[playing_time])
+
+            step = rate_categories[category]['per'] / playing_time
+
+        table['categories'][category] = category_table_entry(intercept, coef, target_probabilities.get(category, 0.5), step)
+
+    return table
+
+
+@metrics.timed
+def write_category_table(coefs, input_hash, location):
+    """
+    Write the category table for the logistic regression coefficients, unless the file already has the same table
+    """
+    table = build_category_table(coefs, input_hash)
+
+    if not os.path.exists(location) or read_table(location) != table:
+        with open(location, 'w') as f:
+            json.dump(table, f, indent=2)
+
+    for category, entry in table['categories'].items():
+        print(category, entry['level'], entry['p_added'])
+
+    return table
+
+
+@metrics.timed
+def add_winners(scores, categories):
+    """
+    Add whether each team won each category, as `{category}_winner`
+
+    The winner is the team with the higher total; for ERA and WHIP the category valuations account for lower being better.
+
+    """
+    scores = scores.copy()
+
+    if 'ePA' in categories:
+        scores['ePA'] = scores['AB'] + scores['BB']
+    if 'OBP_big' in categories:
+        scores['OBP_big'] = scores['OBP'] * 1000
+
+    best = scores.groupby('matchup_id')[categories].transform('max')
+
+    winners = (scores[categories] == best).astype(int)
+    winners.columns = ['{}_winner'.format(category) for category in categories]
+
+    return pandas.concat([scores, winners], axis=1)
+
+
+def read_table(location):
+    """
+    Category table saved at `location`, without checking its version
+    """
+    with open(location) as f:
+        return json.load(f)
 
-        train['winner'] = train.groupby('matchup_id')[category].transform(lambda x: numpy.where(x == x.max(), 1, 0))
 
-        lm = LogisticRegression()
-        lm.fit(train[[category]], train['winner'], sample_weight=train['year_weight'])
-        pitcher_categories_info['models'][category] = lm
+def models_are_current(input_hash):
+    """
+    Whether the saved models were fit on the same scores and year weights
+    """
+    for filename in ['batters.json', 'pitchers.json']:
+        location = os.path.join(LEAGUE_DATA_DIRECTORY, filename)
 
-    joblib.dump(pitcher_categories_info, os.path.join(LEAGUE_DATA_DIRECTORY, 'pitchers.pickle'))
+        if not os.path.exists(location):
+            return False
+
+        table = read_table(location)
+
+        if table.get('version') != CATEGORY_TABLE_VERSION or table.get('input_hash') != input_hash:
+            return False
 
     return True
 
 
+@metrics.timed
 def load_scores(years):
     """
     Load data files containing scores
@@ -97,26 +261,47 @@ def load_scores(years):
     scores = []
 
     for year in years:
-        scores.append(pandas.read_csv(os.path.join(LEAGUE_DATA_DIRECTORY, 'scores', 'scores_{year}.csv'.format(year=year))))
+        scores.append(load_cached_frame(scores_location(year), pandas.read_csv, 'scores'))
+
+    scores = pandas.concat(scores, ignore_index=True, sort=False)
 
-    scores = pandas.concat(scores)
+    if 'final' in scores.columns:
+        scores = scores[scores['final'].fillna(1) == 1].copy()  # only train on completed matchups
 
-    # create unique matchup is by concating year, matchup period, team id 1, team id 2
-    scores['matchup_id'] = scores['year'].astype(str).str.cat(
-        [
-            scores['matchup_period'].astype(str),
-            scores[['team_id', 'opponent_team_id']].max(axis=1).astype(str),
-            scores[['team_id', 'opponent_team_id']].min(axis=1).astype(str),
-        ],
-        sep='_'
-    )
+    # create unique integer matchup id from year, matchup period, team id 1, team id 2
+    teams = scores[['team_id', 'opponent_team_id']]
+    scores['matchup_id'] = scores.groupby(
+        [scores['year'], scores['matchup_period'], teams.max(axis=1), teams.min(axis=1)],
+        sort=False
+    ).ngroup()
 
-    scores['year_weight'] = 0.25 ** (CURRENT_YEAR - scores['year'])
+    scores['year_weight'] = YEAR_DECAY ** (CURRENT_YEAR - scores['year'])
 
-    scores = scores[scores['team_id'] != 6]
+    scores = scores[~scores['team_id'].isin(EXCLUDED_TEAMS)].copy()
 
     return scores
 
 
+def scores_location(year):
+    return os.path.join(LEAGUE_DATA_DIRECTORY, 'scores', 'scores_{year}.csv'.format(year=year))
+
+
+@metrics.timed
+def hash_inputs(years):
+    """
+    Hash of the score files, year weights, and categories the models are fit on
+    """
+    return hashlib.sha1(json.dumps({
+        'files': [hash_file(scores_location(year)) for year in years],
+        'years': list(years),
+        'current_year': CURRENT_YEAR,
+        'year_decay': YEAR_DECAY,
+        'excluded_teams': EXCLUDED_TEAMS,
+        'batting_categories': batting_categories,
+        'pitching_categories': pitching_categories,
+    }).encode('utf8')).hexdigest()
+
+
 if __name__ == '__main__':
-    main()
+    with metrics.run('prob_added'):
+        main()
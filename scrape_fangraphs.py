@@ -3,11 +3,12 @@ Scrape Fangraphs Depth Charts projections
 """
 
 import argparse
-import datetime
+import os
 
 import requests
 
-from config import fangraphs_form_data
+from config import DATA_DIRECTORY, fangraphs_form_data
+from snapshots import SNAPSHOTS, record_snapshot
 
 
 def main():
@@ -23,9 +24,8 @@ def main():
         projection_types.append("rthebatx")
 
     for projection_type in projection_types:
-        # save projections for current and historical usage
+        # save projections for current usage, and record them in the snapshot store for historical usage
         filenames = [
-            'data/projections/{}_{}_{:%Y-%m-%d}.csv',
             'data/projections/{}_{}.csv'
         ]
 
@@ -46,6 +46,8 @@ def main():
 
             write_csvs(r, projection_type, player_type['type'], filenames)
 
+            record_snapshot(os.path.join(DATA_DIRECTORY, SNAPSHOTS), '{}_{}'.format(projection_type, player_type['type']), filenames[0].format(projection_type, player_type['type']))
+
 
 def write_csvs(r, projection_type, player_type, filenames):
     """
@@ -53,7 +55,7 @@ def write_csvs(r, projection_type, player_type, filenames):
 
     """
     for filename in filenames:
-        with open(filename.format(projection_type, player_type, datetime.datetime.today()), 'wb') as output_file:
+        with open(filename.format(projection_type, player_type), 'wb') as output_file:
             output_file.write(r.text[1:].encode('utf8'))  # remove the first 3 characters which are BOM
 
 
@@ -3,7 +3,6 @@ Scrape Fangraphs playing time in the past 14 days
 
 """
 
-import datetime
 import os
 
 import requests
@@ -13,6 +12,7 @@ from config import (
     DATA_DIRECTORY,
     fangraphs_leaderboard_form_data
 )
+from snapshots import SNAPSHOTS, record_snapshot
 
 
 def main():
@@ -37,9 +37,8 @@ def main():
     }
 
     for player_type in player_types:
-        # save projections for current and historical usage
+        # save playing time for current usage, and record it in the snapshot store for historical usage
         filenames = [
-            os.path.join(DATA_DIRECTORY, 'historical', "{}_playing_time_{:%Y-%m-%d}.csv".format(player_type['type'], datetime.datetime.today())),
             os.path.join(DATA_DIRECTORY, '{}_playing_time.csv'.format(player_type['type']))
         ]
 
@@ -50,6 +49,8 @@ def main():
 
         write_csvs(r, filenames)
 
+        record_snapshot(os.path.join(DATA_DIRECTORY, SNAPSHOTS), '{}_playing_time'.format(player_type['type']), filenames[0])
+
 
 def write_csvs(r, filenames):
     """
@@ -0,0 +1,328 @@
+"""
+Rest of season standings and playoff odds
+
+Simulates the rest of the season from the current standings in `scores_{CURRENT_YEAR}.csv` and the league schedule, to see each team's chances of making the playoffs and winning the title.
+
+Each team's week is the weekly totals of its active lineup (see `simulate.team_players`) from rest of season projections. Each category of each remaining matchup is won with the head to head probability from the categories' logistic regressions (see `categories.category_matchup_probabilities`), independently of the other categories. In the standings, every category is a win or a loss (`EACH_CATEGORY`), or the team that wins more categories wins the matchup.
+
+The top PLAYOFF_TEAMS make the playoffs, with byes for the top seeds if needed. Each round is a single matchup with the teams reseeded, the best remaining seed against the worst, and the higher seed advances on a tie.
+
+The schedule file is a CSV with the `matchup_period`, `team_id` and `opponent_team_id` of each matchup. Matchup periods with final scores are already in the standings, and the rest are simulated.
+
+"""
+
+import argparse
+from multiprocessing import Pool
+import os
+
+import numpy
+import pandas
+
+from categories import category_matchup_probabilities
+from config import CURRENT_YEAR, LEAGUE_DATA_DIRECTORY
+import metrics
+from prob_added import scores_location
+from simulate import batting_counting_stats, load_players, lower_is_better, pitching_counting_stats, pitching_rate_stats, team_players
+from streaming import pitching_categories
+from trade import batting_categories, load_models, stats
+
+
+PLAYOFF_TEAMS = 6  # teams that make the playoffs
+
+EACH_CATEGORY = True  # each category of a matchup counts in the standings, rather than the matchup as a whole
+
+# categories of the scores, with their names in the category models
+score_categories = {
+    'R': 'R',
+    'RBI': 'RBI',
+    'HR': 'HR',
+    'SB': 'SB',
+    'TB': 'TB',
+    'OBP': 'OBP_big',
+    'IP': 'IP',
+    'W': 'W',
+    'SV': 'SV',
+    'ERA': 'ERA',
+    'WHIP': 'WHIP',
+    'K9': 'K9',
+}
+
+_season_data = None  # season inputs in each worker process
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--team", type=int, default=None, help="fantasy team id of my team, to see how --add and --drop change my odds")
+    parser.add_argument("--add", nargs="*", default=[], help="fg_ids of players to add to my team")
+    parser.add_argument("--drop", nargs="*", default=[], help="fg_ids of players to drop from my team")
+    parser.add_argument("-n", type=int, default=50000, help="number of seasons to simulate")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="number of processes to simulate seasons in")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--schedule", default=os.path.join(LEAGUE_DATA_DIRECTORY, 'schedule.csv'), help="league schedule file")
+    parser.add_argument("--batter-projection", default="rthebatx", help="projection system to use for batters")
+    parser.add_argument("--pitcher-projection", default="rfangraphsdc", help="projection system to use for pitchers")
+    args = parser.parse_args()
+
+    if (args.add or args.drop) and args.team is None:
+        parser.error("--add and --drop need --team")
+
+    schedule = load_schedule(args.schedule)
+    scores = load_final_scores(CURRENT_YEAR)
+
+    teams = sorted(set(schedule['team_id']) | set(schedule['opponent_team_id']) | set(scores['team_id']))
+    standings = current_standings(scores).reindex(teams, fill_value=0.0)
+
+    remaining = schedule[~schedule['matchup_period'].isin(scores['matchup_period'])]
+
+    print(u"{} matchup periods played, {} to go".format(scores['matchup_period'].nunique(), remaining['matchup_period'].nunique()))
+
+    batters, pitchers = load_players(args.batter_projection, args.pitcher_projection)
+    models = load_models()
+
+    totals = numpy.array([team_totals(team_players(batters, pitchers, team_id)) for team_id in teams])
+
+    data = prepare_season(teams, standings, remaining, totals, models)
+
+    # the season with a move is simulated with the same random draws, so even without --seed there's one seed for both
+    seed = args.seed if args.seed is not None else numpy.random.SeedSequence().entropy
+
+    odds = simulate_seasons(data, args.n, args.processes, seed)
+    odds.to_csv(os.path.join(LEAGUE_DATA_DIRECTORY, 'season_odds.csv'), index=False, encoding='utf8', float_format='%.4f')
+
+    print(odds.to_string(index=False))
+
+    if args.add or args.drop:
+        totals[teams.index(args.team)] = team_totals(team_players(batters, pitchers, args.team, add=args.add, drop=args.drop))
+
+        moved = simulate_seasons(prepare_season(teams, standings, remaining, totals, models), args.n, args.processes, seed)
+
+        before = odds.set_index('team_id').loc[args.team]
+        after = moved.set_index('team_id').loc[args.team]
+
+        for column in ['playoffs', 'title']:
+            print(u"{}: {:.4f} -> {:.4f} ({:+.4f})".format(column, before[column], after[column], after[column] - before[column]))
+
+
+def load_schedule(location):
+    """
+    Matchups of the season, once each
+    """
+    schedule = pandas.read_csv(location)
+
+    # the schedule may list each matchup for both teams
+    teams = schedule[['team_id', 'opponent_team_id']]
+    schedule = pandas.DataFrame({
+        'matchup_period': schedule['matchup_period'],
+        'team_id': teams.min(axis=1),
+        'opponent_team_id': teams.max(axis=1),
+    })
+
+    return schedule.drop_duplicates().sort_values(['matchup_period', 'team_id']).reset_index(drop=True)
+
+
+def load_final_scores(year):
+    """
+    Scores of the matchup periods that are over this season
+    """
+    location = scores_location(year)
+
+    if not os.path.exists(location):
+        return pandas.DataFrame(columns=['team_id', 'opponent_team_id', 'matchup_period'] + list(score_categories))
+
+    scores = pandas.read_csv(location)
+
+    if 'final' in scores.columns:
+        scores = scores[scores['final'].fillna(1) == 1]
+
+    return scores
+
+
+def current_standings(scores):
+    """
+    Points (wins and half of ties) and games of each team from the final scores, indexed by team_id
+    """
+    opponents = scores[['matchup_period', 'team_id'] + list(score_categories)].rename(columns={'team_id': 'opponent_team_id'})
+
+    scores = scores.merge(opponents, how='inner', on=['matchup_period', 'opponent_team_id'], suffixes=('', '_opponent'))
+
+    won = numpy.zeros(len(scores))
+    lost = numpy.zeros(len(scores))
+
+    for category, model in score_categories.items():
+        total = scores[category].astype(float)
+        opponent = scores['{}_opponent'.format(category)].astype(float)
+
+        if model in lower_is_better:
+            total, opponent = -total, -opponent
+
+        won += total > opponent
+        lost += total < opponent
+
+    if EACH_CATEGORY:
+        points = won + 0.5 * (len(score_categories) - won - lost)
+        games = numpy.full(len(scores), float(len(score_categories)))
+    else:
+        points = (won > lost) + 0.5 * (won == lost)
+        games = numpy.ones(len(scores))
+
+    standings = pandas.DataFrame({'team_id': scores['team_id'], 'points': points, 'games': games})
+
+    return standings.groupby('team_id')[['points', 'games']].sum()
+
+
+def team_totals(team):
+    """
+    Expected weekly totals of a team of (batters, pitchers), as an array of `stats`
+    """
+    batters, pitchers = team
+
+    line = {stat: batters[column].clip(lower=0).sum() for stat, column in batting_counting_stats.items()}
+    line.update({stat: pitchers[column].clip(lower=0).sum() for stat, column in pitching_counting_stats.items()})
+    line.update({stat: (pitchers[rate] / per * pitchers['IP_per_week']).clip(lower=0).sum() for stat, (rate, per) in pitching_rate_stats.items()})
+
+    line['PA'] = batters['PA_per_week'].clip(lower=0).sum()
+    line['OB'] = (batters['OBP'].clip(0, 1) * batters['PA_per_week'].clip(lower=0)).sum()
+    line['IP'] = pitchers['IP_per_week'].clip(lower=0).sum()
+
+    return numpy.array([line[stat] for stat in stats])
+
+
+def prepare_season(teams, standings, schedule, totals, models):
+    """
+    Inputs of the simulation: the current standings, the remaining matchups, and the probability of each team beating each other team in each category
+    """
+    index = {team_id: i for i, team_id in enumerate(teams)}
+
+    categories = dict(batting_categories, **pitching_categories)
+
+    return {
+        'teams': list(teams),
+        'points': standings['points'].to_numpy(dtype=float),
+        'games': standings['games'].to_numpy(dtype=float),
+        'home': schedule['team_id'].map(index).to_numpy(dtype=int),
+        'away': schedule['opponent_team_id'].map(index).to_numpy(dtype=int),
+        'probabilities': category_matchup_probabilities(totals[:, None, :], totals[None, :, :], stats, categories, models, lower_is_better),
+    }
+
+
+def simulate_season(data, n, rng):
+    """
+    Simulate `n` rest of seasons
+
+    Returns each team's final points and whether it made the playoffs in each season, and the champion of each season.
+
+    """
+    probabilities = data['probabilities']
+    home, away = data['home'], data['away']
+
+    n_teams, _, n_categories = probabilities.shape
+
+    # categories won by the first team of each matchup
+    won = (rng.random((n, len(home), n_categories)) < probabilities[home, away]).sum(axis=2)
+
+    if EACH_CATEGORY:
+        home_points, away_points = won, n_categories - won
+        games = n_categories
+    else:
+        home_points = (2 * won > n_categories) + 0.5 * (2 * won == n_categories)
+        away_points = 1 - home_points
+        games = 1
+
+    teams = numpy.arange(n_teams)
+    points = data['points'] + home_points @ (home[:, None] == teams) + away_points @ (away[:, None] == teams)
+
+    matchups = numpy.bincount(home, minlength=n_teams) + numpy.bincount(away, minlength=n_teams)
+    played = data['games'] + games * matchups
+
+    # ties in the standings are broken at random
+    percentage = points / numpy.where(played > 0, played, 1) + 1e-9 * rng.random((n, n_teams))
+    seeds = numpy.argsort(-percentage, axis=1)[:, :PLAYOFF_TEAMS]
+
+    playoffs = numpy.zeros((n, n_teams), dtype=bool)
+    numpy.put_along_axis(playoffs, seeds, True, axis=1)
+
+    return points, playoffs, play_playoffs(seeds, probabilities, rng)
+
+
+def play_playoffs(seeds, probabilities, rng):
+    """
+    Champion of each season's playoffs, from the teams in order of seed
+    """
+    n, n_seeds = seeds.shape
+    n_categories = probabilities.shape[2]
+
+    alive = numpy.tile(numpy.arange(n_seeds), (n, 1))  # seeds still in, in order
+
+    while alive.shape[1] > 1:
+        n_alive = alive.shape[1]
+        byes = 2 ** int(numpy.ceil(numpy.log2(n_alive))) - n_alive
+
+        playing = alive[:, byes:]
+        n_matchups = playing.shape[1] // 2
+
+        higher = playing[:, :n_matchups]
+        lower = playing[:, ::-1][:, :n_matchups]
+
+        teams = numpy.take_along_axis(seeds, higher, axis=1)
+        opponents = numpy.take_along_axis(seeds, lower, axis=1)
+
+        won = (rng.random((n, n_matchups, n_categories)) < probabilities[teams, opponents]).sum(axis=2)
+
+        winners = numpy.where(2 * won >= n_categories, higher, lower)
+
+        alive = numpy.sort(numpy.concatenate([alive[:, :byes], winners], axis=1), axis=1)
+
+    return numpy.take_along_axis(seeds, alive, axis=1)[:, 0]
+
+
+def run_seasons(args):
+    """
+    Simulate a batch of seasons in a worker process
+    """
+    seed, n = args
+
+    return simulate_season(_season_data, n, numpy.random.default_rng(seed))
+
+
+def init_worker(data):
+    global _season_data
+    _season_data = data
+
+
+@metrics.timed
+def simulate_seasons(data, n, processes=1, seed=None, batch_size=1000):
+    """
+    Simulate `n` seasons, in parallel across processes
+
+    Returns each team's current points, expected final points, and chances of making the playoffs and winning the title.
+
+    """
+    batches = [min(batch_size, n - start) for start in range(0, n, batch_size)]
+    seeds = numpy.random.SeedSequence(seed).spawn(len(batches))
+
+    if processes > 1:
+        with Pool(processes, initializer=init_worker, initargs=(data,)) as pool:
+            results = pool.map(run_seasons, zip(seeds, batches))
+    else:
+        init_worker(data)
+        results = [run_seasons(batch) for batch in zip(seeds, batches)]
+
+    points = numpy.concatenate([result[0] for result in results])
+    playoffs = numpy.concatenate([result[1] for result in results])
+    champions = numpy.concatenate([result[2] for result in results])
+
+    odds = pandas.DataFrame({
+        'team_id': data['teams'],
+        'points': data['points'],
+        'games': data['games'],
+        'projected_points': points.mean(axis=0),
+        'playoffs': playoffs.mean(axis=0),
+        'title': numpy.bincount(champions, minlength=len(data['teams'])) / float(n),
+    })
+
+    return odds.sort_values(['playoffs', 'title'], ascending=False)
+
+
+if __name__ == '__main__':
+    with metrics.run('season'):
+        main()
@@ -0,0 +1,280 @@
+"""
+Valuation service
+
+Keeps a league's projections, player mapping, eligibilities, rosters and category values in memory, and answers ranking, valuation and free agent queries over HTTP as JSON.
+
+Input files are polled for changes. New projections or a new player mapping revalue every player, while new eligibilities or rosters are only joined back onto the existing values.
+
+Endpoints:
+
+* `GET /players?type=batters&position=SS&free_agents=1&limit=25`: players ranked by win probability added
+* `GET /players/<fg_id>`: valuation of a single player
+* `GET /status`: when each input was last loaded
+* `POST /refresh`: check the input files for changes now
+
+"""
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from player_ids import load_player_ids
+from yahoo import Yahoo
+
+
+# columns returned when ranking players, in addition to the win probability added columns
+ranking_columns = ['fg_id', 'fg_name', 'Team', 'yahoo_id', 'team_id']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--league", default="yahoo-new", help="league data directory")
+    parser.add_argument("--projections", default="rfangraphsdc", help="projection system to use")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--poll", type=float, default=5.0, help="seconds between checking input files for changes")
+    args = parser.parse_args()
+
+    service = ValuationService(Yahoo(args.league, args.projections))
+    service.watch(args.poll)
+
+    server = make_server(service, args.host, args.port)
+
+    print(u"serving on http://{}:{}".format(args.host, args.port))
+    server.serve_forever()
+
+
+class ValuationService(object):
+    """
+    Player valuations for a league, kept up to date with the league's input files
+    """
+    def __init__(self, league):
+        self.league = league
+
+        self._lock = threading.Lock()  # only one refresh at a time
+        self._mtimes = {}
+        self._valued = None  # valued players, before eligibilities and rosters are joined
+
+        # (valued players with eligibilities and rosters by player type, (player type, row) of each player by fg_id),
+        # swapped in one assignment so a query never mixes two refreshes
+        self.state = ({}, {})
+        self.loaded = {}  # when each input was last loaded
+
+        self.refresh()
+
+    def inputs(self):
+        """
+        Files each input is loaded from
+        """
+        league = self.league
+
+        return {
+            'projections': [
+                league.projections_location(league.projections_name, 'batters'),
+                league.projections_location(league.projections_name, 'pitchers'),
+                league.razzball_location(),
+            ],
+            'mapping': [os.path.join(league.data_directory, "player_mapping.csv")],
+            'eligibilities': [league.elig_location()],
+            'rosters': [league.rosters_location()],
+        }
+
+    def refresh(self):
+        """
+        Reload the inputs whose files have changed, and recompute what depends on them
+
+        Returns the names of the inputs that were reloaded.
+
+        """
+        with self._lock:
+            mtimes = {name: [file_mtime(location) for location in locations] for name, locations in self.inputs().items()}
+            changed = [name for name in mtimes if self._mtimes.get(name) != mtimes[name]]
+
+            if not changed:
+                return changed
+
+            start = time.time()
+            league = self.league
+            initial = self._valued is None  # the league loads every input when it's created
+
+            if initial or 'projections' in changed or 'mapping' in changed:
+                if not initial:
+                    league.player_ids = load_player_ids(self.inputs()['mapping'][0])
+                    league.player_mapping = league.player_ids.frame(league.playerid_dtypes)
+
+                    league.batters = league.load_player_projections(league.projections_name, "batters")
+                    league.pitchers = league.load_player_projections(league.projections_name, "pitchers")
+
+                league.value_players()
+
+                self._valued = (league.batters, league.pitchers)
+
+            if not initial and 'eligibilities' in changed:
+                league.elig = league.load_elig()
+
+            if not initial and 'rosters' in changed:
+                league.rosters = league.load_rosters()
+
+            league.batters, league.pitchers = self._valued
+            league.add_player_state()
+
+            players = {'batters': league.batters, 'pitchers': league.pitchers}
+
+            rows = {}
+            for player_type, frame in players.items():
+                for i, fg_id in enumerate(frame['fg_id'].astype(str)):
+                    rows.setdefault(fg_id, (player_type, i))
+
+            # replace the players all at once, so queries never see a partial refresh
+            self.state = (players, rows)
+
+            self._mtimes = mtimes
+
+            for name in changed:
+                self.loaded[name] = time.time()
+
+            print(u"reloaded {} in {:.2f}s".format(', '.join(changed), time.time() - start))
+
+            return changed
+
+    def watch(self, interval=5.0):
+        """
+        Poll the input files for changes in a background thread
+        """
+        def poll():
+            while True:
+                time.sleep(interval)
+
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(u"failed to refresh: {}".format(e))  # keep serving the last good valuations
+
+        thread = threading.Thread(target=poll, daemon=True)
+        thread.start()
+
+        return thread
+
+    def rank(self, player_type='batters', position=None, free_agents=False, limit=25):
+        """
+        Players ranked by win probability added, optionally only those eligible at `position` or not on a roster
+        """
+        players, _ = self.state
+
+        if player_type not in players:
+            raise ValueError(u"unknown player type {}".format(player_type))
+
+        players = players[player_type]
+
+        if position is not None:
+            if position not in players.columns:
+                raise ValueError(u"unknown position {}".format(position))
+
+            players = players[players[position] == 1]
+
+        if free_agents:
+            players = players[players['team_id'].isnull()]
+
+        columns = [column for column in ranking_columns if column in players.columns] + [column for column in players.columns if column.startswith('p_added')]
+
+        return records(players.head(limit)[columns])
+
+    def player(self, fg_id):
+        """
+        Valuation of a single player
+        """
+        players, rows = self.state
+
+        player_type, i = rows[str(fg_id)]
+
+        player = records(players[player_type].iloc[[i]])[0]
+        player['type'] = player_type
+
+        return player
+
+    def status(self):
+        players, _ = self.state
+
+        return {
+            'loaded': {name: time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(t)) for name, t in self.loaded.items()},
+            'players': {player_type: len(frame) for player_type, frame in players.items()},
+        }
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    JSON API for a valuation service, at `self.server.service`
+    """
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path.strip('/').split('/')
+
+        service = self.server.service
+
+        try:
+            if path == ['players']:
+                body = service.rank(
+                    player_type=query.get('type', 'batters'),
+                    position=query.get('position'),
+                    free_agents=query.get('free_agents') in ('1', 'true'),
+                    limit=int(query.get('limit', 25)))
+            elif len(path) == 2 and path[0] == 'players':
+                body = service.player(path[1])
+            elif path == ['status']:
+                body = service.status()
+            else:
+                return self.respond(404, {'error': 'not found'})
+        except LookupError:
+            return self.respond(404, {'error': 'not found'})
+        except ValueError as e:
+            return self.respond(400, {'error': str(e)})
+
+        self.respond(200, body)
+
+    def do_POST(self):
+        if urlparse(self.path).path.strip('/') != 'refresh':
+            return self.respond(404, {'error': 'not found'})
+
+        self.respond(200, {'changed': self.server.service.refresh()})
+
+    def respond(self, status, body):
+        content = json.dumps(body).encode('utf8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def make_server(service, host='127.0.0.1', port=8000):
+    """
+    HTTP server for a valuation service, handling each request in its own thread
+    """
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.service = service
+
+    return server
+
+
+def records(frame):
+    """
+    Rows of a frame as JSON serializable dicts, with missing values as None
+    """
+    return json.loads(frame.to_json(orient='records'))
+
+
+def file_mtime(location):
+    try:
+        return os.stat(location).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == '__main__':
+    main()
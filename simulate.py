@@ -0,0 +1,194 @@
+"""
+Monte Carlo simulation of weekly head to head matchups
+
+Each player's weekly stat line is sampled from their projections: counting stats are Poisson, and times on base are binomial over PA. The sum of independent Poisson variables is Poisson, so counting stats are sampled once per team rather than once per player.
+
+Innings are sampled too, as Poisson outs for each pitcher, and the pitching rate stats are Poisson over the innings each pitcher threw that week, so a short week for a good pitcher counts less than a long one.
+
+"""
+
+import argparse
+
+import numpy
+
+import batter_valuation
+from config import N_BATTERS, N_PITCHERS
+import pitcher_valuation
+from utils import load_rosters
+
+
+# weekly counting stats sampled as Poisson, with the column of the weekly rate
+batting_counting_stats = {
+    'R': 'R_per_week',
+    'RBI': 'RBI_per_week',
+    'HR': 'HR_per_week',
+    'SB': 'SB_per_week',
+    'TB': 'TB_per_week',
+}
+
+pitching_counting_stats = {
+    'W': 'W_per_week',
+    'SV': 'SV_per_week',
+}
+
+# pitching rate stats sampled as Poisson over each pitcher's sampled IP, with the number of IP the rate is per
+pitching_rate_stats = {
+    'ER': ('ERA', 9),
+    'WH': ('WHIP', 1),
+    'K': ('K9', 9),
+}
+
+# categories that are won with the lower total
+lower_is_better = ['ERA', 'WHIP']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--team", type=int, required=True, help="fantasy team id of my team")
+    parser.add_argument("--opponent", type=int, required=True, help="fantasy team id of the opponent")
+    parser.add_argument("--batter-projection", default="rthebatx", help="projection system to use for batters")
+    parser.add_argument("--pitcher-projection", default="rfangraphsdc", help="projection system to use for pitchers")
+    parser.add_argument("--add", nargs="*", default=[], help="fg_ids of players to add to my team")
+    parser.add_argument("--drop", nargs="*", default=[], help="fg_ids of players to drop from my team")
+    parser.add_argument("-n", type=int, default=100000, help="number of weeks to simulate")
+    args = parser.parse_args()
+
+    batters, pitchers = load_players(args.batter_projection, args.pitcher_projection)
+
+    team = team_players(batters, pitchers, args.team, add=args.add, drop=args.drop)
+    opponent = team_players(batters, pitchers, args.opponent)
+
+    results = simulate_matchup(team, opponent, n=args.n)
+
+    for category, p in results['categories'].items():
+        print(u"{}: {:.3f}".format(category, p))
+
+    print(u"expected categories won: {:.2f}".format(results['expected_categories']))
+    print(u"matchup win probability: {:.3f}".format(results['win']))
+
+
+def load_players(batter_projection="rthebatx", pitcher_projection="rfangraphsdc"):
+    """
+    Load batter and pitcher projections with weekly stat lines and current rosters
+
+    """
+    rosters = load_rosters()[['espn_id', 'fantasy_team_id']]
+
+    batters = batter_valuation.calculate_p_added(batter_projection)
+    pitchers = pitcher_valuation.calculate_p_added(pitcher_projection)
+
+    batters = batters.merge(rosters, how='left', on='espn_id')
+    pitchers = pitchers.merge(rosters, how='left', on='espn_id')
+
+    return batters, pitchers
+
+
+def team_players(batters, pitchers, team_id, add=(), drop=()):
+    """
+    Active batters and pitchers for a team
+
+    The active lineup is the team's N_BATTERS batters and N_PITCHERS pitchers with the most win probability added. Players in `add` and `drop` (by fg_id) are added to and removed from the roster first.
+
+    """
+    team = []
+
+    for players, n in [(batters, N_BATTERS), (pitchers, N_PITCHERS)]:
+        on_roster = ((players['fantasy_team_id'] == team_id) | players['fg_id'].isin(add)) & ~players['fg_id'].isin(drop)
+
+        team.append(players[on_roster].sort_values('p_added_per_week', ascending=False).head(n))
+
+    return tuple(team)
+
+
+def sample_team_weeks(team, n, rng):
+    """
+    Sample `n` weeks of category totals for a team of (batters, pitchers)
+
+    """
+    batters, pitchers = team
+
+    totals = {}
+
+    counting = numpy.array(
+        [batters[col].clip(lower=0).sum() for col in batting_counting_stats.values()] +
+        [pitchers[col].clip(lower=0).sum() for col in pitching_counting_stats.values()]
+    )
+
+    samples = rng.poisson(counting, size=(n, len(counting)))
+
+    names = list(batting_counting_stats) + list(pitching_counting_stats)
+    for i, name in enumerate(names):
+        totals[name] = samples[:, i]
+
+    # each pitcher's innings are Poisson outs, and rate stats are Poisson over the innings pitched
+    IP = rng.poisson(3 * pitchers['IP_per_week'].clip(lower=0).values, size=(n, len(pitchers))) / 3.0
+
+    for name, (rate, per) in pitching_rate_stats.items():
+        totals[name] = rng.poisson(IP @ (pitchers[rate].clip(lower=0).values / per))
+
+    team_IP = IP.sum(axis=1)
+
+    # times on base are binomial over each batter's PA
+    PA = batters['PA_per_week'].clip(lower=0).round().astype(int).values
+    OBP = batters['OBP'].clip(0, 1).values
+
+    OB = rng.binomial(PA, OBP, size=(n, len(PA))).sum(axis=1)
+
+    team_PA = max(PA.sum(), 1)
+
+    innings = numpy.where(team_IP > 0, team_IP, numpy.nan)  # rates are missing in a week without innings, and tie
+
+    return {
+        'R': totals['R'],
+        'RBI': totals['RBI'],
+        'HR': totals['HR'],
+        'SB': totals['SB'],
+        'TB': totals['TB'],
+        'OBP': OB / team_PA,
+        'IP': team_IP,
+        'W': totals['W'],
+        'SV': totals['SV'],
+        'ERA': totals['ER'] * 9.0 / innings,
+        'WHIP': totals['WH'] / innings,
+        'K9': totals['K'] * 9.0 / innings,
+    }
+
+
+def simulate_matchup(team, opponent, n=100000, seed=None):
+    """
+    Simulate `n` weeks of a matchup between two teams of (batters, pitchers)
+
+    Returns the probability of winning each category, the expected number of categories won, and the probability of winning the matchup. Tied categories count as half a win.
+
+    """
+    rng = numpy.random.default_rng(seed)
+
+    team_weeks = sample_team_weeks(team, n, rng)
+    opponent_weeks = sample_team_weeks(opponent, n, rng)
+
+    categories = {}
+    wins = numpy.zeros(n)
+    losses = numpy.zeros(n)
+
+    for category in team_weeks:
+        if category in lower_is_better:
+            won = team_weeks[category] < opponent_weeks[category]
+            lost = team_weeks[category] > opponent_weeks[category]
+        else:
+            won = team_weeks[category] > opponent_weeks[category]
+            lost = team_weeks[category] < opponent_weeks[category]
+
+        categories[category] = won.mean() + 0.5 * (1 - won.mean() - lost.mean())
+
+        wins += won
+        losses += lost
+
+    return {
+        'categories': categories,
+        'expected_categories': sum(categories.values()),
+        'win': (wins > losses).mean() + 0.5 * (wins == losses).mean(),
+    }
+
+
+if __name__ == '__main__':
+    main()
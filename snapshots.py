@@ -0,0 +1,420 @@
+"""
+Snapshot store
+
+Keeps the daily snapshots of refreshed files (rosters, eligibilities, playing time, projections, valuations) as row level changes, instead of a full dated copy of each file every day. Most rows don't change from day to day, so each day only adds the rows that are new or changed, and the rows that are gone.
+
+Each file is a dataset in the store, with its own directory:
+
+* `changes/{date}.{format}`: each snapshot's changes, as the row's values with the date, the row's id, and whether the row was deleted. Recording a day only writes that day's file, and rebuilding a snapshot only reads the files up to its date.
+* `latest.{format}`: key and hash of each row in the latest snapshot, to find the next day's changes without replaying the changes
+* `manifest.json`: the key columns, and the date, columns (and the file's header, if it repeats a column) and number of rows of each snapshot
+
+Rows are matched from day to day by their key columns (a player id, see `key_columns`), and by their order among rows with the same key. Values are kept as the text in the file, so a reconstructed snapshot has the same values as the file it came from. Rows come back in the order they first appeared, rather than the order of the file.
+
+The format is feather (compressed columnar, through pyarrow), or pickle if pyarrow isn't installed, as for the cache.
+
+To move dated CSVs into a store, e.g. the `historical` directories, run `snapshots.py import <directory> <store>`.
+
+"""
+
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import re
+
+import numpy
+import pandas
+
+from utils import CACHE_FORMAT, read_cached_frame, write_cached_frame
+
+
+SNAPSHOTS = 'snapshots'  # subdirectory of a data directory with its snapshot store
+
+
+# columns that identify a player, in order of preference for the key of a dataset
+id_columns = ['fg_id', 'playerid', 'espn_id', 'yahoo_id', 'fg_name', 'espn_name', 'yahoo_name']
+
+# columns that tell apart rows for the same player, added to the key of a dataset that has them
+qualifier_columns = ['projection']
+
+# dated files in a directory to import, e.g. rosters_2019-04-01.csv
+dated_file = re.compile(r'^(?P<name>.+)_(?P<date>\d{4}-\d{2}-\d{2})\.csv$')
+
+# datasets whose dated files had a different name, e.g. valuations/batter_2019-04-01.csv is recorded as batter_valuation
+legacy_names = {
+    'batter': 'batter_valuation',
+    'batter_multi': 'batter_multi_valuation',
+    'pitcher': 'pitcher_valuation',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command')
+
+    import_parser = subparsers.add_parser('import', help="record the dated CSVs in a directory")
+    import_parser.add_argument("directory", help="directory with dated CSVs, e.g. data/historical")
+    import_parser.add_argument("store", help="store directory, e.g. data/snapshots")
+    import_parser.add_argument("--delete", action="store_true", help="delete each CSV once it's recorded")
+
+    show_parser = subparsers.add_parser('show', help="summarize the datasets in a store")
+    show_parser.add_argument("store", help="store directory")
+
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        import_directory(args.directory, SnapshotStore(args.store), delete=args.delete)
+    elif args.command == 'show':
+        store = SnapshotStore(args.store)
+
+        for name in store.names():
+            manifest = store.manifest(name)
+            dates = [snapshot['date'] for snapshot in manifest['snapshots']]
+
+            print(u"{}: {} snapshots from {} to {}, {} changes, key {}".format(
+                name, len(dates), dates[0], dates[-1], sum(snapshot['changes'] for snapshot in manifest['snapshots']), manifest['key'],
+            ))
+    else:
+        parser.print_help()
+
+
+def key_columns(columns):
+    """
+    Key of a dataset with `columns`: the first id column it has, and any qualifier columns
+    """
+    ids = [column for column in id_columns if column in columns][:1]
+
+    return ids + [column for column in qualifier_columns if column in columns]
+
+
+def format_date(date):
+    """
+    Snapshot date as YYYY-MM-DD, from a date, datetime or string
+    """
+    if isinstance(date, str):
+        return datetime.datetime.strptime(date, '%Y-%m-%d').strftime('%Y-%m-%d')
+
+    return '{:%Y-%m-%d}'.format(date)
+
+
+def read_text(location):
+    """
+    Read a CSV with every value as text, the way it is in the file
+    """
+    return pandas.read_csv(location, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+
+
+def read_header(location):
+    """
+    Column names in the first line of a CSV, including repeated names that `pandas.read_csv` renames
+    """
+    with open(location, encoding='utf-8-sig', newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def parse_text(frame, key):
+    """
+    Parse the text values of a snapshot the way `pandas.read_csv` parses the file, with the key columns as text
+    """
+    return pandas.read_csv(io.StringIO(frame.to_csv(index=False)), dtype={column: object for column in key})
+
+
+def import_directory(directory, store, delete=False):
+    """
+    Record the dated CSVs in a directory, in date order
+
+    Files are recorded under their name without the date, or the name in `legacy_names`. Dates that are already in the store are skipped. Returns the number of files recorded.
+
+    """
+    files = []
+
+    for filename in os.listdir(directory):
+        match = dated_file.match(filename)
+        if match:
+            name = legacy_names.get(match.group('name'), match.group('name'))
+            files.append((match.group('date'), name, os.path.join(directory, filename)))
+
+    recorded = 0
+
+    for date, name, location in sorted(files):
+        dates = store.dates(name)
+
+        if dates and date <= dates[-1]:
+            print(u"skipping {}, {} already has {}".format(location, name, dates[-1]))
+            continue
+
+        store.record(name, location, date)
+        recorded += 1
+
+        if delete:
+            os.remove(location)
+
+    print(u"recorded {} files from {}".format(recorded, directory))
+
+    return recorded
+
+
+def record_snapshot(directory, name, location, date=None):
+    """
+    Record the file at `location` as the `name` snapshot on `date` (default today) in the store in `directory`
+    """
+    return SnapshotStore(directory).record(name, location, date)
+
+
+class SnapshotStore(object):
+    """
+    Datasets of daily snapshots, kept as row level changes
+
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def names(self):
+        """
+        Datasets in the store
+        """
+        if not os.path.exists(self.directory):
+            return []
+
+        return sorted(name for name in os.listdir(self.directory) if os.path.exists(self.manifest_location(name)))
+
+    def dataset_directory(self, name):
+        return os.path.join(self.directory, name)
+
+    def manifest_location(self, name):
+        return os.path.join(self.dataset_directory(name), 'manifest.json')
+
+    def changes_location(self, name, date):
+        return os.path.join(self.dataset_directory(name), 'changes', '{}.{}'.format(date, CACHE_FORMAT))
+
+    def latest_location(self, name):
+        return os.path.join(self.dataset_directory(name), 'latest.{}'.format(CACHE_FORMAT))
+
+    def manifest(self, name):
+        """
+        Key and snapshots of a dataset, or None if it isn't in the store
+        """
+        if not os.path.exists(self.manifest_location(name)):
+            return None
+
+        with open(self.manifest_location(name)) as f:
+            return json.load(f)
+
+    def dates(self, name):
+        """
+        Dates of a dataset's snapshots, as YYYY-MM-DD, in order
+        """
+        manifest = self.manifest(name)
+
+        return [snapshot['date'] for snapshot in manifest['snapshots']] if manifest else []
+
+    def changes(self, name, end=None):
+        """
+        Changes to a dataset on or before `end` (default every change), in date order
+        """
+        dates = [date for date in self.dates(name) if end is None or date <= format_date(end)]
+
+        return pandas.concat([read_cached_frame(self.changes_location(name, date)) for date in dates], ignore_index=True, sort=False)
+
+    def record(self, name, location, date=None, key=None):
+        """
+        Record the CSV at `location` as the dataset's snapshot on `date` (default today)
+
+        Only the rows that are new or changed since the previous snapshot, and the rows that are gone, are stored. Recording the latest date again replaces it. `key` defaults to `key_columns` of the file.
+
+        Returns the number of changes.
+
+        """
+        date = format_date(date or datetime.date.today())
+        frame = read_text(location)
+        columns = list(frame.columns)
+
+        manifest = self.manifest(name) or {'key': key if key is not None else key_columns(columns), 'snapshots': []}
+        key = manifest['key']
+
+        missing = [column for column in key if column not in columns]
+        if missing:
+            raise ValueError(u"{} is missing key columns {} of {}".format(location, missing, name))
+
+        dates = [snapshot['date'] for snapshot in manifest['snapshots']]
+
+        if dates and date < dates[-1]:
+            raise ValueError(u"{} already has a snapshot on {}, after {}".format(name, dates[-1], date))
+
+        if dates and date == dates[-1]:
+            self.remove_latest(name, manifest)
+            return self.record(name, location, date, key)
+
+        frame['_n'] = frame.groupby(key).cumcount() if key else numpy.arange(len(frame))
+        frame['_hash'] = pandas.util.hash_pandas_object(frame[columns], index=False).values
+
+        if manifest['snapshots']:
+            latest = read_cached_frame(self.latest_location(name))
+            same_columns = manifest['snapshots'][-1]['columns'] == columns
+        else:
+            latest = pandas.DataFrame({column: pandas.Series([], dtype=object) for column in key + ['_n', '_id', '_hash']})
+            same_columns = False
+
+        merged = frame.merge(latest[key + ['_n', '_id', '_hash']], how='left', on=key + ['_n'], suffixes=('', '_latest'))
+
+        # new rows get the next ids
+        new = merged['_id'].isnull()
+        next_id = int(latest['_id'].max()) + 1 if len(latest) else 0
+        merged.loc[new, '_id'] = numpy.arange(next_id, next_id + new.sum())
+        merged['_id'] = merged['_id'].astype(numpy.int64)
+
+        changed = new | (merged['_hash'] != merged['_hash_latest']) | (not same_columns)
+        deleted = latest.loc[~latest['_id'].isin(merged['_id']), '_id'].astype(numpy.int64)
+
+        upserts = merged.loc[changed, columns + ['_n', '_id']].assign(_date=date, _deleted=False)
+        deletes = pandas.DataFrame({'_id': deleted.values, '_n': 0, '_date': date, '_deleted': True})
+
+        changes = pandas.concat([upserts, deletes], ignore_index=True, sort=False)
+
+        os.makedirs(os.path.dirname(self.changes_location(name, date)), exist_ok=True)
+
+        write_cached_frame(changes, self.changes_location(name, date))
+        write_cached_frame(merged[key + ['_n', '_id', '_hash']].reset_index(drop=True), self.latest_location(name))
+
+        snapshot = {'date': date, 'columns': columns, 'rows': len(frame), 'changes': len(upserts) + len(deletes)}
+
+        header = read_header(location)
+        if header != columns and len(header) == len(columns):
+            snapshot['header'] = header
+
+        manifest['snapshots'].append(snapshot)
+        self.write_manifest(name, manifest)
+
+        return len(upserts) + len(deletes)
+
+    def remove_latest(self, name, manifest):
+        """
+        Remove a dataset's latest snapshot, to record it again
+        """
+        date = manifest['snapshots'].pop()['date']
+
+        if not manifest['snapshots']:
+            for location in [self.changes_location(name, date), self.latest_location(name), self.manifest_location(name)]:
+                os.remove(location)
+            return
+
+        previous = manifest['snapshots'][-1]
+        state = self.state(self.changes(name, previous['date']), previous['date'])
+
+        latest = state[manifest['key'] + ['_n', '_id']].copy()
+        latest['_hash'] = pandas.util.hash_pandas_object(state[previous['columns']], index=False).values
+
+        write_cached_frame(latest.reset_index(drop=True), self.latest_location(name))
+        self.write_manifest(name, manifest)
+        os.remove(self.changes_location(name, date))
+
+    def write_manifest(self, name, manifest):
+        with open(self.manifest_location(name), 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+    @staticmethod
+    def state(changes, date):
+        """
+        Rows as of `date`, from a dataset's changes, in order of id
+        """
+        changes = changes[changes['_date'] <= date]
+
+        state = changes.drop_duplicates('_id', keep='last')  # changes are in date order
+
+        return state[~state['_deleted'].astype(bool)].sort_values('_id')
+
+    def snapshot(self, name, date=None):
+        """
+        Manifest entry of the dataset's snapshot on or before `date` (default the latest)
+        """
+        manifest = self.manifest(name)
+
+        if manifest is None:
+            raise KeyError(u"no dataset {} in {}".format(name, self.directory))
+
+        snapshots = manifest['snapshots']
+        if date is not None:
+            snapshots = [snapshot for snapshot in snapshots if snapshot['date'] <= format_date(date)]
+
+        if not snapshots:
+            raise KeyError(u"no snapshot of {} on or before {}".format(name, date))
+
+        return snapshots[-1]
+
+    def text(self, name, date=None):
+        """
+        Values of the dataset's snapshot on or before `date` (default the latest), as text
+        """
+        snapshot = self.snapshot(name, date)
+
+        text = self.state(self.changes(name, snapshot['date']), snapshot['date'])[snapshot['columns']].reset_index(drop=True)
+        text.columns = snapshot.get('header', snapshot['columns'])
+
+        return text
+
+    def read(self, name, date=None):
+        """
+        Dataset's snapshot on or before `date` (default the latest), parsed like the file it came from
+        """
+        return parse_text(self.text(name, date), self.manifest(name)['key'])
+
+    def open(self, name, date=None):
+        """
+        Dataset's snapshot on or before `date` (default the latest), as a CSV file object for parsers that read files
+        """
+        return io.StringIO(self.text(name, date).to_csv(index=False))
+
+    def history(self, name, start=None, end=None, where=None, columns=None):
+        """
+        Rows of every snapshot of a dataset from `start` to `end`, with a `date` column
+
+        `where` maps columns to the values to keep, e.g. {'fg_id': ['19755']}, and `columns` limits the columns returned. Only the changes of the rows kept are replayed, so a player's history doesn't read each snapshot.
+
+        """
+        manifest = self.manifest(name)
+
+        if manifest is None:
+            raise KeyError(u"no dataset {} in {}".format(name, self.directory))
+
+        key = manifest['key']
+
+        dates = [
+            snapshot['date'] for snapshot in manifest['snapshots']
+            if (start is None or snapshot['date'] >= format_date(start)) and (end is None or snapshot['date'] <= format_date(end))
+        ]
+
+        changes = self.changes(name, dates[-1] if dates else None)
+
+        if where:
+            matches = numpy.ones(len(changes), dtype=bool)
+            for column, values in where.items():
+                matches &= changes[column].isin([str(value) for value in values]).values
+
+            changes = changes[changes['_id'].isin(changes.loc[matches, '_id'])]
+
+        if columns is None:
+            columns = [column for column in changes.columns if not column.startswith('_')]
+        else:
+            columns = key + [column for column in columns if column not in key]
+
+        # each row's last change on or before each date
+        grid = pandas.DataFrame({'date': pandas.to_datetime(dates)}).assign(_merge=1).merge(
+            pandas.DataFrame({'_id': changes['_id'].unique()}).assign(_merge=1), on='_merge'
+        ).drop(columns=['_merge']).sort_values('date')
+
+        changes = changes.assign(_changed=pandas.to_datetime(changes['_date'])).sort_values('_changed')
+
+        rows = pandas.merge_asof(grid, changes[['_changed', '_id', '_deleted'] + columns], left_on='date', right_on='_changed', by='_id')
+        rows = rows[rows['_changed'].notnull() & ~rows['_deleted'].fillna(True).astype(bool)]
+
+        history = parse_text(rows[columns], key)
+        history.insert(0, 'date', rows['date'].dt.date.values)
+
+        return history.sort_values(['date'] + key).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""
+Streaming pitcher planner
+
+Plans a week of free agent pitcher pickups from the probable starters. Each start is projected from the pitcher's projections (IP and W per start, and his ERA, WHIP and K9 over those IP), and relievers pitch a seventh of their weekly line every day. My team's week is the sum of its pitchers' days, and is scored as the expected number of pitching categories won, from the logistic regression of each category in the category table written by prob_added.py.
+
+Moves are searched as sequences of (day, add, drop), with every add and drop on every remaining day scored at once. A beam of the best sequences is extended one move at a time, up to the number of acquisitions left this week.
+
+The probable starters file is a CSV with the `date` (YYYY-MM-DD) and `fg_id` of each probable start, and optionally the `opponent`.
+
+"""
+
+import argparse
+import datetime
+import os
+
+import numpy
+import pandas
+
+from categories import category_win_probabilities, load_category_models
+from config import LEAGUE_DATA_DIRECTORY
+import metrics
+import pitcher_valuation
+from simulate import lower_is_better, pitching_rate_stats
+from utils import load_rosters
+
+
+DAYS = 7  # days in a week
+
+BEAM_WIDTH = 20  # sequences of moves kept at each step of the search
+
+# stats of a projected line
+stats = ['IP', 'W', 'SV', 'ER', 'WH', 'K']
+
+# pitching categories from a week's totals, with the stat and, for rate categories, the stat it's over and the units it's per
+pitching_categories = {
+    'IP': ('IP', None, 1.0),
+    'W': ('W', None, 1.0),
+    'SV': ('SV', None, 1.0),
+    'ERA': ('ER', 'IP', 9.0),
+    'WHIP': ('WH', 'IP', 1.0),
+    'K9': ('K', 'IP', 9.0),
+}
+
+DEFAULT_START_IP = 5.0  # IP for a probable start by a pitcher without projected starts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--team", type=int, required=True, help="fantasy team id of my team")
+    parser.add_argument("--moves", type=int, default=7, help="acquisitions left this week")
+    parser.add_argument("--start", type=lambda s: datetime.datetime.strptime(s, '%Y-%m-%d').date(), default=datetime.date.today(), help="first day to plan for")
+    parser.add_argument("--starters", default=os.path.join(LEAGUE_DATA_DIRECTORY, 'probable_starters.csv'), help="probable starters file")
+    parser.add_argument("--projection", default="rfangraphsdc", help="projection system to use")
+    args = parser.parse_args()
+
+    dates = [args.start + datetime.timedelta(days=i) for i in range(DAYS)]
+
+    pitchers = load_pitchers(args.projection)
+    starts = start_lines(load_probable_starters(args.starters, dates), pitchers)
+
+    models = load_category_models(os.path.join(LEAGUE_DATA_DIRECTORY, 'pitchers.json'))
+
+    # my pitchers, and free agents with a start this week
+    mine = pitchers['fantasy_team_id'] == args.team
+    streamers = pitchers['fantasy_team_id'].isnull() & pitchers['fg_id'].isin(starts['fg_id'])
+
+    pitchers = pitchers[mine | streamers].reset_index(drop=True)
+
+    lines = daily_lines(pitchers, starts, dates)
+    on_roster = (pitchers['fantasy_team_id'] == args.team).values
+
+    starts = score_starts(starts, lines[on_roster].sum(axis=(0, 1)), models)
+    starts = starts.merge(pitchers[['fg_id', 'fantasy_team_id']], how='left', on='fg_id')
+
+    starts.sort_values('p_added', ascending=False).to_csv(os.path.join(LEAGUE_DATA_DIRECTORY, 'streaming_starts.csv'), index=False, encoding='utf8', float_format='%.4f')
+
+    print(starts[starts['fantasy_team_id'].isnull()].sort_values('p_added', ascending=False).head(20)[['date', 'fg_name', 'opponent', 'IP', 'W', 'ER', 'K', 'p_added']].to_string(index=False))
+
+    plan = plan_moves(lines, on_roster, ~on_roster, models, args.moves)
+
+    print(u"expected categories won: {:.3f} without moves".format(plan['base']))
+
+    for day, add, drop, wins in plan['moves']:
+        print(u"{}: add {}, drop {} ({:.3f})".format(dates[day], pitchers['fg_name'].iloc[add], pitchers['fg_name'].iloc[drop], wins))
+
+
+@metrics.timed
+def load_pitchers(projection_type="rfangraphsdc"):
+    """
+    Pitcher projections with weekly and per start lines, and current rosters
+
+    """
+    pitchers = pitcher_valuation.calculate_p_added(projection_type)
+    pitchers = pitcher_valuation.add_projected_weeks(pitchers)
+
+    # W from starts, assuming relief appearances are 1 IP
+    start_share = ((pitchers['IP'] - pitchers['relief_IP']) / pitchers['IP']).clip(0, 1)
+    pitchers['W_per_GS'] = (pitchers['W'] * start_share / pitchers['GS']).where(pitchers['GS'] >= 1)
+    pitchers['IP_per_GS'] = pitchers['IP_per_GS'].where(pitchers['GS'] >= 1)
+
+    rosters = load_rosters()[['espn_id', 'fantasy_team_id']]
+
+    return pitchers.merge(rosters, how='left', on='espn_id')
+
+
+def load_probable_starters(location, dates):
+    """
+    Probable starts on the planned days, with the index of each start's day
+
+    """
+    starts = pandas.read_csv(location, dtype={'fg_id': object}, parse_dates=['date'])
+    starts['date'] = starts['date'].dt.date
+
+    if 'opponent' not in starts.columns:
+        starts['opponent'] = None
+
+    starts = starts[starts['date'].isin(dates)].copy()
+    starts['day'] = starts['date'].map({date: i for i, date in enumerate(dates)})
+
+    return starts
+
+
+def start_lines(starts, pitchers):
+    """
+    Projected line of each probable start
+
+    Pitchers without projected starts get DEFAULT_START_IP, with their projected rates.
+
+    """
+    starts = starts.merge(pitchers[['fg_id', 'fg_name', 'IP_per_GS', 'W_per_GS', 'ERA', 'WHIP', 'K9']], how='inner', on='fg_id')
+
+    starts['IP'] = starts['IP_per_GS'].fillna(DEFAULT_START_IP)
+    starts['W'] = starts['W_per_GS'].fillna(0)
+    starts['SV'] = 0.0
+
+    for stat, (rate, per) in pitching_rate_stats.items():
+        starts[stat] = (starts[rate] / per * starts['IP']).fillna(0)
+
+    return starts.drop(columns=['IP_per_GS', 'W_per_GS'])
+
+
+def daily_lines(pitchers, starts, dates):
+    """
+    Projected line of each pitcher on each day, as a (pitchers x days x stats) array
+
+    Starters pitch their probable starts, and relievers a seventh of their weekly line every day.
+
+    """
+    lines = numpy.zeros((len(pitchers), len(dates), len(stats)))
+
+    weekly = numpy.column_stack([
+        pitchers['IP_per_week'],
+        pitchers['W_per_week'],
+        pitchers['SV_per_week'],
+    ] + [
+        pitchers[rate] / per * pitchers['IP_per_week'] for rate, per in pitching_rate_stats.values()
+    ])
+    weekly = numpy.nan_to_num(weekly.astype(float)).clip(min=0)
+
+    is_RP = pitchers['is_RP'].values
+    lines[is_RP] = weekly[is_RP][:, None, :] / len(dates)
+
+    rows = pandas.Series(numpy.arange(len(pitchers)), index=pitchers['fg_id'])
+    starts = starts[starts['fg_id'].isin(rows.index)]
+
+    numpy.add.at(lines, (rows[starts['fg_id']].values, starts['day'].values), starts[stats].to_numpy(dtype=float))
+
+    return lines
+
+
+def expected_wins(totals, models):
+    """
+    Expected number of pitching categories won with a week's totals
+    """
+    return category_win_probabilities(totals, stats, pitching_categories, models, lower_is_better).sum(axis=-1)
+
+
+def score_starts(starts, totals, models):
+    """
+    Add the expected categories won that each start adds to a team's week, as `p_added`
+    """
+    starts = starts.copy()
+
+    lines = starts[stats].to_numpy(dtype=float)
+
+    starts['p_added'] = expected_wins(totals + lines, models) - expected_wins(totals, models)
+
+    return starts
+
+
+def remaining(lines):
+    """
+    Lines from each day to the end of the week, for adds and drops made on each day
+    """
+    return numpy.cumsum(lines[:, ::-1], axis=1)[:, ::-1]
+
+
+def plan_moves(lines, on_roster, available, models, max_moves, beam_width=BEAM_WIDTH):
+    """
+    Best sequence of moves for the week
+
+    `lines` is each pitcher's projected line on each day, `on_roster` whether he is on my team at the start of the week, and `available` whether he can be added. Each move adds an available pitcher and drops one of my pitchers on the same day, from that day on. Moves are made in order through the week, and a pitcher who has been on my team can't be added again.
+
+    Returns the expected categories won without moves, and the best moves as (day, add, drop, expected categories won after the move).
+
+    """
+    n_players, n_days, _ = lines.shape
+
+    tails = remaining(lines)
+
+    membership = numpy.repeat(on_roster[:, None], n_days, axis=1)
+    start = {'membership': membership, 'day': 0, 'moves': [], 'wins': float(expected_wins(lines[on_roster].sum(axis=(0, 1)), models))}
+
+    best = start
+    beam = [start]
+
+    for _ in range(max_moves):
+        expansions = []
+
+        for state in beam:
+            membership = state['membership']
+
+            held = lines * membership[:, :, None]
+            totals = held.sum(axis=(0, 1))
+
+            adds = numpy.flatnonzero(available & ~membership.any(axis=1))
+            drops = numpy.flatnonzero(membership.any(axis=1))
+            days = numpy.arange(state['day'], n_days)
+
+            if len(adds) == 0 or len(drops) == 0:
+                continue
+
+            # totals for every (add, drop, day)
+            delta = tails[adds][:, days][:, None] - remaining(held[drops])[:, days][None]
+            wins = expected_wins(totals + delta, models)
+
+            # only drop pitchers who are on my team that day, and only make moves that help
+            wins = numpy.where(membership[drops][:, days][None] & (wins > state['wins'] + 1e-9), wins, -numpy.inf)
+
+            flat = wins.ravel()
+            top = numpy.argpartition(-flat, min(beam_width, flat.size) - 1)[:beam_width]
+
+            for i in top[numpy.isfinite(flat[top])]:
+                a, d, t = numpy.unravel_index(i, wins.shape)
+                add, drop, day = adds[a], drops[d], days[t]
+
+                membership = state['membership'].copy()
+                membership[add, day:] = True
+                membership[drop, day:] = False
+
+                expansions.append({
+                    'membership': membership,
+                    'day': day,
+                    'moves': state['moves'] + [(day, add, drop, float(flat[i]))],
+                    'wins': float(flat[i]),
+                })
+
+        if not expansions:
+            break
+
+        # keep the best sequences, once for each resulting roster
+        beam = []
+        seen = set()
+        for state in sorted(expansions, key=lambda state: -state['wins']):
+            key = state['membership'].tobytes()
+            if key not in seen:
+                seen.add(key)
+                beam.append(state)
+            if len(beam) == beam_width:
+                break
+
+        if beam[0]['wins'] > best['wins']:
+            best = beam[0]
+
+    return {'base': start['wins'], 'wins': best['wins'], 'moves': best['moves']}
+
+
+if __name__ == '__main__':
+    with metrics.run('streaming'):
+        main()
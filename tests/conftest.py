@@ -0,0 +1,20 @@
+"""
+Test setup
+
+Makes the modules at the top of the repo importable, with config.py.sample as their config. Its directories are relative to the working directory, so tests that need data run in a generated league's directory, and never read or write a real league's data.
+"""
+import importlib.machinery
+import importlib.util
+import os
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+
+loader = importlib.machinery.SourceFileLoader('config', os.path.join(ROOT, 'config.py.sample'))
+spec = importlib.util.spec_from_loader('config', loader)
+config = importlib.util.module_from_spec(spec)
+loader.exec_module(config)
+sys.modules['config'] = config
@@ -0,0 +1,36 @@
+"""
+Offline tests of the ESPN league, with box scores stubbed out
+"""
+import pandas
+
+from espn import Espn
+
+
+def fake_league(directory, current_period, rows):
+    league = Espn.__new__(Espn)
+    league.league_data_directory = str(directory)
+    league.year = 2020
+    league.currentMatchupPeriod = current_period
+    league._fetch_scores = lambda matchup_period: rows.get(matchup_period, [])
+
+    (directory / 'scores').mkdir(exist_ok=True)
+
+    return league
+
+
+def test_save_scores_without_box_scores(tmp_path):
+    league = fake_league(tmp_path, 3, {})
+
+    assert league.save_scores() == []
+    assert not (tmp_path / 'scores' / 'scores_2020.csv').exists()
+
+
+def test_save_scores_upserts_new_periods(tmp_path):
+    rows = {period: [{'matchup_period': period, 'team_id': 1, 'R': period}] for period in range(1, 4)}
+
+    assert fake_league(tmp_path, 2, rows).save_scores(include_current=True) == [1, 2]
+    assert fake_league(tmp_path, 3, rows).save_scores(include_current=True) == [2, 3]
+
+    scores = pandas.read_csv(tmp_path / 'scores' / 'scores_2020.csv')
+    assert list(scores['matchup_period']) == [1, 2, 3]
+    assert list(scores['final']) == [1, 1, 0]
@@ -0,0 +1,41 @@
+"""
+Tests of the player name matcher
+"""
+import pandas
+
+from map_players import match_players, unmapped_candidates, update_mapping
+from player_ids import normalize_ids
+
+
+def test_mapped_ids_are_not_candidates():
+    mapping = pandas.DataFrame({'fg_id': ['1', '2'], 'fg_name': ['Will Smith', 'Will Smith'], 'espn_id': [33, None]})
+    candidates = pandas.DataFrame({'espn_name': ['Will Smith', 'Will Smith'], 'espn_id': ['33', '34'], 'team_abbr': ['LAD', 'LAD']})
+
+    candidates = unmapped_candidates(candidates, mapping, 'espn_id')
+
+    assert list(candidates['espn_id']) == ['34']
+
+    players = pandas.DataFrame({'fg_id': ['2'], 'fg_name': ['Will Smith'], 'Team': ['LAD']})
+    matches, _ = match_players(players, candidates, 'espn_name', 'espn_id', player_team='Team', candidate_team='team_abbr')
+
+    mapping = update_mapping(mapping, matches, 'espn_id')
+
+    assert list(normalize_ids(mapping['espn_id'])) == ['33', '34']
+
+
+def test_players_are_matched_within_team():
+    players = pandas.DataFrame({
+        'fg_id': ['1', '2'],
+        'fg_name': ['Ronald Acuña Jr.', 'Michael A. Taylor'],
+        'Team': ['ATL', 'WSN'],
+    })
+    candidates = pandas.DataFrame({
+        'espn_name': ['Ronald Acuna', 'Michael Taylor', 'Michael Taylor'],
+        'espn_id': ['10', '20', '21'],
+        'team_abbr': ['ATL', 'WSN', 'KCR'],
+    })
+
+    matches, review = match_players(players, candidates, 'espn_name', 'espn_id', player_team='Team', candidate_team='team_abbr')
+
+    assert dict(zip(matches['fg_id'], matches['espn_id'])) == {'1': '10', '2': '20'}
+    assert len(review) == 0
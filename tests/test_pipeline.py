@@ -0,0 +1,75 @@
+"""
+Tests of the pipeline's step scheduling, with small steps in a temporary directory
+"""
+from pipeline import Pipeline
+
+
+def copy_step(name, source, destination, inputs=()):
+    return {
+        'name': name,
+        'command': ['-c', 'import shutil; shutil.copy({!r}, {!r})'.format(str(source), str(destination))],
+        'inputs': [str(source)] + [str(location) for location in inputs],
+        'outputs': [str(destination)],
+    }
+
+
+def statuses(pipeline, **kwargs):
+    timings = pipeline.run(**kwargs)
+
+    return dict(zip(timings['step'], timings['status']))
+
+
+def make_pipeline(tmp_path, steps):
+    return Pipeline(steps, str(tmp_path / 'state.json'), str(tmp_path / 'logs'))
+
+
+def test_edited_input_reruns_step(tmp_path):
+    (tmp_path / 'a.csv').write_text('1\n')
+    (tmp_path / 'extra.csv').write_text('x\n')
+
+    steps = [
+        copy_step('first', tmp_path / 'a.csv', tmp_path / 'b.csv', inputs=[tmp_path / 'extra.csv']),
+        copy_step('second', tmp_path / 'b.csv', tmp_path / 'c.csv'),
+    ]
+
+    assert statuses(make_pipeline(tmp_path, steps)) == {'first': 'ran', 'second': 'ran'}
+    assert statuses(make_pipeline(tmp_path, steps)) == {'first': 'skipped', 'second': 'skipped'}
+
+    (tmp_path / 'extra.csv').write_text('y\n')
+
+    assert statuses(make_pipeline(tmp_path, steps)) == {'first': 'ran', 'second': 'skipped'}  # b.csv was rewritten with the same contents
+
+
+def test_dry_run_marks_steps_after_a_step_that_would_run(tmp_path):
+    (tmp_path / 'a.csv').write_text('1\n')
+
+    steps = [
+        copy_step('first', tmp_path / 'a.csv', tmp_path / 'b.csv'),
+        copy_step('second', tmp_path / 'b.csv', tmp_path / 'c.csv'),
+    ]
+
+    statuses(make_pipeline(tmp_path, steps))
+
+    (tmp_path / 'a.csv').write_text('2\n')
+
+    assert statuses(make_pipeline(tmp_path, steps), dry_run=True) == {'first': 'would run', 'second': 'would run'}
+    assert (tmp_path / 'c.csv').read_text() == '1\n'
+
+
+def test_step_that_updates_its_own_input(tmp_path):
+    mapping = tmp_path / 'mapping.csv'
+    mapping.write_text('fg_id\n')
+
+    steps = [{
+        'name': 'map_players',
+        'command': ['-c', 'open({!r}, "a").write("1\\n")'.format(str(mapping))],
+        'inputs': [str(mapping)],
+        'outputs': [str(mapping)],
+    }]
+
+    assert statuses(make_pipeline(tmp_path, steps)) == {'map_players': 'ran'}
+    assert statuses(make_pipeline(tmp_path, steps)) == {'map_players': 'skipped'}
+
+    mapping.write_text('fg_id\n2\n')  # edited by hand
+
+    assert statuses(make_pipeline(tmp_path, steps)) == {'map_players': 'ran'}
@@ -0,0 +1,31 @@
+"""
+Tests of the category tables written by prob_added.py
+"""
+import json
+import sys
+
+import prob_added
+
+
+def test_unchanged_scores_rebuild_tables_without_refit(tmp_path, monkeypatch):
+    monkeypatch.setattr(prob_added, 'LEAGUE_DATA_DIRECTORY', str(tmp_path))
+    monkeypatch.setattr(prob_added, 'hash_inputs', lambda years: 'scores')
+    monkeypatch.setattr(sys, 'argv', ['prob_added.py'])
+
+    prob_added.write_category_table({'HR': (-5.0, 0.5), 'OBP_big': (-33.0, 0.1)}, 'scores', str(tmp_path / 'batters.json'))
+    prob_added.write_category_table({'IP': (-6.0, 0.1), 'ERA': (4.0, -1.0)}, 'scores', str(tmp_path / 'pitchers.json'))
+
+    def fit_models(*args, **kwargs):
+        raise AssertionError("models were refit")
+
+    monkeypatch.setattr(prob_added, 'fit_models', fit_models)
+    monkeypatch.setitem(prob_added.target_probabilities, 'HR', 0.6)
+
+    prob_added.main()
+
+    with open(str(tmp_path / 'batters.json')) as f:
+        table = json.load(f)
+
+    assert table['categories']['HR']['probability'] == 0.6
+    assert table['categories']['HR']['level'] > 10.0  # the 50% level is 10 HR
+    assert table['categories']['OBP_big']['probability'] == 0.5
@@ -0,0 +1,82 @@
+"""
+Tests of the valuation service on a synthetic league
+"""
+import os
+
+import pandas
+import pytest
+
+import benchmark
+
+
+@pytest.fixture(scope='module')
+def league_directory(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('league'))
+
+    benchmark.generate_league(directory, scale=0.1, seasons=2)
+
+    return directory
+
+
+@pytest.fixture
+def service(league_directory, monkeypatch):
+    monkeypatch.chdir(league_directory)
+
+    from service import ValuationService
+    from yahoo import Yahoo
+
+    return ValuationService(Yahoo('yahoo', 'rfangraphsdc'))
+
+
+def test_rank_and_value_players(service):
+    ranked = service.rank('batters', position='SS', limit=5)
+
+    assert len(ranked) == 5
+    assert all(service.player(player['fg_id'])['SS'] == 1 for player in ranked)
+    assert [player['p_added'] for player in ranked] == sorted((player['p_added'] for player in ranked), reverse=True)
+
+    free_agents = service.rank('pitchers', free_agents=True, limit=10)
+
+    assert free_agents and all(player['team_id'] is None for player in free_agents)
+
+    with pytest.raises(ValueError):
+        service.rank('batters', position='XX')
+
+
+def test_refresh_rosters(service):
+    best = service.rank('batters', limit=1)[0]
+
+    with open('yahoo/rosters.csv', 'rb') as f:
+        original = f.read()
+
+    try:
+        rosters = pandas.read_csv('yahoo/rosters.csv')
+        rosters = rosters[rosters['yahoo_id'] != best['yahoo_id']]
+        rosters = pandas.concat([rosters, pandas.DataFrame({'team_id': [1], 'yahoo_id': [best['yahoo_id']]})], ignore_index=True, sort=False)
+        rosters.to_csv('yahoo/rosters.csv', index=False)
+        os.utime('yahoo/rosters.csv', ns=(0, 0))  # a changed mtime, even within the file system's resolution
+
+        assert service.refresh() == ['rosters']
+        assert service.player(best['fg_id'])['team_id'] == 1
+    finally:
+        with open('yahoo/rosters.csv', 'wb') as f:
+            f.write(original)
+
+
+def test_no_rosters(league_directory, monkeypatch):
+    monkeypatch.chdir(league_directory)
+
+    from service import ValuationService
+    from yahoo import Yahoo
+
+    os.rename('yahoo/rosters.csv', 'yahoo/rosters.csv.bak')
+    try:
+        open('yahoo/rosters.csv', 'w').close()
+
+        service = ValuationService(Yahoo('yahoo', 'rfangraphsdc'))
+
+        ranked = service.rank('batters', free_agents=True, limit=3)
+
+        assert len(ranked) == 3 and all(player['team_id'] is None for player in ranked)
+    finally:
+        os.replace('yahoo/rosters.csv.bak', 'yahoo/rosters.csv')
@@ -0,0 +1,29 @@
+"""
+Tests of the weekly matchup simulation
+"""
+import pandas
+
+from simulate import simulate_matchup
+
+
+def team(IP_per_week, ERA):
+    batters = pandas.DataFrame({
+        'R_per_week': [5.0], 'RBI_per_week': [5.0], 'HR_per_week': [1.5], 'SB_per_week': [0.5], 'TB_per_week': [12.0],
+        'PA_per_week': [25.0], 'OBP': [0.330],
+    })
+    pitchers = pandas.DataFrame({
+        'W_per_week': [0.5, 0.4], 'SV_per_week': [0.0, 0.5],
+        'IP_per_week': IP_per_week, 'ERA': ERA, 'WHIP': [1.2, 1.2], 'K9': [9.0, 9.0],
+    })
+
+    return batters, pitchers
+
+
+def test_innings_are_sampled():
+    results = simulate_matchup(team([12.0, 2.0], [3.5, 3.5]), team([11.0, 2.0], [3.5, 3.5]), n=20000, seed=0)
+
+    # more projected innings win IP more often, but not every week
+    assert 0.55 < results['categories']['IP'] < 0.9
+
+    for category in ['ERA', 'WHIP', 'K9']:
+        assert 0.3 < results['categories'][category] < 0.7
@@ -0,0 +1,67 @@
+"""
+Tests of the snapshot store
+"""
+import os
+
+import pandas
+import pytest
+
+from snapshots import SnapshotStore, import_directory
+
+
+days = {
+    '2019-04-01': 'fg_id,fg_name,PA\n1,A,10\n2,B,20\n3,C,30\n',
+    '2019-04-02': 'fg_id,fg_name,PA\n1,A,11\n3,C,30\n4,D,5\n',
+    '2019-04-03': 'fg_id,fg_name,PA,SB\n4,D,6,1\n1,A,11,0\n',
+}
+
+
+def write_days(directory, name):
+    for date, text in days.items():
+        (directory / '{}_{}.csv'.format(name, date)).write_text(text)
+
+
+def test_snapshots_round_trip(tmp_path):
+    write_days(tmp_path, 'rosters')
+    store = SnapshotStore(str(tmp_path / 'store'))
+
+    assert import_directory(str(tmp_path), store) == 3
+
+    for date, text in days.items():
+        expected = pandas.read_csv(tmp_path / 'rosters_{}.csv'.format(date), dtype={'fg_id': object})
+        snapshot = store.read('rosters', date)
+
+        pandas.testing.assert_frame_equal(
+            snapshot.sort_values('fg_id').reset_index(drop=True),
+            expected.sort_values('fg_id').reset_index(drop=True))
+
+    # each day's changes are in their own file: new and changed rows, and deletes (a new column changes every row)
+    assert sorted(os.path.splitext(filename)[0] for filename in os.listdir(tmp_path / 'store' / 'rosters' / 'changes')) == list(days)
+    assert [snapshot['changes'] for snapshot in store.manifest('rosters')['snapshots']] == [3, 3, 3]
+
+    history = store.history('rosters', where={'fg_id': [1]}, columns=['PA'])
+    assert list(history['PA']) == [10, 11, 11]
+
+    # recording the latest date again replaces it
+    (tmp_path / 'again.csv').write_text('fg_id,fg_name,PA\n1,A,12\n')
+    store.record('rosters', str(tmp_path / 'again.csv'), '2019-04-03')
+
+    assert store.dates('rosters') == list(days)
+    assert list(store.read('rosters')['PA']) == [12]
+    assert len(os.listdir(tmp_path / 'store' / 'rosters' / 'changes')) == 3
+
+
+def test_legacy_valuation_names(tmp_path):
+    write_days(tmp_path, 'batter')
+    store = SnapshotStore(str(tmp_path / 'store'))
+
+    import_directory(str(tmp_path), store)
+
+    assert store.names() == ['batter_valuation']
+
+
+def test_malformed_rows_raise(tmp_path):
+    (tmp_path / 'bad.csv').write_text('fg_id,PA\n1,10\n2,20,extra\n')
+
+    with pytest.raises(pandas.errors.ParserError):
+        SnapshotStore(str(tmp_path / 'store')).record('bad', str(tmp_path / 'bad.csv'), '2019-04-01')
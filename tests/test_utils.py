@@ -0,0 +1,32 @@
+"""
+Tests of the frame cache
+"""
+import os
+
+import pandas
+
+import utils
+
+
+def test_cache_per_source_location(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, 'CACHE_DIRECTORY', str(tmp_path / 'cache'))
+
+    parsed = []
+
+    def parse(location):
+        parsed.append(location)
+        return pandas.read_csv(location)
+
+    locations = []
+    for league in ['one', 'two']:
+        (tmp_path / league).mkdir()
+        location = tmp_path / league / 'scores_2019.csv'
+        location.write_text('team_id,R\n1,{}\n'.format(len(league) + len(locations)))
+        locations.append(str(location))
+
+    for _ in range(2):
+        frames = [utils.load_cached_frame(location, parse, 'scores') for location in locations]
+
+    assert parsed == locations  # each league's file is parsed once, and the second pass is served from the cache
+    assert [frame['R'][0] for frame in frames] == [3, 4]
+    assert not [filename for filename in os.listdir(tmp_path / 'cache') if filename.endswith('.tmp')]
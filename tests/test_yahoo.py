@@ -0,0 +1,153 @@
+"""
+Offline tests of the Yahoo client, using recorded responses
+"""
+import io
+
+import pandas
+import pytest
+import requests
+
+from player_ids import PlayerIds
+from yahoo import ReplayClient, RecordedResponse, RecordedSession, Yahoo
+
+
+N_PLAYERS = 60
+PAGE_SIZE = 25
+
+player_xml = '<player><player_id>{0}</player_id><name><full>Player {0}</full></name><eligible_positions><position>{1}</position></eligible_positions></player>'
+
+
+def players_page(start):
+    players = ''.join(player_xml.format(i, 'C' if i % 2 else 'SS') for i in range(start, min(start + PAGE_SIZE, N_PLAYERS)))
+
+    return '<fantasy_content xmlns="http://fantasysports.yahooapis.com/fantasy/v2/base.rng"><players>{}</players></fantasy_content>'.format(players).encode('utf8')
+
+
+class FakeSession(object):
+    """
+    Session serving pages of the player collection, with an optional status code for some pages
+    """
+    def __init__(self, statuses=None):
+        self.statuses = statuses or {}
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+
+        start = int(url.split('start=')[1])
+
+        return RecordedResponse(players_page(start), url, self.statuses.get(start, 200))
+
+
+def fake_league():
+    league = Yahoo.__new__(Yahoo)
+    league.positions = ['C', 'SS']
+
+    return league
+
+
+def test_replay_with_more_workers_than_recorded(tmp_path):
+    league = fake_league()
+
+    recording = ReplayClient(str(tmp_path))
+    recording.session = RecordedSession(str(tmp_path), FakeSession())
+    recorded = recording.fetch_pages('players;start={}', league.parse_eligibilities, max_workers=1)
+
+    replayed = ReplayClient(str(tmp_path)).fetch_pages('players;start={}', league.parse_eligibilities, max_workers=8)
+
+    assert len(recorded) == N_PLAYERS
+    assert replayed == recorded
+
+
+def test_missing_recording_raises(tmp_path):
+    with pytest.raises(requests.exceptions.HTTPError):
+        ReplayClient(str(tmp_path)).get('players;start=0')
+
+
+def test_error_after_retries_raises(tmp_path):
+    client = ReplayClient(str(tmp_path))
+    client.session = FakeSession({0: 503})
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get('players;start=0', retries=2, backoff=0)
+
+    assert len(client.session.urls) == 3
+
+
+def test_error_page_is_not_parsed_as_short_page(tmp_path):
+    league = fake_league()
+
+    client = ReplayClient(str(tmp_path))
+    client.session = FakeSession({PAGE_SIZE: 401})
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.fetch_pages('players;start={}', league.parse_eligibilities, max_workers=1)
+
+
+def teams_xml(team_ids):
+    teams = ''
+    for team_id in team_ids:
+        players = ''.join(
+            '<player><player_id>{0}</player_id><name><full>J.D. Player {0}</full></name></player>'.format(team_id * 100 + i)
+            for i in range(3))
+        teams += '<team><team_id>{}</team_id><roster><players>{}</players></roster></team>'.format(team_id, players)
+
+    return '<fantasy_content xmlns="http://fantasysports.yahooapis.com/fantasy/v2/base.rng"><teams>{}</teams></fantasy_content>'.format(teams).encode('utf8')
+
+
+class FakeRosterSession(object):
+    """
+    Session serving team rosters, from the teams collection or one team at a time
+
+    The teams collection lists teams in reverse order, to check that rosters are ordered by team either way.
+    """
+    def get(self, url):
+        if '/teams;team_keys=' in url:
+            team_keys = url.split('team_keys=')[1].split('/')[0].split(',')
+        else:
+            team_keys = [url.split('/team/')[1].split('/')[0]]
+
+        team_ids = [int(team_key.split('.t.')[1]) for team_key in team_keys]
+
+        return RecordedResponse(teams_xml(reversed(team_ids)), url)
+
+
+def fake_roster_league(directory, client):
+    league = Yahoo.__new__(Yahoo)
+    league.league_data_directory = str(directory)
+    league.weekly = False
+    league.sport_id = 'mlb'
+    league.league_id = 1
+    league.n_teams = 4
+    league._client = client
+    league.player_ids = PlayerIds(
+        pandas.DataFrame({'fg_id': ['1', '2'], 'yahoo_id': ['101', '9000']}),
+        pandas.DataFrame({'namespace': ['yahoo'], 'player_id': ['9000'], 'alias_id': ['201']}))
+
+    return league
+
+
+def test_batch_rosters_match_per_team(tmp_path):
+    recorded = str(tmp_path / 'recorded')
+
+    recording = ReplayClient(recorded)
+    recording.session = RecordedSession(recorded, FakeRosterSession())
+
+    (tmp_path / 'recording').mkdir()
+    for batch in [True, False]:
+        fake_roster_league(tmp_path / 'recording', recording).refresh_rosters(batch=batch)
+
+    outputs = {}
+    for batch in [True, False]:
+        directory = tmp_path / str(batch)
+        directory.mkdir()
+
+        fake_roster_league(directory, ReplayClient(recorded)).refresh_rosters(batch=batch, max_workers=3)
+
+        outputs[batch] = (directory / 'rosters.csv').read_bytes()
+
+    assert outputs[True] == outputs[False]
+
+    rosters = pandas.read_csv(io.BytesIO(outputs[True]))
+    assert list(rosters['team_id']) == sorted(rosters['team_id'])
+    assert 9000 in set(rosters['yahoo_id']) and 201 not in set(rosters['yahoo_id'])
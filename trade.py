@@ -0,0 +1,434 @@
+"""
+Trade evaluator
+
+Scores trades by how they change both teams' expected weekly category wins. Players come from the valuation outputs (batter_valuation.py and pitcher_valuation.py), with their current teams from `rosters.csv`.
+
+Each team's lineup is the assignment of its players to the `batter_positions` and `flex_positions` slots and N_PITCHERS pitcher slots with the most win probability added. The lineup's weekly totals are scored with the logistic regression of each category from prob_added.py.
+
+Players that can fill a team's slots together form a matroid, so when a player joins a roster, the new best lineup is the old one with at most one player swapped out, and which player depends only on the new player's eligibilities. Enumerating deals re-solves a lineup only for the players leaving it, and caches the swap for each lineup and eligibility.
+
+"""
+
+import argparse
+from itertools import combinations
+import os
+
+import numpy
+import pandas
+
+from assignment import assign_slots
+from batter_valuation import batter_positions, flex_positions
+from categories import category_win_probabilities, load_category_models
+from config import LEAGUE_DATA_DIRECTORY, N_PITCHERS
+import metrics
+from simulate import lower_is_better
+from streaming import pitching_categories
+from utils import load_rosters
+
+
+# weekly stats of a lineup, from the columns of the valuation outputs
+stats = ['R', 'RBI', 'HR', 'SB', 'TB', 'OB', 'PA', 'IP', 'W', 'SV', 'ER', 'WH', 'K']
+
+# batting categories from a week's totals, as in pitching_categories
+batting_categories = {
+    'R': ('R', None, 1.0),
+    'RBI': ('RBI', None, 1.0),
+    'HR': ('HR', None, 1.0),
+    'SB': ('SB', None, 1.0),
+    'TB': ('TB', None, 1.0),
+    'OBP_big': ('OB', 'PA', 1000.0),  # OBP in percentage points
+}
+
+# lineup slots, with the number of each for a team; UTIL and P are filled by any batter and any pitcher
+lineup_slots = [(position['name'], position['n']) for position in batter_positions + flex_positions] + [('P', N_PITCHERS)]
+
+# sizes of the deals to enumerate, as (players given, players received)
+deal_sizes = [(1, 1), (2, 1), (1, 2)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--team", type=int, required=True, help="fantasy team id of my team")
+    parser.add_argument("--give", nargs="*", default=[], help="fg_ids of players I give")
+    parser.add_argument("--get", nargs="*", default=[], help="fg_ids of players I get, all from the same team")
+    parser.add_argument("--all", action="store_true", help="list deals that the other team loses from too")
+    args = parser.parse_args()
+
+    players = load_players()
+    models = load_models()
+
+    evaluator = TradeEvaluator(players, models)
+
+    if args.give or args.get:
+        index = pandas.Series(numpy.arange(len(players)), index=players['fg_id'])
+
+        get = [int(i) for i in index[args.get]]
+        give = [int(i) for i in index[args.give]]
+
+        others = players['fantasy_team_id'].iloc[get].unique()
+        if len(others) != 1:
+            raise ValueError(u"players to get must all be on one team, not {}".format(list(others)))
+
+        deals = evaluator.evaluate(args.team, int(others[0]), give, get)
+    else:
+        deals = evaluator.enumerate_deals(args.team)
+
+        deals.to_csv(os.path.join(LEAGUE_DATA_DIRECTORY, 'trades.csv'), index=False, encoding='utf8', float_format='%.4f')
+
+        if not args.all:
+            deals = deals[deals['their_gain'] > 0]
+
+    print(deals.head(30)[['other_team', 'give_names', 'get_names', 'gain', 'their_gain']].to_string(index=False))
+
+
+def load_players():
+    """
+    Valued batters and pitchers, with their weekly stats, lineup eligibilities and current teams
+
+    """
+    batters = pandas.read_csv(os.path.join(LEAGUE_DATA_DIRECTORY, 'batter_valuation.csv'), dtype={'fg_id': object, 'espn_id': object})
+    pitchers = pandas.read_csv(os.path.join(LEAGUE_DATA_DIRECTORY, 'pitcher_valuation.csv'), dtype={'fg_id': object, 'espn_id': object})
+
+    batters['OB'] = batters['OB_per_week']
+    batters['PA'] = batters['PA_per_week']
+    for stat in ['R', 'RBI', 'HR', 'SB', 'TB']:
+        batters[stat] = batters['{}_per_week'.format(stat)]
+
+    pitchers['IP'] = pitchers['IP_per_week']
+    pitchers['W'] = pitchers['W'] / pitchers['weeks']
+    pitchers['SV'] = pitchers['SV'] / pitchers['weeks']
+    pitchers['ER'] = pitchers['ERA'] / 9 * pitchers['IP']
+    pitchers['WH'] = pitchers['WHIP'] * pitchers['IP']
+    pitchers['K'] = pitchers['K9'] / 9 * pitchers['IP']
+
+    for position, _ in lineup_slots:
+        batters[position] = (batters[position] == 1) if position in batters.columns else position == 'UTIL'
+        pitchers[position] = position == 'P'
+
+    players = pandas.concat([batters, pitchers], ignore_index=True, sort=False)
+
+    rosters = load_rosters()[['espn_id', 'fantasy_team_id']]
+
+    players = players.drop(columns=['fantasy_team_id']).merge(rosters, how='inner', on='espn_id')
+
+    players[stats] = players[stats].fillna(0)
+    players['p_added_per_week'] = players['p_added_per_week'].fillna(0)
+
+    return players[['fg_id', 'espn_id', 'fg_name', 'fantasy_team_id', 'p_added_per_week'] + stats + [position for position, _ in lineup_slots]]
+
+
+def load_models():
+    """
+    Logistic regressions of the batting and pitching categories
+    """
+    models = load_category_models(os.path.join(LEAGUE_DATA_DIRECTORY, 'batters.json'))
+    models.update(load_category_models(os.path.join(LEAGUE_DATA_DIRECTORY, 'pitchers.json')))
+
+    return models
+
+
+def expected_wins(totals, models):
+    """
+    Expected number of categories won with a lineup's weekly totals
+    """
+    categories = dict(batting_categories, **pitching_categories)
+
+    return category_win_probabilities(totals, stats, categories, models, lower_is_better).sum(axis=-1)
+
+
+class TradeEvaluator(object):
+    """
+    Best lineups of rosters before and after trades, cached for the rosters and lineups seen before
+
+    Rosters and lineups are frozensets of player indexes.
+    """
+    def __init__(self, players, models):
+        self.players = players.reset_index(drop=True)
+        self.models = models
+
+        self.values = self.players['p_added_per_week'].to_numpy(dtype=float)
+        self.stats = self.players[stats].to_numpy(dtype=float)
+        self.eligibility = self.players[[position for position, _ in lineup_slots]].to_numpy(dtype=bool)
+        self.slots = [n for _, n in lineup_slots]
+
+        # players with the same eligibilities are interchangeable in a lineup
+        self.pattern_eligibility, self.patterns = numpy.unique(self.eligibility, axis=0, return_inverse=True)
+        self.n_patterns = len(self.pattern_eligibility)
+        self.pattern_positions = [numpy.flatnonzero(eligible).tolist() for eligible in self.pattern_eligibility]
+
+        # with a row of zeros at the end, so that -1 pads arrays of players
+        self._values = numpy.append(self.values, 0.0)
+        self._stats = numpy.vstack([self.stats, numpy.zeros(len(stats))])
+
+        self.rosters = {
+            int(team_id): frozenset(team.index)
+            for team_id, team in self.players.groupby('fantasy_team_id')
+        }
+
+        self._lineups = {}  # best lineup of each roster
+        self._structures = {}  # structure of the lineups with each count of players with each set of eligibilities
+        self._exchangeable = {}  # eligibilities that a new player could take the place of in each structure
+        self._openings = {}  # value needed to join each lineup and the player pushed out, for each set of eligibilities
+
+    def lineup(self, roster):
+        """
+        Best lineup of a roster
+        """
+        roster = frozenset(roster)
+
+        if roster not in self._lineups:
+            players = numpy.array(sorted(roster), dtype=int)
+
+            assigned = assign_slots(self.values[players], self.eligibility[players], self.slots)
+
+            self._lineups[roster] = frozenset(players[assigned >= 0].tolist())
+
+        return self._lineups[roster]
+
+    def trade_lineup(self, team_id, give):
+        """
+        Best lineup of a team after it gives players away
+        """
+        roster = self.rosters[team_id]
+        lineup = self.lineup(roster)
+
+        if lineup.isdisjoint(give):
+            return lineup  # players on the bench leaving don't change the lineup
+
+        return self.lineup(roster.difference(give))
+
+    def structure(self, members):
+        """
+        Eligibilities of the players filling each slot of a lineup, and the open slots of each position
+
+        A lineup's structure only depends on how many of its players have each set of eligibilities, so lineups with the same counts share it.
+
+        """
+        key = numpy.bincount(self.patterns[members], minlength=self.n_patterns).tobytes()
+
+        if key not in self._structures:
+            assigned = assign_slots(numpy.ones(len(members)), self.eligibility[members], self.slots, prune=False)
+
+            occupants = [frozenset(self.patterns[members[assigned == i]].tolist()) for i in range(len(self.slots))]
+            open_slots = numpy.array(self.slots) - numpy.bincount(assigned[assigned >= 0], minlength=len(self.slots))
+
+            self._structures[key] = (key, occupants, open_slots)
+
+        return self._structures[key]
+
+    def exchangeable(self, structure, pattern):
+        """
+        Which eligibilities of the players in a lineup a new player with `pattern` could take the place of, or None if he can fill an open slot
+
+        The new player can take the place of anyone in a position he can reach by moving players along to other positions they're eligible for, and fills an open slot if he reaches one.
+
+        """
+        key, occupants, open_slots = structure
+
+        if (key, pattern) not in self._exchangeable:
+            reached = set(self.pattern_positions[pattern])
+            frontier = list(reached)
+            result = numpy.zeros(self.n_patterns, dtype=bool)
+
+            while frontier:
+                position = frontier.pop()
+
+                if open_slots[position] > 0:
+                    result = None
+                    break
+
+                for occupant in occupants[position]:
+                    result[occupant] = True
+
+                    for other in self.pattern_positions[occupant]:
+                        if other not in reached:
+                            reached.add(other)
+                            frontier.append(other)
+
+            self._exchangeable[(key, pattern)] = result
+
+        return self._exchangeable[(key, pattern)]
+
+    def openings(self, lineup, patterns):
+        """
+        For new players with each of `patterns`, the value they need to join a lineup and the player they'd push out (-1 for an open slot)
+
+        Players that can fill the slots together form a matroid: a new player fills an open slot if he can reach one, and otherwise takes the place of the least valuable player he could replace, if he's worth more.
+
+        """
+        if lineup not in self._openings:
+            members = numpy.array(sorted(lineup), dtype=int)
+
+            # not yet found for any eligibilities
+            self._openings[lineup] = (members, numpy.full(self.n_patterns, numpy.nan), numpy.full(self.n_patterns, -1))
+
+        members, threshold, pushed = self._openings[lineup]
+
+        missing = numpy.unique(patterns[numpy.isnan(threshold[patterns])])
+
+        if len(missing) > 0:
+            member_values = self.values[members]
+            member_patterns = self.patterns[members]
+
+            structure = self.structure(members)
+
+            for pattern in missing.tolist():
+                exchangeable = self.exchangeable(structure, pattern)
+
+                if exchangeable is None:
+                    threshold[pattern] = -numpy.inf
+                elif exchangeable.any():
+                    weakest = numpy.where(exchangeable[member_patterns], member_values, numpy.inf).argmin()
+
+                    threshold[pattern] = member_values[weakest]
+                    pushed[pattern] = members[weakest]
+                else:
+                    threshold[pattern] = numpy.inf
+
+        return threshold[patterns], pushed[patterns]
+
+    def join_one(self, lineup, players):
+        """
+        Whether each of `players` would join a lineup on his own, and the player he'd push out (-1 for an open slot)
+        """
+        threshold, pushed = self.openings(lineup, self.patterns[players])
+
+        entered = self.values[players] > threshold
+
+        return entered, numpy.where(entered, pushed, -1)
+
+    def join(self, lineup, joining):
+        """
+        Players in and out of a lineup when each row of `joining` joins its roster
+
+        Players join one at a time: the best lineup with a new player is the old lineup with at most one player swapped, and adding players one by one gives the best lineup with all of them.
+
+        Returns (players in, players out) arrays with a row for each row of `joining`, padded with -1.
+
+        """
+        joining = numpy.asarray(joining, dtype=int)
+        m, k = joining.shape
+
+        into = numpy.full((m, k), -1)
+        out = numpy.full((m, k), -1)
+
+        if k == 0:
+            return into, out
+
+        if k == 1:
+            entered, pushed = self.join_one(lineup, joining[:, 0])
+
+            into[:, 0] = numpy.where(entered, joining[:, 0], -1)
+            out[:, 0] = pushed
+
+            return into, out
+
+        # the rows with the same first player share the lineup he leaves behind
+        for player in numpy.unique(joining[:, 0]).tolist():
+            rows = joining[:, 0] == player
+
+            entered, pushed = self.join_one(lineup, numpy.array([player]))
+
+            after = lineup
+            if entered[0]:
+                into[rows, 0] = player
+                out[rows, 0] = pushed[0]
+                after = (lineup - {pushed[0]}) | {player}
+
+            into[rows, 1:], out[rows, 1:] = self.join(after, joining[rows, 1:])
+
+        return into, out
+
+    def totals(self, lineup, into=None, out=None):
+        """
+        Weekly totals of a lineup, or of the lineup with each row of players in and out, padded with -1
+        """
+        totals = self.stats[list(lineup)].sum(axis=0)
+
+        if into is None:
+            return totals
+
+        return totals + self._stats[into].sum(axis=1) - self._stats[out].sum(axis=1)
+
+    def evaluate(self, team_id, other_id, give, get):
+        """
+        Change in both teams' expected categories won for a deal of any size
+        """
+        lineup = self.trade_lineup(team_id, give)
+        mine = self.totals(lineup, *self.join(lineup, [get]))
+
+        lineup = self.trade_lineup(other_id, get)
+        theirs = self.totals(lineup, *self.join(lineup, [give]))
+
+        return self.score([(team_id, other_id, tuple(give), tuple(get))], mine, theirs)
+
+    def enumerate_deals(self, team_id, sizes=deal_sizes):
+        """
+        Every deal of the given sizes between my team and each other team, best for me first
+
+        Each team's lineup is solved once for each set of players it gives, and every set of players it could get joins that lineup at once.
+
+        """
+        deals = []
+        after = {'mine': [], 'theirs': []}  # weekly totals of each team after each deal
+
+        for other_id in sorted(self.rosters):
+            if other_id == team_id:
+                continue
+
+            for n_give, n_get in sizes:
+                gives = numpy.array(list(combinations(sorted(self.rosters[team_id]), n_give)), dtype=int).reshape(-1, n_give)
+                gets = numpy.array(list(combinations(sorted(self.rosters[other_id]), n_get)), dtype=int).reshape(-1, n_get)
+
+                if len(gives) == 0 or len(gets) == 0:
+                    continue
+
+                # deals in order of (give, get)
+                mine = numpy.zeros((len(gives), len(gets), len(stats)))
+                theirs = numpy.zeros((len(gives), len(gets), len(stats)))
+
+                for i, give in enumerate(gives):
+                    lineup = self.trade_lineup(team_id, give)
+                    mine[i] = self.totals(lineup, *self.join(lineup, gets))
+
+                for j, get in enumerate(gets):
+                    lineup = self.trade_lineup(other_id, get)
+                    theirs[:, j] = self.totals(lineup, *self.join(lineup, gives))
+
+                deals.extend((team_id, other_id, tuple(give), tuple(get)) for give in gives.tolist() for get in gets.tolist())
+                after['mine'].append(mine.reshape(-1, len(stats)))
+                after['theirs'].append(theirs.reshape(-1, len(stats)))
+
+        return self.score(deals, numpy.concatenate(after['mine']), numpy.concatenate(after['theirs']))
+
+    def score(self, deals, mine, theirs):
+        """
+        Deals with my and the other team's gain in expected categories won, from the teams' weekly totals after each deal, best for me first
+        """
+        totals = {team_id: self.totals(self.lineup(roster)) for team_id, roster in self.rosters.items()}
+
+        mine_before = numpy.array([totals[deal[0]] for deal in deals]).reshape(-1, len(stats))
+        theirs_before = numpy.array([totals[deal[1]] for deal in deals]).reshape(-1, len(stats))
+
+        # the same sets of players are in many deals
+        groups = set(deal[2] for deal in deals) | set(deal[3] for deal in deals)
+        fg_ids = {group: ' '.join(self.players['fg_id'].values[list(group)]) for group in groups}
+        names = {group: ', '.join(self.players['fg_name'].values[list(group)]) for group in groups}
+
+        result = pandas.DataFrame({
+            'team': [deal[0] for deal in deals],
+            'other_team': [deal[1] for deal in deals],
+            'give': [fg_ids[deal[2]] for deal in deals],
+            'get': [fg_ids[deal[3]] for deal in deals],
+            'give_names': [names[deal[2]] for deal in deals],
+            'get_names': [names[deal[3]] for deal in deals],
+            'gain': expected_wins(mine, self.models) - expected_wins(mine_before, self.models),
+            'their_gain': expected_wins(theirs, self.models) - expected_wins(theirs_before, self.models),
+        })
+
+        return result.sort_values('gain', ascending=False).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    with metrics.run('trade'):
+        main()
@@ -3,7 +3,13 @@ Utility functions
 
 """
 
+import contextlib
+import functools
+import hashlib
+import inspect
+import json
 import os
+import tempfile
 
 import numpy
 import pandas
@@ -16,6 +22,16 @@ from config import (
     PROJECTIONS_DIRECTORY,
     WORKING_DIRECTORY
 )
+from player_ids import load_player_ids
+
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = 'feather'
+except ImportError:
+    CACHE_FORMAT = 'pickle'  # fall back to pickle if pyarrow isn't installed
+
+
+CACHE_DIRECTORY = os.path.join(DATA_DIRECTORY, 'cache')
 
 
 fangraphs_column_mapping = {
@@ -36,14 +52,7 @@ def load_mapping():
     """
     location = os.path.join(DATA_DIRECTORY, 'player_mapping.csv')
 
-    mapping = pandas.read_csv(location, dtype={
-        'mlb_id': object,
-        'fg_id': object,
-        'espn_id': object
-    }, encoding='utf-8')
-
-    # TODO: sort out Fangraphs player ids
-    # mapping['playerid'] = mapping['bis_id'].combine_first(mapping['stats_id'])  # use BIS id if available, otherwise STATS id
+    mapping = load_player_ids(location).frame()
 
     print(u"location of player mapping file: {}".format(location))
 
@@ -56,7 +65,14 @@ def load_fangraphs_pitcher_projections(projection_type):
     """
     filename = '{}_pitchers.csv'.format(projection_type)
 
-    projections = pandas.read_csv(os.path.join(PROJECTIONS_DIRECTORY, filename), encoding="utf-8-sig")
+    return load_cached_frame(os.path.join(PROJECTIONS_DIRECTORY, filename), parse_fangraphs_pitcher_projections, 'fangraphs')
+
+
+def parse_fangraphs_pitcher_projections(location):
+    """
+    Parse Fangraphs pitcher projections from CSV
+    """
+    projections = pandas.read_csv(location, encoding="utf-8-sig")
 
     projections.rename(columns=fangraphs_column_mapping, inplace=True)
 
@@ -74,7 +90,14 @@ def load_fangraphs_batter_projections(projection_type):
     """
     filename = '{}_batters.csv'.format(projection_type)
 
-    projections = pandas.read_csv(os.path.join(PROJECTIONS_DIRECTORY, filename), encoding="utf-8-sig", error_bad_lines=False)
+    return load_cached_frame(os.path.join(PROJECTIONS_DIRECTORY, filename), parse_fangraphs_batter_projections, 'fangraphs')
+
+
+def parse_fangraphs_batter_projections(location):
+    """
+    Parse Fangraphs batter projections from CSV
+    """
+    projections = pandas.read_csv(location, encoding="utf-8-sig", error_bad_lines=False)
 
     projections.rename(columns=fangraphs_column_mapping, inplace=True)  # columns can't begin with numbers
 
@@ -90,17 +113,175 @@ def load_playing_time(player_type):
     """
     Load playing time from the past 14 days
     """
-    filename = os.path.join(
-        'data',
-        '{}_playing_time.csv'.format(player_type))
+    return load_cached_frame(playing_time_location(player_type), parse_playing_time, 'playing_time')
+
 
-    playing_time = pandas.read_csv(filename, encoding="utf-8-sig", error_bad_lines=False, dtype={'playerid': object})
+def playing_time_location(player_type):
+    """
+    Location of the latest playing time scraped by scrape_playing_time.py
+    """
+    return os.path.join(DATA_DIRECTORY, '{}_playing_time.csv'.format(player_type))
+
+
+def parse_playing_time(location):
+    """
+    Parse Fangraphs playing time leaderboard from CSV
+    """
+    playing_time = pandas.read_csv(location, encoding="utf-8-sig", error_bad_lines=False, dtype={'playerid': object})
 
     playing_time.rename(columns=fangraphs_column_mapping, inplace=True)
 
     return playing_time
 
 
+def load_cached_frame(location, parse, namespace):
+    """
+    Load a processed data frame from the on-disk cache, rebuilding it with `parse` if `location` has changed
+
+    The cache is keyed on the modification time and size of the source file. If those change, the contents are hashed so that a rewrite with identical data doesn't trigger a rebuild.
+
+    The key also records which parser built the frame and a hash of the module it lives in, so editing the parsing code invalidates frames cached by the old version.
+
+    `namespace` separates caches built from the same source file by different parsers, and the cache name includes a hash of the source's path, so files with the same name in different directories (e.g. two leagues' scores) have their own caches.
+
+    The frame and then its key are written to temporary files and moved into place, so a process reading the cache at the same time never sees a partly written file.
+    """
+    name = '{}_{}_{}'.format(
+        namespace,
+        os.path.splitext(os.path.basename(location))[0],
+        hashlib.sha1(os.path.abspath(location).encode('utf-8')).hexdigest()[:8])
+    cache_location = os.path.join(CACHE_DIRECTORY, '{}.{}'.format(name, CACHE_FORMAT))
+    key_location = os.path.join(CACHE_DIRECTORY, '{}.json'.format(name))
+
+    source_stat = os.stat(location)
+    key = {
+        'source': os.path.abspath(location),
+        'mtime': source_stat.st_mtime_ns,
+        'size': source_stat.st_size,
+        'format': CACHE_FORMAT,
+    }
+    key.update(parser_version(parse))
+
+    cached_key = None
+    if os.path.exists(cache_location) and os.path.exists(key_location):
+        with open(key_location, 'r') as f:
+            cached_key = json.load(f)
+
+    if cached_key is not None:
+        if all(cached_key.get(k) == v for k, v in key.items()):
+            return read_cached_frame(cache_location)
+
+        key['sha1'] = hash_file(location)
+
+        if all(cached_key.get(k) == v for k, v in key.items() if k not in ('mtime', 'size')):
+            write_cache_key(key_location, key)  # contents are unchanged, so only the timestamp needs updating
+            return read_cached_frame(cache_location)
+
+    frame = parse(location).reset_index(drop=True)
+
+    key['sha1'] = key.get('sha1') or hash_file(location)
+
+    os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+    write_cached_frame(frame, cache_location)
+    write_cache_key(key_location, key)
+
+    return frame
+
+
+def read_cached_frame(location):
+    """
+    Read a cached data frame
+    """
+    if CACHE_FORMAT == 'feather':
+        return pandas.read_feather(location)
+    else:
+        return pandas.read_pickle(location)
+
+
+def write_cached_frame(frame, location):
+    """
+    Write a data frame to the cache, replacing `location` at once
+    """
+    with temporary_location(location) as temporary:
+        if CACHE_FORMAT == 'feather':
+            frame.to_feather(temporary)
+        else:
+            frame.to_pickle(temporary)
+
+
+def write_cache_key(location, key):
+    """
+    Write the key describing the source file of a cached data frame, replacing `location` at once
+    """
+    with temporary_location(location) as temporary:
+        with open(temporary, 'w') as f:
+            json.dump(key, f)
+
+
+@contextlib.contextmanager
+def temporary_location(location):
+    """
+    Temporary file next to `location` to write to, moved to `location` if writing succeeds
+    """
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(location) or '.', prefix='.' + os.path.basename(location), suffix='.tmp')
+    os.close(fd)
+
+    try:
+        yield temporary
+        os.replace(temporary, location)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def parser_version(parse):
+    """
+    Name and version of the function used to build a cached frame
+
+    The version hashes the source of the module defining the parser (or the pandas version for pandas' own readers), along with any arguments bound with functools.partial.
+    """
+    arguments = ''
+    if isinstance(parse, functools.partial):
+        arguments = repr((parse.args, sorted(parse.keywords.items())))
+        parse = parse.func
+
+    module = inspect.getmodule(parse)
+    name = '{}.{}'.format(getattr(module, '__name__', ''), getattr(parse, '__qualname__', repr(parse)))
+
+    sha1 = hashlib.sha1()
+    sha1.update(arguments.encode('utf-8'))
+    sha1.update(pandas.__version__.encode('utf-8'))
+
+    if module is not None and not module.__name__.startswith('pandas'):
+        sha1.update(hash_module(inspect.getsourcefile(module)).encode('utf-8'))
+
+    return {
+        'parser': name,
+        'parser_version': sha1.hexdigest(),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def hash_module(location):
+    """
+    SHA1 hash of a module's source, computed once per process
+    """
+    return hash_file(location)
+
+
+def hash_file(location):
+    """
+    SHA1 hash of a file's contents
+    """
+    sha1 = hashlib.sha1()
+
+    with open(location, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+
+    return sha1.hexdigest()
+
+
 def convert_fangraphs_playerid(projections):
     """
     Convert Fangraphs playerid to BIS id and STATS id
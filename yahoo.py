@@ -1,31 +1,52 @@
 """
 Yahoo fantasy baseball league
 """
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import hashlib
+import io
 import json
 import os
+import time
 
 from lxml import etree
+import numpy
 import pandas
 import requests
 from requests_oauthlib import OAuth2Session
 
+from categories import RATE_CATEGORIES, calculate_category_p_added, category_names
 import league
+import metrics
+from snapshots import SNAPSHOTS, record_snapshot
 
 
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
+# namespace for Yahoo fantasy sports API
+ns = {'f': 'http://fantasysports.yahooapis.com/fantasy/v2/base.rng'}
+
 
 class Yahoo(league.League):
+    # categories that aren't valued directly
+    ignored_categories = {
+        'batting': ['PA', 'AB', 'OBP', 'SLG'],
+        'pitching': ['IP'],
+    }
+
+    # lineup slots for batters, for leagues that don't set `lineup_slots`; positions the league doesn't use are dropped
+    default_lineup_slots = {'C': 1, '1B': 1, '2B': 1, '3B': 1, 'SS': 1, 'OF': 3, 'Util': 2}
+
     def __init__(self, league_data_directory, projections_name="rfangraphsdc"):
         super(Yahoo, self).__init__(league_data_directory, projections_name)
-        self.projections_name = projections_name
 
         with open(os.path.join(league_data_directory, "config.json"), 'r') as f:
             config = json.load(f)
         
         self._client_id = config['client_id']
         self._client_secret = config['client_secret']
+        self._recorded_responses = config.get('recorded_responses')  # directory of recorded API responses
+        self._record = config.get('record_responses', False)  # if True, record responses instead of replaying them
         self.season = config['season']
         self.sport_id = config['sport_id']
         self.league_id = config['league_id']
@@ -37,6 +58,9 @@ class Yahoo(league.League):
         self.n_pitchers = config['n_pitchers']
         self.positions = config['positions']
         self.categories = config['categories']
+        self.lineup_slots = config.get('lineup_slots', {
+            position: n for position, n in self.default_lineup_slots.items() if position in self.positions or position == 'Util'
+        })
 
         self.elig = self.load_elig()  # TODO: make this a class variable?
 
@@ -45,27 +69,52 @@ class Yahoo(league.League):
         self.standings_delta = config['standings_delta']
     
     def load_client(self, league_data_directory):
-        return YahooClient(
+        if self._recorded_responses and not self._record:
+            return ReplayClient(self._recorded_responses)
+
+        client = YahooClient(
             self._client_id,
             self._client_secret,
             league_data_directory)
 
+        if self._recorded_responses:
+            client.session = RecordedSession(self._recorded_responses, client.session)
+
+        return client
+
+    @metrics.timed
     def load_players(self):
         """
         Same as base league, but add QS
         """
+        self.value_players()
+
+        self.add_player_state()
+
+    @metrics.timed
+    def value_players(self):
+        """
+        Add player ids and category values to projections
+
+        Values only depend on the projections and player mapping, not on eligibilities or rosters.
+        """
         self.add_quality_starts()
 
         self.add_player_mapping()
 
-        self.add_elig()
-
         self.calc_batter_value()
         self.batters.sort_values('p_added', ascending=False, inplace=True)
 
         self.calc_pitcher_value()
         self.pitchers.sort_values('p_added', ascending=False, inplace=True)
 
+    @metrics.timed
+    def add_player_state(self):
+        """
+        Add position eligibilities and roster state to valued players
+        """
+        self.add_elig()
+
         self.add_roster_state()
     
     def add_quality_starts(self):
@@ -75,11 +124,7 @@ class Yahoo(league.League):
         Fangraphs projections do not have quality starts
         """
         if 'QS' not in self.pitchers.columns:
-            razzball = pandas.read_csv(os.path.join(
-                self.data_directory,
-                "projections",
-                "razzball_pitchers.csv"
-            ))
+            razzball = pandas.read_csv(self.razzball_location())
             
             razzball.rename(columns={
                 'Name': 'razzball_name'
@@ -89,14 +134,18 @@ class Yahoo(league.League):
 
             self.pitchers['QS'].where(self.pitchers['QS'].notnull(), 0.55 * self.pitchers['GS'], inplace=True)
     
+    def razzball_location(self):
+        return os.path.join(self.data_directory, "projections", "razzball_pitchers.csv")
+
+    @metrics.timed
     def output_valuations(self, directory=None):
         """
-        Output player valuations to CSVs.
+        Output player valuations to CSVs, and record them in the snapshot store in `directory` (default the league's).
         """
         if not directory:
             directory = os.path.join(
                 self.league_data_directory,
-                "valuations"
+                SNAPSHOTS
             )
 
         output_cols = [
@@ -108,14 +157,14 @@ class Yahoo(league.League):
             'C', '1B', '2B', 'SS', '3B', 'OF', 'Util',
         ]
 
-        self.batters.to_csv(os.path.join(
+        location = os.path.join(
             self.league_data_directory,
             "batters_valuation.csv"
-        ), columns=output_cols, index=False, float_format='%.2f')
-        self.batters.to_csv(os.path.join(
-            directory,
-            "batters_valuation_{:%Y-%m-%d}.csv".format(datetime.date.today())
-        ), columns=output_cols, index=False, float_format='%.2f')
+        )
+
+        self.batters.to_csv(location, columns=output_cols, index=False, float_format='%.2f')
+
+        record_snapshot(directory, "batters_valuation", location)
 
         output_cols = [
             'fg_name', 'Team', 'team_id',
@@ -126,24 +175,24 @@ class Yahoo(league.League):
             'SP', 'RP'
         ]
 
-        self.pitchers.to_csv(os.path.join(
+        location = os.path.join(
             self.league_data_directory,
             "pitchers_valuation.csv"
-        ), columns=output_cols, index=False, float_format='%.2f')
-        self.pitchers.to_csv(os.path.join(
-            directory,
-            "pitchers_valuation_{:%Y-%m-%d}.csv".format(datetime.date.today())
-        ), columns=output_cols, index=False, float_format='%.2f')
+        )
+
+        self.pitchers.to_csv(location, columns=output_cols, index=False, float_format='%.2f')
+
+        record_snapshot(directory, "pitchers_valuation", location)
 
     def add_player_mapping(self):
         """
         Join player mapping to projections for player ids.
         """
-        self.batters = self.batters.merge(self.player_mapping[['fg_id', 'yahoo_id']], how='left')
+        self.batters['yahoo_id'] = self.player_ids.translate(self.batters['fg_id'], 'fg', 'yahoo', dtype='Int64')
 
         print(self.batters[self.batters['yahoo_id'].isnull()].sort_values('PA', ascending=False).head(10))
 
-        self.pitchers = self.pitchers.merge(self.player_mapping[['fg_id', 'yahoo_id']], how='left')
+        self.pitchers['yahoo_id'] = self.player_ids.translate(self.pitchers['fg_id'], 'fg', 'yahoo', dtype='Int64')
 
         print(self.pitchers[self.pitchers['yahoo_id'].isnull()].sort_values('IP', ascending=False).head(10))
     
@@ -164,83 +213,91 @@ class Yahoo(league.League):
         """
         pass
     
+    @metrics.timed
     def calc_batter_value(self):
         """
         Calculate batter value based on how categories are valued in this league
         """
-        self.batters['p_added'] = 0
+        self.batters = self.add_category_values(self.batters, 'batting', self.n_batters)
 
-        for category in self.categories['batting']:
-            if category in ['PA', 'AB', 'OBP', 'SLG']:
-                continue
-            elif category == 'OPS':
-                difference_OB = (self.batters['OBP'] - self.median_level['batting']['OBP']) * (self.batters['PA'] / self.n_weeks)
-                difference_TB = (self.batters['SLG'] - self.median_level['batting']['SLG']) * (self.batters['AB'] / self.n_weeks)
-        
-                new_team_OBP = self.median_level['batting']['OBP'] + difference_OB / self.median_level['batting']['PA']
-                new_team_SLG = self.median_level['batting']['SLG'] + difference_TB / self.median_level['batting']['AB']
-        
-                new_team_OPS = new_team_OBP + new_team_SLG
-        
-                self.batters['new_team_OPS'] = new_team_OPS
-        
-                self.batters['p_added_OPS'] = (new_team_OPS - self.median_level['batting']['OPS']) / self.standings_delta['batting']['OPS'] * (1 / self.n_teams)
-            else:
-                self.batters['p_added_{}'.format(category)] = (self.batters[category] / self.n_weeks - self.median_level['batting'][category] / self.n_batters) / self.standings_delta['batting'][category] * (1 / self.n_teams)
-    
-            self.batters['p_added'] += self.batters['p_added_{}'.format(category)]
-    
+    @metrics.timed
     def calc_pitcher_value(self):
         """
         Calculate pitcher value based on how categories are valued in this league
         """
-        self.pitchers['p_added'] = 0
+        self.pitchers = self.add_category_values(self.pitchers, 'pitching', self.n_pitchers)
+
+    def add_category_values(self, players, kind, n_players):
+        """
+        Add win probability added for each category, and overall
+        """
+        categories = self.category_specs(kind)
+
+        _, p_added = calculate_category_p_added(players, categories, n_players=n_players, weeks=self.n_weeks)
+
+        players = players.copy()
+
+        for i, category in enumerate(category_names(categories)):
+            players['p_added_{}'.format(category)] = p_added[:, i]
+
+        players['p_added'] = p_added.sum(axis=1)
+
+        return players
+
+    def category_specs(self, kind):
+        """
+        Category specs for the category engine, valued by the change in the team's standings for each category
 
-        for category in self.categories['pitching']:
-            if category == 'IP':
+        For rate categories, the player's rate replaces the median rate for his share of the team's median playing time
+        """
+        median_level = self.median_level[kind]
+        standings_delta = self.standings_delta[kind]
+
+        specs = []
+
+        for category in self.categories[kind]:
+            if category in self.ignored_categories[kind]:
                 continue
-            elif category == 'ERA':
-                # replace the pitcher's ERA with the median ERA
-                # given the pitchers's IP contribution, how much would team ERA be affected?
-                
-                difference_ER = (self.pitchers['ERA'] - self.median_level['pitching']['ERA']) / 9.0 * (self.pitchers['IP'] / self.n_weeks)
-                new_team_ERA =  self.median_level['pitching']['ERA'] + difference_ER / self.median_level['pitching']['IP'] * 9.0
-                
-                self.pitchers['p_added_ERA'] = (self.median_level['pitching']['ERA'] - new_team_ERA) / self.standings_delta['pitching']['ERA'] * (1 / self.n_teams)
-            elif category == 'K/9':
-                difference_K_per_week = (self.pitchers['K/9'] - self.median_level['pitching']['K/9']) / 9.0 * (self.pitchers['IP'] / self.n_weeks)
-                
-                new_team_K9 =self. median_level['pitching']['K/9'] + difference_K_per_week / self.median_level['pitching']['IP'] * 9.0
-                
-                self.pitchers['p_added_K/9'] = (new_team_K9 - self.median_level['pitching']['K/9']) / self.standings_delta['pitching']['K/9'] * (1 / self.n_teams)
-            elif category == 'WHIP':
-                # replace the pitcher's WHIP with the median WHIP
-                # given the pitchers's IP contribution, how much would team WHIP be affected?
-                
-                difference_WH = (self.pitchers['WHIP'] - self.median_level['pitching']['WHIP']) * self.pitchers['IP'] / self.n_weeks
-                new_team_WHIP =  self.median_level['pitching']['WHIP'] + difference_WH / self.median_level['pitching']['IP']
-                
-                self.pitchers['p_added_WHIP'] = (self.median_level['pitching']['WHIP'] - new_team_WHIP) / self.standings_delta['pitching']['WHIP'] * (1 / self.n_teams)
+            elif category in RATE_CATEGORIES:
+                for component in RATE_CATEGORIES[category]:
+                    spec = dict(component)
+                    spec['name'] = spec['stat']
+                    spec['category'] = category
+                    spec['level'] = median_level[spec['stat']]
+                    spec['p_added'] = spec.get('per', 1.0) / median_level[spec['denominator']] / standings_delta[category] * (1 / self.n_teams)
+
+                    specs.append(spec)
             else:
-                self.pitchers['p_added_{}'.format(category)] = (self.pitchers[category] / self.n_weeks - self.median_level['pitching'][category] / self.n_pitchers) / self.standings_delta['pitching'][category] * (1 / self.n_teams)
-            
-            self.pitchers['p_added'] += self.pitchers['p_added_{}'.format(category)]
-    
+                specs.append({
+                    'name': category,
+                    'stat': category,
+                    'level': median_level[category],
+                    'p_added': 1 / standings_delta[category] * (1 / self.n_teams),
+                })
+
+        return specs
+
     def add_roster_state(self):
         """
         Join current team rosters to projections
+
+        If there are no rosters yet, every player is a free agent.
         """
         for player_type in ["batters", "pitchers"]:
-            setattr(self, player_type, getattr(self, player_type).merge(self.rosters[['yahoo_id', 'team_id']], how='left'))
+            players = getattr(self, player_type)
+
+            if self.rosters is None:
+                players = players.assign(team_id=numpy.nan)
+            else:
+                players = players.merge(self.rosters[['yahoo_id', 'team_id']], how='left')
+
+            setattr(self, player_type, players)
 
     def load_elig(self):
         """
         Load player position eligibilities from CSV.
         """
-        elig = pandas.read_csv(os.path.join(
-            self.data_directory,
-            "yahoo_eligibility.csv"
-        ), dtype=self.playerid_dtypes)
+        elig = pandas.read_csv(self.elig_location(), dtype=self.playerid_dtypes)
 
         elig['P'] = elig['SP'] | elig['RP']
 
@@ -248,40 +305,20 @@ class Yahoo(league.League):
 
         return elig
     
-    def refresh_eligibilities(self):
+    def elig_location(self):
+        return os.path.join(self.data_directory, "yahoo_eligibility.csv")
+
+    @metrics.timed
+    def refresh_eligibilities(self, max_workers=4):
         """
         Query Yahoo API to refresh player position eligibilities.
-        """
-        # namespace for Yahoo fantasy sports API
-        ns = {'f': 'http://fantasysports.yahooapis.com/fantasy/v2/base.rng'}
 
+        Pages of the league's player collection are fetched concurrently, `max_workers` at a time.
+        """
         base_url = "https://fantasysports.yahooapis.com/fantasy/v2/league/{sport_id}.l.{league_id}/players".format(sport_id=self.sport_id, league_id=self.league_id)
         url = base_url + ";start={}"
 
-        players = []
-        start = 0
-        more = True
-
-        while more:
-            more = False
-            r = self.client.session.get(url.format(start))
-
-            root = etree.fromstring(r.content)
-
-            for player_xml in root.xpath("//f:player", namespaces=ns):
-                player = {
-                    'yahoo_id': player_xml.findtext("f:player_id", namespaces=ns),
-                    'yahoo_name': player_xml.findtext("f:name/f:full", namespaces=ns).strip('.'),
-                }
-
-                for pos_xml in player_xml.findall("f:eligible_positions/f:position", namespaces=ns):
-                    if pos_xml.text in self.positions:
-                        player[pos_xml.text] = 1
-
-                players.append(player)
-
-                start += 1
-                more = True  # processed at least one player
+        players = self.client.fetch_pages(url, self.parse_eligibilities, max_workers=max_workers)
         
         yahoo_elig = pandas.DataFrame(players)
         yahoo_elig = yahoo_elig[['yahoo_name', 'yahoo_id'] + self.positions]
@@ -289,77 +326,106 @@ class Yahoo(league.League):
         yahoo_elig.fillna(0, inplace=True)
         yahoo_elig[self.positions] = yahoo_elig[self.positions].astype(int)
 
-        yahoo_elig.to_csv(os.path.join(
-            self.data_directory,
-            "yahoo_eligibility.csv"
-        ), encoding='utf8', index=False)
+        yahoo_elig.to_csv(self.elig_location(), encoding='utf8', index=False)
 
-        yahoo_elig.to_csv(os.path.join(
-            self.data_directory,
-            "historical",
-            "yahoo_eligibility_{:%Y-%m-%d}.csv".format(datetime.date.today())
-        ), encoding='utf8', index=False)
+        record_snapshot(os.path.join(self.data_directory, SNAPSHOTS), "yahoo_eligibility", self.elig_location())
 
         self.elig = self.load_elig()
 
+    def parse_eligibilities(self, content):
+        """
+        Parse player position eligibilities from a page of the player collection
+        """
+        players = []
+
+        for _, player_xml in etree.iterparse(io.BytesIO(content), tag="{{{}}}player".format(ns['f'])):
+            player = {
+                'yahoo_id': player_xml.findtext("f:player_id", namespaces=ns),
+                'yahoo_name': player_xml.findtext("f:name/f:full", namespaces=ns).strip('.'),
+            }
+
+            for pos_xml in player_xml.findall("f:eligible_positions/f:position", namespaces=ns):
+                if pos_xml.text in self.positions:
+                    player[pos_xml.text] = 1
 
-    def refresh_rosters(self):
+            players.append(player)
+
+            player_xml.clear()  # free each player once parsed
+
+        return players
+
+
+    @metrics.timed
+    def refresh_rosters(self, batch=True, max_workers=4):
         """
         Query Yahoo API to refresh current team rosters.
+
+        By default, every team's roster is fetched in one request to the teams collection. Otherwise, each team's roster is fetched separately, `max_workers` at a time.
         """
         if self.weekly:
             date = "{:%Y-%m-%d}".format(self.find_closest_monday())
         else:
             date = "{:%Y-%m-%d}".format(datetime.datetime.today())
 
-        ns = {'f': 'http://fantasysports.yahooapis.com/fantasy/v2/base.rng'}
-
         # https://developer.yahoo.com/fantasysports/guide/#id47
 
-        players = []
+        team_keys = ["{sport_id}.l.{league_id}.t.{team_id}".format(sport_id=self.sport_id, league_id=self.league_id, team_id=team_id) for team_id in range(1, self.n_teams + 1)]
 
-        base_url = "https://fantasysports.yahooapis.com/fantasy/v2/team/{sport_id}.l.{league_id}".format(sport_id=self.sport_id, league_id=self.league_id)
-        url = base_url + ".t.{team_id}/roster;date={date}"
+        if batch:
+            url = "https://fantasysports.yahooapis.com/fantasy/v2/teams;team_keys={team_keys}/roster;date={date}"
 
-        for team_id in range(1, self.n_teams + 1):
-            r = self.client.session.get(url.format(team_id=team_id, date=date))
+            r = self.client.get(url.format(team_keys=','.join(team_keys), date=date))
 
-            root = etree.fromstring(r.content)
-            # print(r.content)
+            players = self.parse_rosters(r.content)
+        else:
+            url = "https://fantasysports.yahooapis.com/fantasy/v2/team/{team_key}/roster;date={date}"
 
-            for player in root.xpath("//f:player", namespaces=ns):
-                players.append({
-                    'team_id': team_id,
-                    'yahoo_id': player.findtext("f:player_id", namespaces=ns),
-                    'yahoo_name': player.findtext("f:name/f:full", namespaces=ns).replace('.', '')
-                })
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                pages = executor.map(lambda team_key: self.parse_rosters(self.client.get(url.format(team_key=team_key, date=date)).content), team_keys)
+
+                players = [player for page in pages for player in page]
 
         rosters = pandas.DataFrame(players)
 
         if len(rosters) == 0:
             raise Exception('Failed to retrieve roster')
 
-        # fix Shohei Ohtani
-        # as batter
-        rosters.loc[rosters['yahoo_id'] == '1000001', 'yahoo_id'] = 10835
-        # as pitcher
-        rosters.loc[rosters['yahoo_id'] == '1000002', 'yahoo_id'] = 10835
+        # some players have more than one id, e.g. Shohei Ohtani as batter and as pitcher
+        rosters['yahoo_id'] = self.player_ids.resolve_aliases(rosters['yahoo_id'], 'yahoo')
 
         rosters['yahoo_id'] = pandas.to_numeric(rosters['yahoo_id'], downcast='float')
         rosters['yahoo_id'] = rosters['yahoo_id'].astype('Int64')
         
-        rosters.to_csv(os.path.join(
-            self.league_data_directory,
-            "rosters.csv"
-        ), encoding='utf8', index=False)
-        rosters.to_csv(os.path.join(
-            self.league_data_directory,
-            "historical",
-            "rosters_{}.csv".format(date)
-        ), encoding='utf8', index=False)
+        rosters.to_csv(self.rosters_location(), encoding='utf8', index=False)
+
+        record_snapshot(os.path.join(self.league_data_directory, SNAPSHOTS), "rosters", self.rosters_location(), date)
         
         self.rosters = rosters
     
+    @staticmethod
+    def parse_rosters(content):
+        """
+        Parse players on each team's roster from a team or teams collection response
+        """
+        root = etree.fromstring(content)
+
+        players = []
+
+        for team_xml in root.xpath("//f:team", namespaces=ns):
+            team_id = int(team_xml.findtext("f:team_id", namespaces=ns))
+
+            for player in team_xml.xpath("f:roster/f:players/f:player", namespaces=ns):
+                players.append({
+                    'team_id': team_id,
+                    'yahoo_id': player.findtext("f:player_id", namespaces=ns),
+                    'yahoo_name': player.findtext("f:name/f:full", namespaces=ns).replace('.', '')
+                })
+
+        # rosters are ordered by team
+        players.sort(key=lambda player: player['team_id'])
+
+        return players
+
     @staticmethod
     def find_closest_monday():
         """
@@ -374,6 +440,7 @@ class Yahoo(league.League):
         else:
             return today + datetime.timedelta(days_ahead)
     
+    @metrics.timed
     def refresh_scores(self, week_num):
         url = "https://fantasysports.yahooapis.com/fantasy/v2/league/{sport_id}.l.{league_id}/scoreboard;week={week_num}"
 
@@ -476,6 +543,8 @@ class YahooClient(object):
     """
     token_url = 'https://api.login.yahoo.com/oauth2/get_token'
 
+    retry_statuses = (429, 500, 502, 503, 504)  # responses worth retrying
+
     def __init__(self, client_id, client_secret, league_directory):
         self.league_directory = league_directory
         self.client_id = client_id
@@ -496,6 +565,49 @@ class YahooClient(object):
         
         self.refresh_token()
     
+    def get(self, url, retries=3, backoff=1.0):
+        """
+        GET `url`, retrying with exponential backoff on connection errors and server errors
+
+        Raises requests.exceptions.HTTPError if the last response is an error, so an error page is never parsed as data.
+        """
+        for attempt in range(retries + 1):
+            try:
+                r = self.session.get(url)
+            except requests.exceptions.ConnectionError:
+                if attempt == retries:
+                    raise
+            else:
+                if r.status_code not in self.retry_statuses or attempt == retries:
+                    r.raise_for_status()
+
+                    return r
+
+            time.sleep(backoff * 2 ** attempt)
+
+    def fetch_pages(self, url, parse, page_size=25, max_workers=4):
+        """
+        Fetch and parse pages of a collection concurrently, until a page comes back empty or short
+
+        `url` is formatted with the start of each page, and `parse` turns the content of each page into a list of items. Items are returned in page order. Pages requested past the end of the collection are discarded without being checked, so replaying with more workers than were recorded still works.
+        """
+        items = []
+        start = 0
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                starts = [start + i * page_size for i in range(max_workers)]
+
+                pages = executor.map(lambda page_start: parse(self.get(url.format(page_start)).content), starts)
+
+                for page in pages:
+                    items.extend(page)
+
+                    if len(page) < page_size:
+                        return items
+
+                start += max_workers * page_size
+
     def load_token(self):
         with open(self.token_location, 'r') as f:
             self.token = json.load(f)
@@ -509,3 +621,59 @@ class YahooClient(object):
 
         with open(self.token_location, 'w') as f:
             json.dump(self.token, f)
+
+
+class ReplayClient(YahooClient):
+    """
+    Client that replays recorded responses, for working offline
+    """
+    def __init__(self, directory):
+        self.session = RecordedSession(directory)
+
+
+class RecordedSession(object):
+    """
+    Session that replays responses recorded in `directory`
+
+    If `session` is given, requests are passed through to it and the responses are recorded. Replaying a request that wasn't recorded returns a 404 response.
+    """
+    def __init__(self, directory, session=None):
+        self.directory = directory
+        self.session = session
+
+    def get(self, url):
+        location = os.path.join(
+            self.directory,
+            "{}.xml".format(hashlib.sha1(url.encode('utf8')).hexdigest())
+        )
+
+        if self.session is None:
+            if not os.path.exists(location):
+                return RecordedResponse(b'', url, status_code=404)
+
+            with open(location, 'rb') as f:
+                return RecordedResponse(f.read(), url)
+
+        r = self.session.get(url)
+
+        if r.status_code == 200:
+            os.makedirs(self.directory, exist_ok=True)
+
+            with open(location, 'wb') as f:
+                f.write(r.content)
+
+        return r
+
+
+class RecordedResponse(object):
+    """
+    Minimal stand-in for a requests response
+    """
+    def __init__(self, content, url=None, status_code=200):
+        self.content = content
+        self.url = url
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError('{} (no recorded response) for url: {}'.format(self.status_code, self.url), response=self)